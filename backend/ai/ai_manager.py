@@ -1,8 +1,11 @@
 from .emotion_detector import EmotionDetector
 from .nlp_processor import NLPProcessor
 from .learning_system import LearningSystem
+from .inference_executor import get_inference_executor
+from .model_registry import get_model_registry
+from ..config import AI_CONFIG
 import logging
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Union
 from datetime import datetime
 import asyncio
 
@@ -12,6 +15,8 @@ class AIManager:
         self.emotion_detector = None
         self.nlp_processor = None
         self.learning_system = None
+        self.executor = get_inference_executor()
+        self.registry = get_model_registry()
         self.initialize_components()
 
     def initialize_components(self):
@@ -25,6 +30,46 @@ class AIManager:
             self.logger.error(f"Error initializing AI components: {str(e)}")
             raise
 
+    async def warmup(self, models: Optional[List[str]] = None) -> Dict:
+        """Preload and warm the configured models in the background"""
+        try:
+            models = models if models is not None else AI_CONFIG.get("warmup_models", [])
+            results = await self.registry.warmup(models)
+            return {
+                'success': all(results.values()),
+                'models': results,
+                'timestamp': datetime.utcnow().isoformat()
+            }
+        except Exception as e:
+            self.logger.error(f"Error warming up models: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    async def quantization_report(self,
+                                  model_id: str,
+                                  kind: str,
+                                  texts: List[str],
+                                  labels: Optional[List[int]] = None) -> Dict:
+        """Compare a model's INT8 variant with fp32 on held-out texts"""
+        try:
+            from .quantization import build_quantization_report
+            report = await self.executor.run(
+                "warmup", build_quantization_report, model_id, kind, texts, labels
+            )
+            return {'success': True, **report}
+        except Exception as e:
+            self.logger.error(f"Error building quantization report: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    def get_readiness(self) -> Dict:
+        """Report which models are hot and whether the warmup set is ready"""
+        return self.registry.get_readiness(AI_CONFIG.get("warmup_models", []))
+
     async def process_input(self, 
                           input_data: Dict,
                           context: Optional[List[Dict]] = None) -> Dict:
@@ -35,7 +80,9 @@ class AIManager:
             if input_type == 'image':
                 result = await self.process_image(input_data['data'])
             elif input_type == 'text':
-                result = await self.process_text(input_data['data'], context)
+                result = await self.process_text(
+                    input_data['data'], context, input_data.get('conversation_id')
+                )
             elif input_type == 'video_frame':
                 result = await self.process_video_frame(input_data['data'])
             else:
@@ -58,8 +105,8 @@ class AIManager:
                 'error': str(e)
             }
 
-    async def process_image(self, image_data: str) -> Dict:
-        """Process image data for emotion detection"""
+    async def process_image(self, image_data: Union[str, bytes]) -> Dict:
+        """Process base64 or raw binary image data for emotion detection"""
         try:
             emotion_result = await self.emotion_detector.process_image(image_data)
             
@@ -79,19 +126,18 @@ class AIManager:
 
     async def process_text(self, 
                           text: str,
-                          context: Optional[List[Dict]] = None) -> Dict:
+                          context: Optional[List[Dict]] = None,
+                          conversation_id: Optional[str] = None) -> Dict:
         """Process text input through NLP pipeline"""
         try:
-            # Process text through NLP pipeline
-            nlp_result = await self.nlp_processor.process_text(text, context)
-            
-            # Generate response
-            response = await self.nlp_processor.generate_response(text, context)
+            # Process text through NLP pipeline; it already generates the
+            # response, so GPT-2 runs once per message
+            nlp_result = await self.nlp_processor.process_text(text, context, conversation_id)
             
             return {
                 'success': True,
                 'nlp_analysis': nlp_result,
-                'response': response,
+                'response': nlp_result.get('response'),
                 'timestamp': datetime.utcnow().isoformat()
             }
 
@@ -102,6 +148,22 @@ class AIManager:
                 'error': str(e)
             }
 
+    async def stream_text_response(self,
+                                   text: str,
+                                   context: Optional[List[Dict]] = None,
+                                   conversation_id: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Stream a generated response as it is produced. The response has
+        already started when generation fails, so an error ends the stream
+        with an error line instead of raising.
+        """
+        try:
+            async for piece in self.nlp_processor.stream_response(text, context, conversation_id):
+                yield piece
+        except Exception as e:
+            self.logger.error(f"Error streaming response: {str(e)}")
+            yield f"\n[error] {str(e)}\n"
+
     async def process_video_frame(self, frame_data: str) -> Dict:
         """Process video frame for emotion detection"""
         try:
@@ -113,6 +175,17 @@ class AIManager:
                 'error': str(e)
             }
 
+    async def process_video_stream_frame(self, session_id: str, frame_data) -> Dict:
+        """Process a frame from a live stream with face tracking"""
+        try:
+            return await self.emotion_detector.process_video_stream_frame(session_id, frame_data)
+        except Exception as e:
+            self.logger.error(f"Error processing stream frame: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
     async def log_interaction(self, interaction_data: Dict) -> Dict:
         """Log interaction for learning purposes"""
         try:
@@ -162,7 +235,10 @@ class AIManager:
                 'components': {
                     'emotion_detector': emotion_info,
                     'nlp_processor': nlp_info,
-                    'learning_system': learning_stats
+                    'learning_system': learning_stats,
+                    'inference_executor': self.executor.get_stats(),
+                    'model_registry': self.registry.get_memory_report(),
+                    'readiness': self.get_readiness()
                 },
                 'status': 'operational',
                 'last_updated': datetime.utcnow().isoformat()
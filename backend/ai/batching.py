@@ -0,0 +1,119 @@
+import asyncio
+import inspect
+import logging
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+class MicroBatcher:
+    """
+    Collect concurrent single-item requests for a short window and run
+    them through the model as one batched call
+    """
+
+    def __init__(self,
+                 name: str,
+                 batch_fn: Callable[[List[Any]], Any],
+                 max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0):
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._in_flight = 0
+        self.total_requests = 0
+        self.total_batches = 0
+        self.batch_size_histogram = Counter()
+
+    async def submit(self, item: Any) -> Any:
+        """Queue a single item and wait for its slice of the batch result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        self.total_requests += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000.0, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Hand the oldest pending items to a batch task"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if not self._pending:
+            return
+
+        batch = self._pending[:self.max_batch_size]
+        self._pending = self._pending[self.max_batch_size:]
+
+        # Anything left over starts a fresh wait window
+        if self._pending:
+            loop = asyncio.get_running_loop()
+            if len(self._pending) >= self.max_batch_size:
+                loop.call_soon(self._flush)
+            else:
+                self._timer = loop.call_later(self.max_wait_ms / 1000.0, self._flush)
+
+        asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        """Run one batched call and fan results back out to the callers"""
+        items = [item for item, _ in batch]
+        self._in_flight += len(batch)
+        self.total_batches += 1
+        self.batch_size_histogram[len(batch)] += 1
+
+        try:
+            results = self.batch_fn(items)
+            if inspect.isawaitable(results):
+                results = await results
+
+            if len(results) != len(items):
+                raise ValueError(
+                    f"Batch function for {self.name} returned {len(results)} "
+                    f"results for {len(items)} inputs"
+                )
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+        except Exception as e:
+            self.logger.error(f"Error running {self.name} batch: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+        finally:
+            self._in_flight -= len(batch)
+
+    @property
+    def queue_depth(self) -> int:
+        """Requests waiting for a batch plus requests inside a running batch"""
+        return len(self._pending) + self._in_flight
+
+    def get_stats(self) -> Dict:
+        """Get queue depth and batch size statistics"""
+        return {
+            "name": self.name,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "queue_depth": self.queue_depth,
+            "pending": len(self._pending),
+            "in_flight": self._in_flight,
+            "total_requests": self.total_requests,
+            "total_batches": self.total_batches,
+            "average_batch_size": (
+                sum(size * count for size, count in self.batch_size_histogram.items())
+                / self.total_batches
+                if self.total_batches else 0.0
+            ),
+            "batch_size_histogram": dict(sorted(self.batch_size_histogram.items()))
+        }
@@ -1,62 +1,100 @@
 import cv2
 import numpy as np
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.image import img_to_array
 import logging
-from typing import Dict, Optional, Tuple
+import time
+from typing import Dict, List, Optional, Tuple, Union
 import base64
-import io
-from PIL import Image
+from collections import OrderedDict
+from .video_tracker import VideoEmotionSession, box_iou
+from .inference_executor import get_inference_executor
+from .model_registry import get_model_registry
+from ..config import AI_CONFIG
 
 class EmotionDetector:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
+        self.executor = get_inference_executor()
+        self.registry = get_model_registry()
         self.emotions = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
         self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        self.model = None
+        self._inference_fn = None
+        self.video_sessions = OrderedDict()
         self.initialize_model()
 
     def initialize_model(self):
-        """Initialize the emotion detection model"""
+        """Register the emotion detection model; it loads on first use"""
         try:
             # In production, replace with path to your trained model
-            self.model = load_model('models/emotion_model.h5')
-            self.logger.info("Emotion detection model loaded successfully")
+            model_path = AI_CONFIG["face_emotion_model"]
+            self._model_handle = self.registry.lazy(
+                "face_emotion",
+                lambda: self.registry.acquire(
+                    model_path,
+                    "keras-emotion",
+                    lambda: self._load_keras_model(model_path)
+                ),
+                warmup=lambda model: model.predict(np.zeros((1, 48, 48, 1), dtype="float32"))
+            )
+            if not AI_CONFIG.get("lazy_loading", True):
+                self._model_handle.get()
+            self.logger.info("Emotion detection model registered successfully")
         except Exception as e:
             self.logger.error(f"Error loading emotion detection model: {str(e)}")
             raise
 
-    async def process_image(self, image_data: str) -> Dict:
+    @staticmethod
+    def _load_keras_model(model_path: str):
+        # TensorFlow is imported here so it only costs startup time when used
+        from tensorflow.keras.models import load_model
+        return load_model(model_path)
+
+    @property
+    def model(self):
+        return self._model_handle.get()
+
+    @property
+    def inference_fn(self):
+        """
+        Compiled forward pass over a batch of face crops. Calling the model
+        directly avoids the per-call setup cost of Keras predict.
+        """
+        if self._inference_fn is None:
+            import tensorflow as tf
+
+            model = self.model
+            self._inference_fn = tf.function(
+                lambda x: model(x, training=False),
+                input_signature=[tf.TensorSpec((None, 48, 48, 1), tf.float32)]
+            )
+        return self._inference_fn
+
+    async def process_image(self, image_data: Union[str, bytes]) -> Dict:
         """
-        Process base64 encoded image data and detect emotions
+        Process base64 encoded or raw JPEG/PNG image data and detect emotions
         """
         try:
-            # Decode base64 image
-            image_bytes = base64.b64decode(image_data.split(',')[1] if ',' in image_data else image_data)
-            image = Image.open(io.BytesIO(image_bytes))
-            
-            # Convert to OpenCV format
-            image_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-            
-            # Detect faces
-            faces = self.detect_faces(image_cv)
+            timings = {}
+            image_cv = await self.executor.run(
+                "vision", self.decode_image, image_data, timings
+            )
+
+            # Detect and analyze faces off the event loop
+            faces, results = await self.executor.run(
+                "vision", self.detect_and_analyze, image_cv, timings
+            )
             
-            if not faces:
+            if len(faces) == 0:
                 return {
                     "success": False,
-                    "error": "No faces detected in the image"
+                    "error": "No faces detected in the image",
+                    "timings_ms": timings
                 }
 
-            # Process each face
-            results = []
-            for face in faces:
-                emotion_data = self.analyze_face(image_cv, face)
-                results.append(emotion_data)
-
             return {
                 "success": True,
                 "faces_detected": len(faces),
-                "results": results
+                "results": results,
+                "timings_ms": timings
             }
 
         except Exception as e:
@@ -66,33 +104,131 @@ class EmotionDetector:
                 "error": str(e)
             }
 
-    def detect_faces(self, image: np.ndarray) -> list:
+    def decode_image(self, image_data: Union[str, bytes], timings: Optional[Dict] = None) -> np.ndarray:
+        """
+        Decode a base64 (optionally data URL) string or raw encoded bytes
+        into a BGR array. Stage durations are recorded in timings when given.
+        """
+        if isinstance(image_data, str):
+            start = time.perf_counter()
+            image_data = base64.b64decode(image_data.split(',')[1] if ',' in image_data else image_data)
+            if timings is not None:
+                timings["base64_decode"] = (time.perf_counter() - start) * 1000
+
+        return self.decode_image_bytes(image_data, timings)
+
+    def decode_image_bytes(self, image_bytes: Union[bytes, bytearray, memoryview],
+                           timings: Optional[Dict] = None) -> np.ndarray:
         """
-        Detect faces in the image using OpenCV
+        Decode raw JPEG/PNG bytes straight into a BGR array. The buffer is
+        wrapped without copying and OpenCV writes the pixels once.
         """
+        start = time.perf_counter()
+        buffer = np.frombuffer(image_bytes, dtype=np.uint8)
+        image = cv2.imdecode(buffer, cv2.IMREAD_COLOR) if buffer.size else None
+        if image is None:
+            raise ValueError("Could not decode image data")
+
+        if timings is not None:
+            timings["image_decode"] = (time.perf_counter() - start) * 1000
+        return image
+
+    def detect_and_analyze(self, image: np.ndarray, timings: Optional[Dict] = None) -> Tuple[list, list]:
+        """
+        Detect faces and analyze each one; blocking, run via the executor
+        """
+        start = time.perf_counter()
+        faces = self.detect_faces(image)
+        detected = time.perf_counter()
+        results = self.analyze_faces(image, faces)
+
+        if timings is not None:
+            timings["face_detection"] = (detected - start) * 1000
+            timings["emotion_analysis"] = (time.perf_counter() - detected) * 1000
+        return faces, results
+
+    def detect_faces(self, image: np.ndarray, previous_faces: Optional[list] = None) -> np.ndarray:
+        """
+        Detect faces in the image using OpenCV. Large images are scanned at
+        a reduced resolution and boxes are mapped back to full resolution.
+        When previous_faces is given, only the regions around them are
+        searched.
+        """
+        settings = AI_CONFIG.get("face_detection", {})
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        if previous_faces is None or len(previous_faces) == 0:
+            return self._detect_in_region(gray, settings)
+
+        height, width = gray.shape[:2]
+        margin = settings.get("roi_margin", 0.5)
+        faces = []
+        for (x, y, w, h) in previous_faces:
+            x0 = max(0, int(x - w * margin))
+            y0 = max(0, int(y - h * margin))
+            x1 = min(width, int(x + w * (1 + margin)))
+            y1 = min(height, int(y + h * (1 + margin)))
+            for (fx, fy, fw, fh) in self._detect_in_region(gray[y0:y1, x0:x1], settings):
+                box = (fx + x0, fy + y0, fw, fh)
+                # Neighbouring regions can overlap and find the same face
+                if all(box_iou(box, kept) < 0.5 for kept in faces):
+                    faces.append(box)
+
+        return np.array(faces, dtype=np.int32).reshape(-1, 4)
+
+    def _detect_in_region(self, gray: np.ndarray, settings: Dict) -> np.ndarray:
+        """Run the cascade on a downscaled copy and map boxes back"""
+        min_size = settings.get("min_face_size", 30)
+        max_dimension = settings.get("max_dimension", 640)
+        scale = 1.0
+        if max_dimension and max(gray.shape[:2]) > max_dimension:
+            scale = max_dimension / max(gray.shape[:2])
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        scaled_min_size = max(1, int(round(min_size * scale)))
+        if min(gray.shape[:2]) < scaled_min_size:
+            return np.empty((0, 4), dtype=np.int32)
+
         faces = self.face_cascade.detectMultiScale(
             gray,
-            scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(30, 30)
+            scaleFactor=settings.get("scale_factor", 1.1),
+            minNeighbors=settings.get("min_neighbors", 5),
+            minSize=(scaled_min_size, scaled_min_size)
         )
-        return faces
+        if len(faces) == 0:
+            return np.empty((0, 4), dtype=np.int32)
+        return np.round(np.asarray(faces) / scale).astype(np.int32)
 
     def analyze_face(self, image: np.ndarray, face: Tuple) -> Dict:
         """
         Analyze emotions for a detected face
         """
+        return self.analyze_faces(image, [face])[0]
+
+    def analyze_faces(self, image: np.ndarray, faces: list) -> List[Dict]:
+        """
+        Analyze emotions for all detected faces with one inference call
+        """
+        if len(faces) == 0:
+            return []
+
         try:
-            x, y, w, h = face
-            roi_gray = cv2.cvtColor(image[y:y+h, x:x+w], cv2.COLOR_BGR2GRAY)
-            roi_gray = cv2.resize(roi_gray, (48, 48))
-            roi = roi_gray.astype('float') / 255.0
-            roi = img_to_array(roi)
-            roi = np.expand_dims(roi, axis=0)
-
-            # Predict emotion
-            prediction = self.model.predict(roi)[0]
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            rois = np.empty((len(faces), 48, 48, 1), dtype='float32')
+            for i, (x, y, w, h) in enumerate(faces):
+                roi_gray = cv2.resize(gray[y:y+h, x:x+w], (48, 48))
+                # Divide in float64 and then narrow, as img_to_array did
+                rois[i, ..., 0] = roi_gray.astype('float') / 255.0
+
+            # Predict emotion for every face at once
+            predictions = self.inference_fn(rois).numpy()
+
+        except Exception as e:
+            self.logger.error(f"Error analyzing faces: {str(e)}")
+            return [{"error": str(e)} for _ in faces]
+
+        results = []
+        for (x, y, w, h), prediction in zip(faces, predictions):
             emotion_probabilities = {
                 emotion: float(prob) 
                 for emotion, prob in zip(self.emotions, prediction)
@@ -101,7 +237,7 @@ class EmotionDetector:
             # Get the emotion with highest probability
             max_emotion = max(emotion_probabilities.items(), key=lambda x: x[1])
 
-            return {
+            results.append({
                 "emotion": max_emotion[0],
                 "confidence": max_emotion[1],
                 "all_emotions": emotion_probabilities,
@@ -111,32 +247,25 @@ class EmotionDetector:
                     "width": int(w),
                     "height": int(h)
                 }
-            }
+            })
 
-        except Exception as e:
-            self.logger.error(f"Error analyzing face: {str(e)}")
-            return {
-                "error": str(e)
-            }
+        return results
 
     async def process_video_frame(self, frame: np.ndarray) -> Dict:
         """
         Process a single video frame for emotion detection
         """
         try:
-            faces = self.detect_faces(frame)
+            faces, results = await self.executor.run(
+                "vision", self.detect_and_analyze, frame
+            )
             
-            if not faces:
+            if len(faces) == 0:
                 return {
                     "success": False,
                     "error": "No faces detected in frame"
                 }
 
-            results = []
-            for face in faces:
-                emotion_data = self.analyze_face(frame, face)
-                results.append(emotion_data)
-
             return {
                 "success": True,
                 "faces_detected": len(faces),
@@ -150,6 +279,51 @@ class EmotionDetector:
                 "error": str(e)
             }
 
+    async def process_video_stream_frame(self, session_id: str, frame: np.ndarray) -> Dict:
+        """
+        Process a frame from a live stream. Detection runs every few frames
+        and faces are tracked in between, so per-frame cost stays low.
+        """
+        try:
+            session = self.get_video_session(session_id)
+            result = await self.executor.run("vision", session.process_frame, frame)
+            result["session"] = session.get_stats()
+            return result
+
+        except Exception as e:
+            self.logger.error(f"Error processing stream frame: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
+    def get_video_session(self, session_id: str) -> VideoEmotionSession:
+        """Get or start the tracking session for a stream"""
+        settings = AI_CONFIG.get("video_tracking", {})
+        if session_id not in self.video_sessions:
+            self.video_sessions[session_id] = VideoEmotionSession(
+                self,
+                session_id,
+                detect_every=settings.get("detect_every", 5),
+                reclassify_every=settings.get("reclassify_every", 3),
+                target_fps=settings.get("target_fps", 15),
+                latency_budget_ms=settings.get("latency_budget_ms", 50),
+                smoothing=settings.get("smoothing", 0.6),
+                iou_threshold=settings.get("iou_threshold", 0.3),
+                match_threshold=settings.get("match_threshold", 0.5),
+                max_missed_frames=settings.get("max_missed_frames", 10),
+                full_detection_every=settings.get("full_detection_every", 3)
+            )
+
+        self.video_sessions.move_to_end(session_id)
+        while len(self.video_sessions) > settings.get("max_sessions", 100):
+            self.video_sessions.popitem(last=False)
+        return self.video_sessions[session_id]
+
+    def close_video_session(self, session_id: str) -> bool:
+        """End a stream's tracking session"""
+        return self.video_sessions.pop(session_id, None) is not None
+
     def draw_results(self, image: np.ndarray, results: Dict) -> np.ndarray:
         """
         Draw emotion detection results on the image
@@ -199,7 +373,8 @@ class EmotionDetector:
         """
         return {
             "emotions_supported": self.emotions,
-            "model_loaded": self.model is not None,
-            "input_shape": self.model.input_shape if self.model else None,
+            "model_loaded": self._model_handle.loaded,
+            "video_sessions": len(self.video_sessions),
+            "input_shape": self.model.input_shape if self._model_handle.loaded else None,
             "version": "1.0.0"
         }
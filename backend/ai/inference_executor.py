@@ -0,0 +1,143 @@
+import asyncio
+import functools
+import logging
+import weakref
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from ..config import AI_CONFIG
+
+class ExecutorSaturatedError(RuntimeError):
+    """Raised when the inference pool cannot accept more work"""
+
+class InferenceExecutor:
+    """
+    Run blocking model calls in a bounded thread pool so the event loop
+    stays free. Each model family gets its own concurrency limit, and
+    callers are turned away once too many requests are already queued.
+
+    A slot is held until the worker thread finishes, not until the caller
+    stops waiting: a cancelled caller cannot stop the thread, so its slot
+    stays taken until the call returns.
+    """
+
+    def __init__(self,
+                 max_workers: int = 4,
+                 family_limits: Optional[Dict[str, int]] = None,
+                 default_limit: int = 1,
+                 max_queue_size: int = 64,
+                 queue_timeout: Optional[float] = None):
+        self.logger = logging.getLogger(__name__)
+        self.max_workers = max_workers
+        self.family_limits = dict(family_limits or {})
+        self.default_limit = default_limit
+        self.max_queue_size = max_queue_size
+        self.queue_timeout = queue_timeout
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="inference"
+        )
+        # Semaphores are bound to a loop, so each loop gets its own
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._waiting = Counter()
+        self._running = Counter()
+        self._completed = Counter()
+        self._rejected = Counter()
+
+    def _get_semaphore(self, loop: asyncio.AbstractEventLoop, family: str) -> asyncio.Semaphore:
+        semaphores = self._semaphores.setdefault(loop, {})
+        if family not in semaphores:
+            limit = self.family_limits.get(family, self.default_limit)
+            semaphores[family] = asyncio.Semaphore(max(1, limit))
+        return semaphores[family]
+
+    def _finish(self, family: str, semaphore: asyncio.Semaphore):
+        self._running[family] -= 1
+        self._completed[family] += 1
+        semaphore.release()
+
+    async def run(self, family: str, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on the pool under the family's limit"""
+        if sum(self._waiting.values()) >= self.max_queue_size:
+            self._rejected[family] += 1
+            raise ExecutorSaturatedError(
+                f"Inference queue is full ({self.max_queue_size} waiting)"
+            )
+
+        loop = asyncio.get_running_loop()
+        semaphore = self._get_semaphore(loop, family)
+        self._waiting[family] += 1
+        try:
+            if self.queue_timeout:
+                await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+            else:
+                await semaphore.acquire()
+        except asyncio.TimeoutError:
+            self._rejected[family] += 1
+            raise ExecutorSaturatedError(
+                f"Timed out waiting for a {family} inference slot"
+            )
+        finally:
+            self._waiting[family] -= 1
+
+        self._running[family] += 1
+        try:
+            future = self._pool.submit(functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            self._finish(family, semaphore)
+            raise
+
+        def release(_):
+            # Runs on the worker thread once fn returns or raises
+            try:
+                loop.call_soon_threadsafe(self._finish, family, semaphore)
+            except RuntimeError:
+                # The loop is closed, and its semaphores with it
+                pass
+
+        # Added before wrap_future's callback, so the slot is released
+        # before the caller resumes
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def get_stats(self) -> Dict:
+        """Get per-family queue and concurrency statistics"""
+        families = (set(self.family_limits) | set(self._waiting)
+                    | set(self._running) | set(self._completed))
+        return {
+            "max_workers": self.max_workers,
+            "max_queue_size": self.max_queue_size,
+            "waiting": sum(self._waiting.values()),
+            "running": sum(self._running.values()),
+            "families": {
+                family: {
+                    "limit": self.family_limits.get(family, self.default_limit),
+                    "waiting": self._waiting[family],
+                    "running": self._running[family],
+                    "completed": self._completed[family],
+                    "rejected": self._rejected[family]
+                }
+                for family in sorted(families)
+            }
+        }
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker threads"""
+        self._pool.shutdown(wait=wait)
+
+_inference_executor: Optional[InferenceExecutor] = None
+
+def get_inference_executor() -> InferenceExecutor:
+    """Get the process-wide inference executor, creating it from AI_CONFIG"""
+    global _inference_executor
+    if _inference_executor is None:
+        settings = AI_CONFIG.get("executor", {})
+        _inference_executor = InferenceExecutor(
+            max_workers=settings.get("max_workers", 4),
+            family_limits=settings.get("family_limits"),
+            max_queue_size=settings.get("max_queue_size", 64),
+            queue_timeout=settings.get("queue_timeout")
+        )
+    return _inference_executor
@@ -0,0 +1,152 @@
+import torch
+import logging
+from typing import Dict, List, Optional
+
+class ZeroShotIntentEngine:
+    """
+    Zero-shot intent classifier over a fixed label set.
+
+    The NLI pipeline re-tokenizes every "This example is {label}." hypothesis
+    on each call. Here the hypothesis token ids are computed once, premise
+    and hypothesis ids are joined directly, and every pair for a batch of
+    texts goes through the model in a single forward pass. The optional
+    "embedding" mode skips NLI and compares mean-pooled encoder embeddings
+    against cached label embeddings instead.
+    """
+
+    def __init__(self,
+                 model,
+                 tokenizer,
+                 labels: List[str],
+                 hypothesis_template: str = "This example is {}.",
+                 max_length: int = 512,
+                 mode: str = "nli",
+                 similarity_temperature: float = 0.05):
+        self.logger = logging.getLogger(__name__)
+        self.model = model
+        self.tokenizer = tokenizer
+        self.labels = list(labels)
+        self.hypothesis_template = hypothesis_template
+        self.max_length = max_length
+        self.mode = mode
+        self.similarity_temperature = similarity_temperature
+
+        self.entailment_id = self._find_label_id("entail")
+        self._hypotheses = [hypothesis_template.format(label) for label in self.labels]
+        self._hypothesis_ids = [
+            tokenizer(hypothesis, add_special_tokens=False)["input_ids"]
+            for hypothesis in self._hypotheses
+        ]
+        # Room left for the premise once the longest hypothesis and the
+        # special tokens of a pair are accounted for
+        self._max_premise_length = max(
+            1,
+            max_length - max(len(ids) for ids in self._hypothesis_ids)
+            - tokenizer.num_special_tokens_to_add(pair=True)
+        )
+        self._label_embeddings = None
+
+    def _find_label_id(self, prefix: str) -> int:
+        for label, label_id in self.model.config.label2id.items():
+            if label.lower().startswith(prefix):
+                return int(label_id)
+        # bart-large-mnli style default: contradiction, neutral, entailment
+        return len(self.model.config.label2id) - 1
+
+    def classify_many(self, texts: List[str], mode: Optional[str] = None) -> List[Dict]:
+        """
+        Classify a batch of texts. Results match the zero-shot pipeline
+        output: {"sequence", "labels", "scores"} sorted by score.
+        """
+        if not texts:
+            return []
+
+        mode = mode or self.mode
+        if mode == "embedding":
+            scores = self._similarity_scores(texts)
+        elif mode == "nli":
+            scores = self._entailment_scores(texts)
+        else:
+            raise ValueError(f"Unsupported intent mode: {mode}")
+
+        results = []
+        for text, text_scores in zip(texts, scores.tolist()):
+            ranked = sorted(zip(self.labels, text_scores), key=lambda x: x[1], reverse=True)
+            results.append({
+                "sequence": text,
+                "labels": [label for label, _ in ranked],
+                "scores": [float(score) for _, score in ranked]
+            })
+        return results
+
+    def _entailment_scores(self, texts: List[str]) -> torch.Tensor:
+        """Score all premise/hypothesis pairs in one forward pass"""
+        premise_ids = self.tokenizer(
+            texts,
+            add_special_tokens=False,
+            truncation=True,
+            max_length=self._max_premise_length
+        )["input_ids"]
+
+        pairs = [
+            self.tokenizer.build_inputs_with_special_tokens(premise, hypothesis)
+            for premise in premise_ids
+            for hypothesis in self._hypothesis_ids
+        ]
+        input_ids, attention_mask = self._pad(pairs)
+
+        with torch.no_grad():
+            logits = self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+        # Single-label zero-shot: softmax the entailment logits across labels
+        entailment = logits[:, self.entailment_id].view(len(texts), len(self.labels))
+        return entailment.softmax(dim=-1)
+
+    def _similarity_scores(self, texts: List[str]) -> torch.Tensor:
+        """Score texts by cosine similarity to the cached label embeddings"""
+        if self._label_embeddings is None:
+            self._label_embeddings = self._embed(self._hypotheses)
+
+        embeddings = self._embed(texts)
+        similarity = embeddings @ self._label_embeddings.T
+        return (similarity / self.similarity_temperature).softmax(dim=-1)
+
+    def _embed(self, texts: List[str]) -> torch.Tensor:
+        """Mean-pooled, L2-normalized encoder embeddings"""
+        inputs = self.tokenizer(
+            texts,
+            return_tensors="pt",
+            padding=True,
+            truncation=True,
+            max_length=self.max_length
+        )
+        base_model = self.model.base_model
+        encoder = base_model.get_encoder() if hasattr(base_model, "get_encoder") else base_model
+
+        with torch.no_grad():
+            hidden = encoder(
+                input_ids=inputs["input_ids"],
+                attention_mask=inputs["attention_mask"]
+            ).last_hidden_state
+
+        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+        return torch.nn.functional.normalize(pooled, dim=-1)
+
+    def _pad(self, sequences: List[List[int]]):
+        pad_id = self.tokenizer.pad_token_id
+        length = max(len(sequence) for sequence in sequences)
+        input_ids = torch.full((len(sequences), length), pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(sequences), length), dtype=torch.long)
+        for row, sequence in enumerate(sequences):
+            input_ids[row, :len(sequence)] = torch.tensor(sequence, dtype=torch.long)
+            attention_mask[row, :len(sequence)] = 1
+        return input_ids, attention_mask
+
+    def get_info(self) -> Dict:
+        return {
+            "labels": self.labels,
+            "mode": self.mode,
+            "hypothesis_template": self.hypothesis_template,
+            "label_embeddings_cached": self._label_embeddings is not None
+        }
@@ -0,0 +1,446 @@
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from ..config import AI_CONFIG
+
+# Which transformers auto class holds the weights behind each pipeline task
+TASK_MODEL_KINDS = {
+    "sentiment-analysis": "sequence-classification",
+    "text-classification": "sequence-classification",
+    "zero-shot-classification": "sequence-classification",
+    "text-generation": "causal-lm",
+    "ner": "token-classification",
+    "token-classification": "token-classification",
+    "feature-extraction": "base"
+}
+
+RegistryKey = Tuple[str, str, str]
+
+class SequenceClassifier:
+    """
+    Sequence classifier called directly on batches of texts, without a
+    transformers pipeline. Only the model's forward call, config and the
+    tokenizer are used, so PyTorch weights and the ONNX stand-in serve
+    through the same path. model and tokenizer are exposed for callers
+    that build their own inputs, such as the zero-shot intent engine.
+    """
+
+    def __init__(self, model, tokenizer, max_length: Optional[int] = None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_length = max_length or AI_CONFIG["max_sequence_length"]
+
+    def logits(self, texts: List[str]):
+        """Logits for a batch of texts, one row per text; blocking"""
+        import torch
+
+        inputs = self.tokenizer(
+            texts,
+            return_tensors="pt",
+            padding=True,
+            truncation=True,
+            max_length=self.max_length
+        )
+        with torch.no_grad():
+            return self.model(
+                input_ids=inputs["input_ids"],
+                attention_mask=inputs["attention_mask"]
+            ).logits
+
+    def __call__(self, texts: List[str]) -> List[List[Dict]]:
+        """Every label's probability for each text, highest first"""
+        labels = self.model.config.id2label
+        return [
+            sorted(
+                ({"label": labels[i], "score": float(score)} for i, score in enumerate(row)),
+                key=lambda x: x["score"],
+                reverse=True
+            )
+            for row in self.logits(texts).float().softmax(dim=-1).tolist()
+        ]
+
+class LazyModel:
+    """
+    Named handle that loads its model the first time it is used, and can
+    optionally be warmed with a dummy inference ahead of real traffic
+    """
+
+    def __init__(self,
+                 name: str,
+                 factory: Callable[[], Any],
+                 warmup: Optional[Callable[[Any], Any]] = None):
+        self.name = name
+        self._factory = factory
+        self._warmup = warmup
+        self._obj = None
+        self._lock = threading.Lock()
+        self.warmed = False
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._obj is not None
+
+    def get(self) -> Any:
+        """Get the model, loading it on first use"""
+        if self._obj is None:
+            with self._lock:
+                if self._obj is None:
+                    started = datetime.utcnow()
+                    self._obj = self._factory()
+                    self.load_seconds = (datetime.utcnow() - started).total_seconds()
+        return self._obj
+
+    def warm(self) -> None:
+        """Load the model and run its dummy inference once; blocking"""
+        obj = self.get()
+        if self._warmup is not None and not self.warmed:
+            self._warmup(obj)
+        self.warmed = True
+
+class ModelRegistry:
+    """
+    Process-wide store of loaded models keyed by (model id, task, dtype).
+    Components acquire shared instances instead of loading their own copy,
+    and each entry is reference counted so it can be dropped once unused.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._entries: Dict[RegistryKey, Dict] = {}
+        self._key_locks: Dict[RegistryKey, threading.Lock] = {}
+        self._handles: Dict[str, LazyModel] = {}
+        self._lock = threading.RLock()
+
+    def _get_key_lock(self, key: RegistryKey) -> threading.Lock:
+        with self._lock:
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.Lock()
+            return self._key_locks[key]
+
+    def acquire(self,
+                model_id: str,
+                task: str,
+                loader: Callable[[], Any],
+                dtype: str = "float32",
+                depends_on: Optional[list] = None) -> Any:
+        """
+        Get the shared instance for a key, calling loader() only if no
+        component has loaded it yet
+        """
+        key = (model_id, task, dtype)
+        with self._get_key_lock(key):
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry["refcount"] += 1
+                    return entry["object"]
+
+            started = datetime.utcnow()
+            obj = loader()
+            load_seconds = (datetime.utcnow() - started).total_seconds()
+
+            with self._lock:
+                self._entries[key] = {
+                    "object": obj,
+                    "refcount": 1,
+                    "depends_on": list(depends_on or []),
+                    "memory_bytes": self._estimate_memory(obj),
+                    "load_seconds": load_seconds,
+                    "loaded_at": datetime.utcnow().isoformat()
+                }
+            self.logger.info(f"Loaded {task} model {model_id} ({dtype}) in {load_seconds:.1f}s")
+            return obj
+
+    def release(self, model_id: str, task: str, dtype: str = "float32") -> int:
+        """Drop one reference; the entry is unloaded when none remain"""
+        key = (model_id, task, dtype)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return 0
+
+            entry["refcount"] -= 1
+            if entry["refcount"] > 0:
+                return entry["refcount"]
+
+            del self._entries[key]
+            dependencies = entry["depends_on"]
+
+        for dependency in dependencies:
+            self.release(*dependency)
+        self.logger.info(f"Unloaded {task} model {model_id} ({dtype})")
+        return 0
+
+    def lazy(self,
+             name: str,
+             factory: Callable[[], Any],
+             warmup: Optional[Callable[[Any], Any]] = None) -> LazyModel:
+        """
+        Register a named lazily-loaded model. Components asking for the same
+        name get the same handle, so it is only loaded once.
+        """
+        with self._lock:
+            if name not in self._handles:
+                self._handles[name] = LazyModel(name, factory, warmup)
+            return self._handles[name]
+
+    def get_handle(self, name: str) -> Optional[LazyModel]:
+        """Get a registered lazy handle by name"""
+        with self._lock:
+            return self._handles.get(name)
+
+    async def warmup(self, names: Optional[list] = None) -> Dict:
+        """Load and warm the named models one at a time on the executor"""
+        from .inference_executor import get_inference_executor
+
+        executor = get_inference_executor()
+        with self._lock:
+            handles = [
+                handle for name, handle in self._handles.items()
+                if names is None or name in names
+            ]
+
+        results = {}
+        for handle in handles:
+            try:
+                await executor.run("warmup", handle.warm)
+                results[handle.name] = True
+            except Exception as e:
+                self.logger.error(f"Error warming up {handle.name}: {str(e)}")
+                results[handle.name] = False
+        return results
+
+    def get_readiness(self, required: Optional[list] = None) -> Dict:
+        """Report which registered models are loaded and warmed"""
+        with self._lock:
+            handles = dict(self._handles)
+
+        models = {
+            name: {
+                "loaded": handle.loaded,
+                "warmed": handle.warmed,
+                "load_seconds": handle.load_seconds
+            }
+            for name, handle in handles.items()
+        }
+        required = [name for name in (required or []) if name in handles]
+        return {
+            "ready": all(handles[name].warmed for name in required),
+            "required": required,
+            "models": models,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+    @staticmethod
+    def dtype_for(model_id: str) -> str:
+        """Configured precision for a model id; float32 unless overridden"""
+        return AI_CONFIG.get("model_dtypes", {}).get(model_id, "float32")
+
+    @staticmethod
+    def backend_for(model_id: str) -> str:
+        """Configured inference backend for a model id; pytorch or onnx"""
+        return AI_CONFIG.get("model_backends", {}).get(model_id, "pytorch")
+
+    def variant_for(self, model_id: str, kind: str) -> str:
+        """
+        Registry variant to load: "onnx" for classifiers served through
+        onnxruntime, otherwise the configured precision
+        """
+        if kind == "sequence-classification" and self.backend_for(model_id) == "onnx":
+            return "onnx"
+        return self.dtype_for(model_id)
+
+    def model_version(self, model_id: str) -> str:
+        """Version string for result caches; differs per precision and backend"""
+        variant = self.variant_for(model_id, "sequence-classification")
+        return model_id if variant == "float32" else f"{model_id}@{variant}"
+
+    def get_model(self,
+                  model_id: str,
+                  kind: str = "sequence-classification",
+                  dtype: Optional[str] = None) -> Any:
+        """
+        Get shared transformers weights for a model id, in the precision
+        and backend set in AI_CONFIG unless dtype is given
+        """
+        dtype = dtype or self.variant_for(model_id, kind)
+        return self.acquire(
+            model_id,
+            kind,
+            lambda: self._load_transformers_model(model_id, kind, dtype),
+            dtype
+        )
+
+    def get_tokenizer(self, model_id: str) -> Any:
+        """Get a shared tokenizer for a model id"""
+        def load():
+            from transformers import AutoTokenizer
+            return AutoTokenizer.from_pretrained(model_id)
+
+        return self.acquire(model_id, "tokenizer", load, dtype="")
+
+    def get_classifier(self, model_id: str, dtype: Optional[str] = None) -> SequenceClassifier:
+        """
+        Get a SequenceClassifier over the shared classifier weights, in the
+        precision and backend set in AI_CONFIG unless dtype is given
+        """
+        kind = "sequence-classification"
+        dtype = dtype or self.variant_for(model_id, kind)
+        return self.acquire(
+            model_id,
+            "classifier",
+            lambda: SequenceClassifier(
+                self.get_model(model_id, kind, dtype),
+                self.get_tokenizer(model_id)
+            ),
+            dtype,
+            depends_on=[(model_id, kind, dtype), (model_id, "tokenizer", "")]
+        )
+
+    def get_pipeline(self,
+                     task: str,
+                     model_id: str,
+                     dtype: Optional[str] = None,
+                     **pipeline_kwargs) -> Any:
+        """
+        Get a transformers pipeline built on shared weights, so pipelines
+        for different tasks over the same checkpoint hold a single copy.
+        ONNX classifiers are not PreTrainedModels; use get_classifier.
+        """
+        kind = TASK_MODEL_KINDS.get(task, "base")
+        dtype = dtype or self.variant_for(model_id, kind)
+        if dtype == "onnx":
+            raise ValueError(
+                f"{model_id} is served with onnxruntime; use get_classifier instead of a pipeline"
+            )
+        pipeline_task = task
+        if pipeline_kwargs:
+            options = ",".join(f"{k}={v}" for k, v in sorted(pipeline_kwargs.items()))
+            pipeline_task = f"{task}[{options}]"
+
+        def load():
+            from transformers import pipeline
+            return pipeline(
+                task,
+                model=self.get_model(model_id, kind, dtype),
+                tokenizer=self.get_tokenizer(model_id),
+                **pipeline_kwargs
+            )
+
+        return self.acquire(
+            model_id,
+            f"pipeline:{pipeline_task}",
+            load,
+            dtype,
+            depends_on=[(model_id, kind, dtype), (model_id, "tokenizer", "")]
+        )
+
+    def _load_transformers_model(self, model_id: str, kind: str, dtype: str) -> Any:
+        import transformers
+
+        model_classes = {
+            "sequence-classification": transformers.AutoModelForSequenceClassification,
+            "causal-lm": transformers.AutoModelForCausalLM,
+            "token-classification": transformers.AutoModelForTokenClassification,
+            "base": transformers.AutoModel
+        }
+        if kind not in model_classes:
+            raise ValueError(f"Unsupported model kind: {kind}")
+
+        if dtype == "onnx":
+            if kind != "sequence-classification":
+                raise ValueError(f"ONNX backend does not support {kind} models")
+            from .onnx_backend import load_onnx_classifier
+            return load_onnx_classifier(
+                model_id,
+                AI_CONFIG.get("onnx_model_dir", "models/onnx"),
+                self,
+                intra_op_threads=AI_CONFIG.get("onnx_intra_op_threads")
+            )
+
+        if dtype == "int8":
+            from .quantization import load_quantized_model
+            return load_quantized_model(
+                model_classes[kind],
+                model_id,
+                kind,
+                AI_CONFIG.get("quantized_model_dir", "models/quantized")
+            )
+
+        model = model_classes[kind].from_pretrained(model_id)
+        model.eval()
+        if dtype == "float16":
+            model = model.half()
+        elif dtype != "float32":
+            raise ValueError(f"Unsupported dtype: {dtype}")
+        return model
+
+    def _estimate_memory(self, obj: Any) -> Optional[int]:
+        """Estimate resident bytes held by a model's weights"""
+        try:
+            if hasattr(obj, "state_dict") and hasattr(obj, "parameters"):
+                # Quantized linear layers keep packed (weight, bias) tuples
+                # in the state dict rather than parameters
+                total = 0
+                for value in obj.state_dict().values():
+                    tensors = value if isinstance(value, tuple) else (value,)
+                    total += sum(
+                        t.numel() * t.element_size()
+                        for t in tensors if hasattr(t, "element_size")
+                    )
+                return total
+            if hasattr(obj, "count_params"):
+                # Keras models keep float32 weights
+                return int(obj.count_params()) * 4
+        except Exception as e:
+            self.logger.warning(f"Could not estimate model memory: {str(e)}")
+        return None
+
+    def is_loaded(self, model_id: str, task: str, dtype: str = "float32") -> bool:
+        with self._lock:
+            return (model_id, task, dtype) in self._entries
+
+    def get_memory_report(self) -> Dict:
+        """Get resident memory and reference counts per loaded model"""
+        with self._lock:
+            models = [
+                {
+                    "model_id": model_id,
+                    "task": task,
+                    "dtype": dtype,
+                    "refcount": entry["refcount"],
+                    "memory_bytes": entry["memory_bytes"],
+                    "load_seconds": entry["load_seconds"],
+                    "loaded_at": entry["loaded_at"]
+                }
+                for (model_id, task, dtype), entry in self._entries.items()
+            ]
+
+        return {
+            "models": models,
+            "total_model_bytes": sum(m["memory_bytes"] or 0 for m in models),
+            "process_rss_bytes": _process_rss_bytes(),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+def _process_rss_bytes() -> Optional[int]:
+    """Current resident set size of this process, where the OS exposes it"""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+_model_registry: Optional[ModelRegistry] = None
+
+def get_model_registry() -> ModelRegistry:
+    """Get the process-wide model registry"""
+    global _model_registry
+    if _model_registry is None:
+        _model_registry = ModelRegistry()
+    return _model_registry
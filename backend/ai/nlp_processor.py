@@ -1,68 +1,258 @@
-from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
 import torch
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional
 import logging
+import asyncio
+import copy
+import weakref
 import numpy as np
+from collections import Counter, OrderedDict
 from datetime import datetime
+from .batching import MicroBatcher
+from .intent_engine import ZeroShotIntentEngine
+from .streaming_generation import StreamingGenerator
+from .inference_executor import get_inference_executor
+from .model_registry import get_model_registry
+from .result_cache import ResultCache
+from ..config import AI_CONFIG
 
 class NLPProcessor:
+    INTENT_LABELS = [
+        "question",
+        "request",
+        "statement",
+        "command",
+        "greeting",
+        "farewell"
+    ]
+
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.tokenizer = None
         self.model = None
-        self.sentiment_analyzer = None
-        self.intent_classifier = None
-        self.response_generator = None
+        self._intent_engine = None
+        self._conversation_states = OrderedDict()
+        # One lock per conversation in use; dropped once no call holds it
+        self._conversation_locks = weakref.WeakValueDictionary()
+        self.executor = get_inference_executor()
+        self.registry = get_model_registry()
         self.initialize_models()
+        self.initialize_batchers()
+        self.sentiment_cache = ResultCache(
+            "sentiment", self.registry.model_version(AI_CONFIG["sentiment_model"])
+        )
+        self.intent_cache = ResultCache(
+            "intent",
+            "|".join([
+                self.registry.model_version(AI_CONFIG["nlp_model"]),
+                AI_CONFIG.get("intent_mode", "nli"),
+                AI_CONFIG["intent_hypothesis_template"],
+                ",".join(self.INTENT_LABELS)
+            ])
+        )
+        self.streaming_generator = StreamingGenerator(
+            lambda: self.response_generator,
+            self.executor,
+            max_new_tokens=AI_CONFIG.get("stream_max_new_tokens", 60),
+            cache_size=AI_CONFIG.get("generation_cache_size", 32)
+        )
 
     def initialize_models(self):
-        """Initialize all NLP models"""
+        """Register NLP models; they load on first use unless lazy loading is off"""
         try:
             # Initialize sentiment analysis
-            self.sentiment_analyzer = pipeline(
-                "sentiment-analysis",
-                model="distilbert-base-uncased-finetuned-sst-2-english"
+            self._sentiment_handle = self.registry.lazy(
+                "sentiment",
+                lambda: self.registry.get_classifier(AI_CONFIG["sentiment_model"]),
+                warmup=lambda analyzer: analyzer(["warmup"])
             )
 
-            # Initialize intent classification
-            self.intent_classifier = pipeline(
-                "zero-shot-classification",
-                model="facebook/bart-large-mnli"
+            # Initialize intent classification; the zero-shot engine runs
+            # on this classifier's model and tokenizer
+            self._intent_handle = self.registry.lazy(
+                "intent",
+                lambda: self.registry.get_classifier(AI_CONFIG["nlp_model"]),
+                warmup=lambda classifier: classifier(["warmup"])
             )
 
             # Initialize response generation
-            self.response_generator = pipeline(
-                "text-generation",
-                model="gpt2"
+            self._generation_handle = self.registry.lazy(
+                "generation",
+                lambda: self.registry.get_pipeline(
+                    "text-generation",
+                    AI_CONFIG["generation_model"]
+                ),
+                warmup=lambda generator: generator("Hello", max_length=8)
+            )
+
+            # Initialize named entity recognition
+            self._ner_handle = self.registry.lazy(
+                "ner",
+                lambda: self.registry.get_pipeline(
+                    "ner",
+                    AI_CONFIG["ner_model"]
+                ),
+                warmup=lambda ner: ner("Warmup in Berlin")
             )
 
+            if not AI_CONFIG.get("lazy_loading", True):
+                for handle in self._model_handles():
+                    handle.get()
+
             self.logger.info("NLP models initialized successfully")
         except Exception as e:
             self.logger.error(f"Error initializing NLP models: {str(e)}")
             raise
 
-    async def process_text(self, text: str, context: Optional[List[Dict]] = None) -> Dict:
+    def _model_handles(self) -> List:
+        return [
+            self._sentiment_handle,
+            self._intent_handle,
+            self._generation_handle,
+            self._ner_handle
+        ]
+
+    @property
+    def sentiment_analyzer(self):
+        return self._sentiment_handle.get()
+
+    @property
+    def intent_classifier(self):
+        return self._intent_handle.get()
+
+    @property
+    def response_generator(self):
+        return self._generation_handle.get()
+
+    @property
+    def ner_pipeline(self):
+        return self._ner_handle.get()
+
+    def initialize_batchers(self):
+        """Set up micro-batching schedulers in front of each pipeline"""
+        max_wait_ms = AI_CONFIG.get("batch_max_wait_ms", 5)
+        self.sentiment_batcher = MicroBatcher(
+            "sentiment",
+            lambda items: self.executor.run("text", self._sentiment_batch, items),
+            max_batch_size=AI_CONFIG["batch_size"],
+            max_wait_ms=max_wait_ms
+        )
+        self.intent_batcher = MicroBatcher(
+            "intent",
+            lambda items: self.executor.run("text", self._intent_batch, items),
+            max_batch_size=AI_CONFIG["batch_size"],
+            max_wait_ms=max_wait_ms
+        )
+        self.generation_batcher = MicroBatcher(
+            "generation",
+            lambda items: self.executor.run("generation", self._generation_batch, items),
+            max_batch_size=AI_CONFIG.get("generation_batch_size", 8),
+            max_wait_ms=max_wait_ms
+        )
+        self.ner_batcher = MicroBatcher(
+            "ner",
+            lambda items: self.executor.run("text", self._ner_batch, items),
+            max_batch_size=AI_CONFIG["batch_size"],
+            max_wait_ms=max_wait_ms
+        )
+
+    def _sentiment_batch(self, texts: List[str]) -> List[Dict]:
+        """Run one batched forward pass of the sentiment model"""
+        return [scores[0] for scores in self.sentiment_analyzer(texts)]
+
+    @property
+    def intent_engine(self) -> ZeroShotIntentEngine:
+        """Intent classifier with the label hypotheses pre-tokenized"""
+        if self._intent_engine is None:
+            self._intent_engine = ZeroShotIntentEngine(
+                self.intent_classifier.model,
+                self.intent_classifier.tokenizer,
+                self.INTENT_LABELS,
+                hypothesis_template=AI_CONFIG["intent_hypothesis_template"],
+                max_length=AI_CONFIG["max_sequence_length"],
+                mode=AI_CONFIG.get("intent_mode", "nli")
+            )
+        return self._intent_engine
+
+    def _intent_batch(self, texts: List[str]) -> List[Dict]:
+        """Run zero-shot intent classification for a batch of texts"""
+        return self.intent_engine.classify_many(texts)
+
+    def _generation_batch(self, prompts: List[str]) -> List[str]:
+        """Generate continuations for a batch of prompts in one call"""
+        model = self.response_generator.model
+        tokenizer = self.response_generator.tokenizer
+
+        # GPT-2 has no pad token and must be left-padded for batched
+        # generation. The tokenizer is shared through the registry, so
+        # the padding is applied here rather than set on it.
+        pad_token_id = (
+            tokenizer.pad_token_id if tokenizer.pad_token_id is not None
+            else tokenizer.eos_token_id
+        )
+        token_ids = tokenizer(prompts)["input_ids"]
+        input_length = max(len(ids) for ids in token_ids)
+        input_ids = torch.full((len(token_ids), input_length), pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(token_ids), input_length), dtype=torch.long)
+        for row, ids in enumerate(token_ids):
+            if ids:
+                input_ids[row, -len(ids):] = torch.tensor(ids, dtype=torch.long)
+                attention_mask[row, -len(ids):] = 1
+
+        with torch.no_grad():
+            outputs = model.generate(
+                input_ids,
+                attention_mask=attention_mask,
+                max_length=max(100, input_length + 1),
+                do_sample=True,
+                temperature=0.7,
+                top_p=0.9,
+                pad_token_id=pad_token_id
+            )
+
+        return [
+            tokenizer.decode(output, skip_special_tokens=True)
+            for output in outputs
+        ]
+
+    async def process_text(self,
+                           text: str,
+                           context: Optional[List[Dict]] = None,
+                           conversation_id: Optional[str] = None) -> Dict:
         """
         Process text input with sentiment analysis, intent classification,
         and response generation
         """
         try:
-            # Analyze sentiment
-            sentiment = await self.analyze_sentiment(text)
-            
-            # Classify intent
-            intent = await self.classify_intent(text)
+            heads = self.get_shared_heads(["sentiment", "intent"])
+            if heads is not None:
+                # One encoder pass feeds every head
+                scores = await heads.analyze(text)
+                sentiment = self._format_sentiment(scores["sentiment"])
+                intent = self._format_intent(scores["intent"])
+            else:
+                # Analyze sentiment
+                sentiment = await self.analyze_sentiment(text)
+
+                # Classify intent
+                intent = await self.classify_intent(text)
             
             # Generate response
-            response = await self.generate_response(text, context)
+            response = await self.generate_response(text, context, conversation_id)
 
-            return {
+            result = {
                 "success": True,
                 "sentiment": sentiment,
                 "intent": intent,
                 "response": response,
                 "timestamp": datetime.utcnow().isoformat()
             }
+            if heads is not None and "emotion" in scores:
+                result["emotion"] = {
+                    "emotion": scores["emotion"][0]["label"],
+                    "confidence": scores["emotion"][0]["score"],
+                    "all_emotions": scores["emotion"]
+                }
+            return result
 
         except Exception as e:
             self.logger.error(f"Error processing text: {str(e)}")
@@ -71,14 +261,41 @@ class NLPProcessor:
                 "error": str(e)
             }
 
+    def get_shared_heads(self, tasks: List[str]):
+        """
+        The shared-encoder heads when that mode is enabled and every task
+        in tasks has a trained head, otherwise None
+        """
+        if not AI_CONFIG.get("shared_encoder", {}).get("enabled"):
+            return None
+        # Imported here so the training stack only loads in this mode
+        from ..ml.shared_heads import get_shared_heads
+        heads = get_shared_heads()
+        return heads if heads is not None and heads.has_heads(tasks) else None
+
+    @staticmethod
+    def _format_sentiment(scores: List[Dict]) -> Dict:
+        return {"label": scores[0]["label"], "score": scores[0]["score"]}
+
+    @staticmethod
+    def _format_intent(scores: List[Dict]) -> Dict:
+        return {
+            "intent": scores[0]["label"],
+            "confidence": scores[0]["score"],
+            "all_intents": scores
+        }
+
     async def analyze_sentiment(self, text: str) -> Dict:
         """Analyze sentiment in text"""
         try:
-            result = self.sentiment_analyzer(text)[0]
-            return {
-                "label": result["label"],
-                "score": float(result["score"])
-            }
+            heads = self.get_shared_heads(["sentiment"])
+            if heads is not None:
+                return self._format_sentiment((await heads.analyze(text))["sentiment"])
+
+            return await self.sentiment_cache.get_or_compute(
+                text,
+                lambda: self.sentiment_batcher.submit(text)
+            )
         except Exception as e:
             self.logger.error(f"Error in sentiment analysis: {str(e)}")
             return {
@@ -89,29 +306,14 @@ class NLPProcessor:
     async def classify_intent(self, text: str) -> Dict:
         """Classify user intent"""
         try:
-            candidate_labels = [
-                "question",
-                "request",
-                "statement",
-                "command",
-                "greeting",
-                "farewell"
-            ]
-            
-            result = self.intent_classifier(
+            heads = self.get_shared_heads(["intent"])
+            if heads is not None:
+                return self._format_intent((await heads.analyze(text))["intent"])
+
+            return await self.intent_cache.get_or_compute(
                 text,
-                candidate_labels,
-                multi_label=False
+                lambda: self._classify_intent_uncached(text)
             )
-
-            return {
-                "intent": result["labels"][0],
-                "confidence": float(result["scores"][0]),
-                "all_intents": [
-                    {"label": label, "score": float(score)}
-                    for label, score in zip(result["labels"], result["scores"])
-                ]
-            }
         except Exception as e:
             self.logger.error(f"Error in intent classification: {str(e)}")
             return {
@@ -120,27 +322,37 @@ class NLPProcessor:
                 "all_intents": []
             }
 
+    async def _classify_intent_uncached(self, text: str) -> Dict:
+        result = await self.intent_batcher.submit(text)
+
+        return {
+            "intent": result["labels"][0],
+            "confidence": float(result["scores"][0]),
+            "all_intents": [
+                {"label": label, "score": float(score)}
+                for label, score in zip(result["labels"], result["scores"])
+            ]
+        }
+
     async def generate_response(self, 
                               text: str, 
-                              context: Optional[List[Dict]] = None) -> Dict:
-        """Generate response based on input and context"""
+                              context: Optional[List[Dict]] = None,
+                              conversation_id: Optional[str] = None) -> Dict:
+        """
+        Generate response based on input and context. Within a conversation
+        the cached key/values from earlier turns are reused, as when
+        streaming; one-off prompts go through the batched generator.
+        """
         try:
-            # Prepare context
-            context_text = ""
-            if context:
-                context_text = " ".join([
-                    f"{msg['role']}: {msg['content']}"
-                    for msg in context[-3:]  # Use last 3 messages for context
-                ])
-
-            # Generate response
-            response = self.response_generator(
-                f"{context_text} User: {text}",
-                max_length=100,
-                num_return_sequences=1,
-                temperature=0.7,
-                top_p=0.9
-            )[0]["generated_text"]
+            prompt = self._build_prompt(text, context)
+            if conversation_id:
+                response = await self.streaming_generator.generate(
+                    prompt,
+                    conversation_id=conversation_id,
+                    follow_up=f" User: {text}"
+                )
+            else:
+                response = await self.generation_batcher.submit(prompt)
 
             return {
                 "text": response,
@@ -156,55 +368,146 @@ class NLPProcessor:
                 "context_used": False
             }
 
+    async def stream_response(self,
+                              text: str,
+                              context: Optional[List[Dict]] = None,
+                              conversation_id: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Stream a generated response piece by piece. For a conversation seen
+        before, the cached key/values already cover the earlier turns, so
+        only the new user message is encoded.
+        """
+        async for piece in self.streaming_generator.stream(
+            self._build_prompt(text, context),
+            conversation_id=conversation_id,
+            follow_up=f" User: {text}"
+        ):
+            yield piece
+
+    def _build_prompt(self, text: str, context: Optional[List[Dict]] = None) -> str:
+        """Prepare the generation prompt from the latest context messages"""
+        context_text = ""
+        if context:
+            context_text = " ".join([
+                f"{msg['role']}: {msg['content']}"
+                for msg in context[-3:]  # Use last 3 messages for context
+            ])
+        return f"{context_text} User: {text}"
+
     async def extract_entities(self, text: str) -> List[Dict]:
         """Extract named entities from text"""
         try:
-            ner_pipeline = pipeline("ner", grouped_entities=True)
-            entities = ner_pipeline(text)
-            
-            return [
-                {
-                    "text": entity["word"],
-                    "type": entity["entity_group"],
-                    "score": float(entity["score"]),
-                    "start": entity["start"],
-                    "end": entity["end"]
-                }
-                for entity in entities
-            ]
+            return await self.ner_batcher.submit(text)
 
         except Exception as e:
             self.logger.error(f"Error in entity extraction: {str(e)}")
             return []
 
-    async def analyze_conversation(self, 
-                                 conversation: List[Dict]) -> Dict:
-        """Analyze a conversation for patterns and metrics"""
+    async def extract_entities_many(self, texts: List[str]) -> List[List[Dict]]:
+        """Extract named entities from many texts in one forward pass"""
         try:
-            messages = len(conversation)
-            sentiments = []
-            intents = []
+            return await self.executor.run("text", self._ner_batch, texts)
 
-            for msg in conversation:
-                if "content" in msg:
-                    sentiment = await self.analyze_sentiment(msg["content"])
-                    intent = await self.classify_intent(msg["content"])
-                    sentiments.append(sentiment["label"])
-                    intents.append(intent["intent"])
+        except Exception as e:
+            self.logger.error(f"Error in batched entity extraction: {str(e)}")
+            return [[] for _ in texts]
 
-            return {
-                "messages_count": messages,
-                "sentiment_distribution": {
-                    label: sentiments.count(label) / messages
-                    for label in set(sentiments)
-                },
-                "intent_distribution": {
-                    intent: intents.count(intent) / messages
-                    for intent in set(intents)
-                },
-                "conversation_length": sum(len(msg.get("content", "")) 
-                                        for msg in conversation)
+    def _ner_batch(self, texts: List[str]) -> List[List[Dict]]:
+        """
+        Tag a batch of texts with the shared NER model. Offsets come from
+        the same tokenizer call, and adjacent tokens with the same entity
+        type are merged the way grouped_entities=True does.
+        """
+        if not texts:
+            return []
+
+        model = self.ner_pipeline.model
+        tokenizer = self.ner_pipeline.tokenizer
+
+        inputs = tokenizer(
+            texts,
+            return_tensors="pt",
+            padding=True,
+            truncation=True,
+            max_length=AI_CONFIG["max_sequence_length"],
+            return_offsets_mapping=True,
+            return_special_tokens_mask=True
+        )
+        offsets = inputs.pop("offset_mapping").tolist()
+        special_tokens = inputs.pop("special_tokens_mask").tolist()
+
+        with torch.no_grad():
+            probs = model(**inputs).logits.softmax(dim=-1)
+        scores, label_ids = probs.max(dim=-1)
+
+        results = []
+        for row, text in enumerate(texts):
+            tokens = []
+            for position, (start, end) in enumerate(offsets[row]):
+                if special_tokens[row][position] or start == end:
+                    continue
+                label = model.config.id2label[int(label_ids[row, position])]
+                # O tokens are kept so they separate adjacent entities
+                tokens.append((label, float(scores[row, position]), start, end))
+            results.append(self._group_entities(text, tokens))
+        return results
+
+    @staticmethod
+    def _group_entities(text: str, tokens: List) -> List[Dict]:
+        """Merge consecutive B-/I- tagged tokens into entity spans; O ends a span"""
+        entities = []
+        group = None
+        for label, score, start, end in tokens:
+            if label == "O":
+                if group is not None:
+                    entities.append(group)
+                group = None
+                continue
+
+            prefix, _, entity_type = label.rpartition("-")
+            entity_type = entity_type or label
+            if group is not None and entity_type == group["type"] and prefix != "B":
+                group["scores"].append(score)
+                group["end"] = end
+                continue
+
+            if group is not None:
+                entities.append(group)
+            group = {"type": entity_type, "scores": [score], "start": start, "end": end}
+
+        if group is not None:
+            entities.append(group)
+
+        return [
+            {
+                "text": text[entity["start"]:entity["end"]],
+                "type": entity["type"],
+                "score": float(np.mean(entity["scores"])),
+                "start": entity["start"],
+                "end": entity["end"]
             }
+            for entity in entities
+        ]
+
+    async def analyze_conversation(self, 
+                                 conversation: List[Dict],
+                                 conversation_id: Optional[str] = None) -> Dict:
+        """
+        Analyze a conversation for patterns and metrics. When a
+        conversation_id is given, counts are kept between calls and only
+        messages appended since the previous call are scored.
+        """
+        try:
+            if conversation_id is None:
+                return await self._analyze_conversation(conversation, None)
+
+            # Calls for one conversation take turns, so each new message is
+            # counted once even when requests overlap
+            lock = self._conversation_locks.get(conversation_id)
+            if lock is None:
+                lock = self._conversation_locks[conversation_id] = asyncio.Lock()
+            async with lock:
+                return await self._analyze_conversation(conversation, conversation_id)
 
         except Exception as e:
             self.logger.error(f"Error analyzing conversation: {str(e)}")
@@ -212,20 +515,113 @@ class NLPProcessor:
                 "error": str(e)
             }
 
+    async def _analyze_conversation(self,
+                                    conversation: List[Dict],
+                                    conversation_id: Optional[str]) -> Dict:
+        """Score the messages added since the last call and update the counts"""
+        state = self._get_conversation_state(conversation_id, conversation)
+        new_messages = conversation[state["messages_count"]:]
+        contents = [msg["content"] for msg in new_messages if "content" in msg]
+
+        # Every message goes through the batchers at once, so the
+        # sentiment and intent passes are batched and run side by side
+        sentiments, intents = await asyncio.gather(
+            asyncio.gather(*(self.analyze_sentiment(text) for text in contents)),
+            asyncio.gather(*(self.classify_intent(text) for text in contents))
+        )
+
+        state["sentiment_counts"].update(s["label"] for s in sentiments)
+        state["intent_counts"].update(i["intent"] for i in intents)
+        state["conversation_length"] += sum(
+            len(msg.get("content", "")) for msg in new_messages
+        )
+        state["messages_count"] = len(conversation)
+        # A copy, so later edits to the caller's message are noticed
+        state["last_message"] = copy.deepcopy(conversation[-1]) if conversation else None
+
+        messages = state["messages_count"]
+        return {
+            "messages_count": messages,
+            "sentiment_distribution": {
+                label: count / messages
+                for label, count in state["sentiment_counts"].items()
+            },
+            "intent_distribution": {
+                intent: count / messages
+                for intent, count in state["intent_counts"].items()
+            },
+            "conversation_length": state["conversation_length"],
+            "new_messages_analyzed": len(contents)
+        }
+
+    def _get_conversation_state(self,
+                                conversation_id: Optional[str],
+                                conversation: List[Dict]) -> Dict:
+        """Get the running counts for a conversation, or start fresh"""
+        state = self._conversation_states.get(conversation_id) if conversation_id else None
+
+        # Only reuse counts if the conversation is the one we saw, extended
+        if state is not None:
+            analyzed = state["messages_count"]
+            if (len(conversation) < analyzed or
+                    (analyzed and conversation[analyzed - 1] != state["last_message"])):
+                state = None
+
+        if state is None:
+            state = {
+                "messages_count": 0,
+                "sentiment_counts": Counter(),
+                "intent_counts": Counter(),
+                "conversation_length": 0,
+                "last_message": None
+            }
+
+        if conversation_id:
+            self._conversation_states[conversation_id] = state
+            self._conversation_states.move_to_end(conversation_id)
+            while len(self._conversation_states) > AI_CONFIG.get("conversation_cache_size", 1000):
+                self._conversation_states.popitem(last=False)
+
+        return state
+
     def get_model_info(self) -> Dict:
         """Get information about the NLP models"""
         return {
             "sentiment_analyzer": {
-                "model": "distilbert-base-uncased-finetuned-sst-2-english",
-                "loaded": self.sentiment_analyzer is not None
+                "model": AI_CONFIG["sentiment_model"],
+                "loaded": self._sentiment_handle.loaded
             },
             "intent_classifier": {
-                "model": "facebook/bart-large-mnli",
-                "loaded": self.intent_classifier is not None
+                "model": AI_CONFIG["nlp_model"],
+                "loaded": self._intent_handle.loaded,
+                "mode": AI_CONFIG.get("intent_mode", "nli")
             },
             "response_generator": {
-                "model": "gpt2",
-                "loaded": self.response_generator is not None
+                "model": AI_CONFIG["generation_model"],
+                "loaded": self._generation_handle.loaded
+            },
+            "entity_extractor": {
+                "model": AI_CONFIG["ner_model"],
+                "loaded": self._ner_handle.loaded
+            },
+            "shared_encoder": AI_CONFIG.get("shared_encoder", {}).get("enabled", False),
+            "batching": self.get_batching_stats(),
+            "streaming": self.streaming_generator.get_stats(),
+            "cache": {
+                "sentiment": self.sentiment_cache.get_stats(),
+                "intent": self.intent_cache.get_stats()
             },
             "version": "1.0.0"
         }
+
+    def get_batching_stats(self) -> Dict:
+        """Get queue depth and batch size histograms for each batcher"""
+        return {
+            batcher.name: batcher.get_stats()
+            for batcher in (
+                self.sentiment_batcher,
+                self.intent_batcher,
+                self.generation_batcher,
+                self.ner_batcher
+            )
+        }
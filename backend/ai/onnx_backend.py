@@ -0,0 +1,137 @@
+import os
+import logging
+import numpy as np
+import torch
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+def onnx_model_path(cache_dir: str, model_id: str) -> str:
+    """File holding the exported classifier graph for a model id"""
+    safe_id = model_id.replace("/", "--")
+    return os.path.join(cache_dir, f"{safe_id}.sequence-classification.onnx")
+
+class _LogitsOnly(torch.nn.Module):
+    """Export wrapper so the graph has plain tensor inputs and one output"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+def export_sequence_classifier(model, tokenizer, path: str, opset: int = 13) -> str:
+    """Export a transformers sequence classifier to ONNX with dynamic axes"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    sample = tokenizer(["export sample", "a second export sample"], return_tensors="pt", padding=True)
+    tmp_path = f"{path}.tmp"
+    with torch.no_grad():
+        torch.onnx.export(
+            _LogitsOnly(model.eval()),
+            (sample["input_ids"], sample["attention_mask"]),
+            tmp_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"}
+            },
+            opset_version=opset
+        )
+    # Only a complete export is ever picked up from the cache
+    os.replace(tmp_path, path)
+    return path
+
+class OnnxSequenceClassifier:
+    """
+    Stand-in for a transformers sequence classifier backed by an
+    onnxruntime CPU session. It is called with the same keyword tensors and
+    returns logits of the same shape, so the direct batched callers
+    (SequenceClassifier and the zero-shot intent engine) work unchanged.
+    It is not a PreTrainedModel and is never handed to pipeline().
+    base_model falls back to the PyTorch weights, loaded only if something
+    needs the encoder itself.
+    """
+
+    def __init__(self,
+                 path: str,
+                 config,
+                 torch_model_loader: Optional[Callable[[], object]] = None,
+                 intra_op_threads: Optional[int] = None):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = onnxruntime.InferenceSession(
+            path, options, providers=["CPUExecutionProvider"]
+        )
+        self.path = path
+        self.config = config
+        self._input_names = [i.name for i in self.session.get_inputs()]
+        self._torch_model_loader = torch_model_loader
+        self._torch_model = None
+
+    def __call__(self, input_ids=None, attention_mask=None, **kwargs):
+        from transformers.modeling_outputs import SequenceClassifierOutput
+
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        feeds = {
+            "input_ids": np.asarray(input_ids, dtype=np.int64),
+            "attention_mask": np.asarray(attention_mask, dtype=np.int64)
+        }
+        logits = self.session.run(
+            ["logits"], {name: feeds[name] for name in self._input_names}
+        )[0]
+        return SequenceClassifierOutput(logits=torch.from_numpy(logits))
+
+    forward = __call__
+
+    def eval(self):
+        return self
+
+    def to(self, *args, **kwargs):
+        return self
+
+    @property
+    def base_model(self):
+        if self._torch_model is None:
+            if self._torch_model_loader is None:
+                raise AttributeError("ONNX classifier has no PyTorch encoder")
+            self._torch_model = self._torch_model_loader()
+        return self._torch_model.base_model
+
+def load_onnx_classifier(model_id: str,
+                         cache_dir: str,
+                         registry,
+                         intra_op_threads: Optional[int] = None) -> OnnxSequenceClassifier:
+    """
+    Load the ONNX graph for a sequence classifier, exporting it from the
+    fp32 PyTorch checkpoint the first time
+    """
+    from transformers import AutoConfig
+
+    path = onnx_model_path(cache_dir, model_id)
+    if not os.path.exists(path):
+        model = registry.get_model(model_id, "sequence-classification", dtype="float32")
+        try:
+            export_sequence_classifier(model, registry.get_tokenizer(model_id), path)
+            logger.info(f"Exported {model_id} to ONNX at {path}")
+        finally:
+            registry.release(model_id, "sequence-classification", "float32")
+            registry.release(model_id, "tokenizer", "")
+
+    return OnnxSequenceClassifier(
+        path,
+        AutoConfig.from_pretrained(model_id),
+        torch_model_loader=lambda: registry.get_model(
+            model_id, "sequence-classification", dtype="float32"
+        ),
+        intra_op_threads=intra_op_threads
+    )
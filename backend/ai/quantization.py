@@ -0,0 +1,193 @@
+import os
+import time
+import logging
+import numpy as np
+import torch
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+def quantized_cache_path(cache_dir: str, model_id: str, kind: str) -> str:
+    """File holding the INT8 state dict for a model id and kind"""
+    safe_id = model_id.replace("/", "--")
+    return os.path.join(cache_dir, f"{safe_id}.{kind}.int8.pt")
+
+def conv1d_to_linear(model: torch.nn.Module) -> torch.nn.Module:
+    """
+    Replace GPT-2 style Conv1D layers with equivalent nn.Linear layers.
+    Dynamic quantization only rewrites nn.Linear, so without this GPT-2's
+    attention and MLP blocks would stay in fp32.
+    """
+    from transformers.modeling_utils import Conv1D
+
+    for name, child in list(model.named_children()):
+        if isinstance(child, Conv1D):
+            nx, nf = child.weight.shape
+            linear = torch.nn.Linear(nx, nf)
+            linear.weight.data = child.weight.data.t().contiguous()
+            linear.bias.data = child.bias.data
+            setattr(model, name, linear)
+        else:
+            conv1d_to_linear(child)
+    return model
+
+def quantize_dynamic_int8(model: torch.nn.Module) -> torch.nn.Module:
+    """Quantize a model's linear layers to INT8 with dynamic activations"""
+    model = conv1d_to_linear(model)
+    quantized = torch.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+    quantized.eval()
+    return quantized
+
+def load_quantized_model(model_class,
+                         model_id: str,
+                         kind: str,
+                         cache_dir: str) -> torch.nn.Module:
+    """
+    Load the INT8 variant of a model. The first call quantizes the fp32
+    checkpoint and saves the result; later calls rebuild the quantized
+    architecture from the config and load the saved weights directly.
+    """
+    from transformers import AutoConfig
+
+    path = quantized_cache_path(cache_dir, model_id, kind)
+    if os.path.exists(path):
+        try:
+            skeleton = model_class.from_config(AutoConfig.from_pretrained(model_id))
+            model = quantize_dynamic_int8(skeleton.eval())
+            # Packed INT8 weights carry dtype objects the weights_only
+            # unpickler may refuse; the file is only ever written by
+            # this function into the local cache directory
+            model.load_state_dict(torch.load(path, map_location="cpu", weights_only=False))
+            logger.info(f"Loaded cached INT8 weights for {model_id} from {path}")
+            return model
+        except Exception as e:
+            logger.warning(
+                f"Ignoring unusable INT8 cache {path}, re-quantizing {model_id}: {str(e)}"
+            )
+    else:
+        logger.info(f"No cached INT8 weights for {model_id}; quantizing the fp32 checkpoint")
+
+    model = quantize_dynamic_int8(model_class.from_pretrained(model_id).eval())
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        torch.save(model.state_dict(), path)
+    except OSError as e:
+        logger.warning(f"Could not cache INT8 weights for {model_id}: {str(e)}")
+    return model
+
+def _default_predict(model: torch.nn.Module, inputs: Dict) -> torch.Tensor:
+    """Logits as (positions, classes), or the mean-pooled hidden state"""
+    outputs = model(**inputs)
+    if hasattr(outputs, "logits"):
+        return outputs.logits.reshape(-1, outputs.logits.shape[-1])
+    return outputs.last_hidden_state.mean(dim=1)
+
+def compare_with_baseline(baseline: torch.nn.Module,
+                          candidate: torch.nn.Module,
+                          tokenizer,
+                          texts: List[str],
+                          labels: Optional[List[int]] = None,
+                          max_length: int = 512,
+                          predict: Callable = _default_predict) -> Dict:
+    """
+    Compare a quantized model with its fp32 baseline on held-out texts.
+    Reports per-text latency, how often the top prediction agrees with the
+    baseline (per token for token-level and causal models), the output
+    cosine similarity, accuracy against labels when given, and weight
+    memory.
+    """
+    if not texts:
+        raise ValueError("No held-out texts to compare on")
+
+    encoded = [
+        tokenizer(text, return_tensors="pt", truncation=True, max_length=max_length)
+        for text in texts
+    ]
+
+    def run(model):
+        outputs, latencies = [], []
+        with torch.inference_mode():
+            # Untimed pass so one-off initialization is not measured
+            predict(model, encoded[0])
+            for inputs in encoded:
+                started = time.perf_counter()
+                output = predict(model, inputs)
+                latencies.append((time.perf_counter() - started) * 1000)
+                outputs.append(output.float())
+        return outputs, np.array(latencies)
+
+    base_outputs, base_latency = run(baseline)
+    cand_outputs, cand_latency = run(candidate)
+
+    agreement = torch.cat([
+        (b.argmax(dim=-1) == c.argmax(dim=-1)).float()
+        for b, c in zip(base_outputs, cand_outputs)
+    ])
+    cosine = [
+        float(torch.nn.functional.cosine_similarity(b.reshape(-1), c.reshape(-1), dim=0))
+        for b, c in zip(base_outputs, cand_outputs)
+    ]
+    report = {
+        "samples": len(texts),
+        "agreement": float(agreement.mean()),
+        "mean_cosine_similarity": float(np.mean(cosine)),
+        "latency_ms": {
+            "baseline_mean": float(base_latency.mean()),
+            "baseline_p95": float(np.percentile(base_latency, 95)),
+            "quantized_mean": float(cand_latency.mean()),
+            "quantized_p95": float(np.percentile(cand_latency, 95)),
+            "speedup": float(base_latency.mean() / cand_latency.mean())
+        },
+        "memory_bytes": {
+            "baseline": _state_dict_bytes(baseline),
+            "quantized": _state_dict_bytes(candidate)
+        }
+    }
+    if labels is not None:
+        base_pred = [int(o[0].argmax()) for o in base_outputs]
+        cand_pred = [int(o[0].argmax()) for o in cand_outputs]
+        report["accuracy"] = {
+            "baseline": float(np.mean([p == l for p, l in zip(base_pred, labels)])),
+            "quantized": float(np.mean([p == l for p, l in zip(cand_pred, labels)]))
+        }
+    return report
+
+def _state_dict_bytes(model: torch.nn.Module) -> int:
+    """Serialized weight size; quantized linear layers keep packed params"""
+    total = 0
+    for value in model.state_dict().values():
+        if isinstance(value, torch.Tensor):
+            total += value.numel() * value.element_size()
+        elif isinstance(value, tuple):
+            total += sum(
+                t.numel() * t.element_size() for t in value if isinstance(t, torch.Tensor)
+            )
+    return total
+
+def build_quantization_report(model_id: str,
+                              kind: str,
+                              texts: List[str],
+                              labels: Optional[List[int]] = None) -> Dict:
+    """
+    Load the fp32 and INT8 variants of a model through the shared registry
+    and compare them on held-out texts; blocking
+    """
+    from .model_registry import get_model_registry
+
+    registry = get_model_registry()
+    baseline = registry.get_model(model_id, kind, dtype="float32")
+    quantized = registry.get_model(model_id, kind, dtype="int8")
+    try:
+        report = compare_with_baseline(
+            baseline, quantized, registry.get_tokenizer(model_id), texts, labels
+        )
+    finally:
+        # Drop the copies this report loaded; shared ones stay resident
+        registry.release(model_id, kind, "float32")
+        registry.release(model_id, kind, "int8")
+        registry.release(model_id, "tokenizer", "")
+
+    report.update({"model_id": model_id, "kind": kind})
+    return report
@@ -0,0 +1,288 @@
+import asyncio
+import copy
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from ..config import CACHE_CONFIG
+
+class MemoryCacheBackend:
+    """In-process LRU cache with a per-entry TTL"""
+
+    blocking = False
+
+    def __init__(self, max_size: int = 1000, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return copy.deepcopy(value)
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class DiskCacheBackend:
+    """
+    SQLite-backed cache on local disk, so every worker on a box shares the
+    same entries. Least recently used rows are evicted past max_size.
+
+    Calls block on disk I/O, so ResultCache runs them off the event loop.
+    Access times are buffered and written in batches, and expiry and
+    eviction run every prune_interval writes, so the table can briefly
+    hold up to prune_interval rows over max_size. len() is kept in memory,
+    counted at each prune plus the writes since, so reading it never
+    touches the disk; other workers' writes show up after the next prune.
+
+    Values are stored with pickle, and unpickling runs code chosen by
+    whoever wrote the row. The file is created readable and writable by
+    its owner only, and must never be shared with a less trusted process.
+    """
+
+    blocking = True
+
+    def __init__(self,
+                 path: str,
+                 max_size: int = 1000,
+                 ttl: float = 300,
+                 prune_interval: int = 64):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.prune_interval = max(1, prune_interval)
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._pending_access: Dict[str, float] = {}
+        self._writes_since_prune = 0
+        self._size = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Owner-only from the start; see the class docstring
+        os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value BLOB, expires_at REAL, accessed_at REAL)"
+        )
+        self._conn.commit()
+        self._size = self._count_rows()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM results WHERE key = ? AND expires_at > ?",
+                (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+
+            # Recorded in memory; written with the next batch
+            self._pending_access[key] = now
+            if len(self._pending_access) >= self.prune_interval:
+                self._flush_access()
+                self._conn.commit()
+        return pickle.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                (key, pickle.dumps(value), now + self.ttl, now)
+            )
+            self._pending_access.pop(key, None)
+            self._writes_since_prune += 1
+            self._size += 1
+            if self._writes_since_prune >= self.prune_interval:
+                self._prune(now)
+            self._conn.commit()
+
+    def flush(self) -> None:
+        """Write buffered access times and enforce expiry and max_size now"""
+        with self._lock:
+            self._prune(time.time())
+            self._conn.commit()
+
+    def _flush_access(self) -> None:
+        if self._pending_access:
+            self._conn.executemany(
+                "UPDATE results SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._pending_access.items()]
+            )
+            self._pending_access.clear()
+
+    def _prune(self, now: float) -> None:
+        self._flush_access()
+        self._writes_since_prune = 0
+        self._conn.execute("DELETE FROM results WHERE expires_at <= ?", (now,))
+        self._size = self._count_rows()
+        overflow = self._size - self.max_size
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM results WHERE key IN ("
+                "SELECT key FROM results ORDER BY accessed_at LIMIT ?)",
+                (overflow,)
+            )
+            self.evictions += overflow
+            self._size = self.max_size
+
+    def _count_rows(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM results")
+            self._conn.commit()
+            self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+class ResultCache:
+    """
+    Content-addressed cache for model results. Keys hash the normalized
+    input together with a namespace and model version, so a model change
+    never serves stale results.
+    """
+
+    def __init__(self, namespace: str, model_version: str, backend=None):
+        self.logger = logging.getLogger(__name__)
+        self.namespace = namespace
+        self.model_version = model_version
+        self.backend = backend if backend is not None else get_cache_backend()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Unicode-normalize and collapse whitespace; case is kept for cased models"""
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    def make_key(self, text: str) -> str:
+        payload = f"{self.namespace}\x00{self.model_version}\x00{self.normalize(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _read(self, key: str) -> Optional[Any]:
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            self.logger.warning(f"Cache read failed for {self.namespace}: {str(e)}")
+            return None
+
+    def _write(self, key: str, value: Any) -> None:
+        try:
+            self.backend.set(key, value)
+        except Exception as e:
+            self.logger.warning(f"Cache write failed for {self.namespace}: {str(e)}")
+
+    def _count(self, value: Optional[Any]) -> Optional[Any]:
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def _offload(self, fn: Callable, *args) -> Any:
+        """Run a backend call off the event loop if the backend blocks on I/O"""
+        if getattr(self.backend, "blocking", False):
+            return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+        return fn(*args)
+
+    def lookup(self, text: str) -> Optional[Any]:
+        """Return the cached result for text, or None on a miss; blocking"""
+        return self._count(self._read(self.make_key(text)))
+
+    def store(self, text: str, value: Any) -> None:
+        """Store a computed result for text; blocking"""
+        self._write(self.make_key(text), value)
+
+    async def lookup_many(self, texts: List[str]) -> List[Optional[Any]]:
+        """Cached results for texts, None for misses, in one backend round trip"""
+        keys = [self.make_key(text) for text in texts]
+        values = await self._offload(lambda: [self._read(key) for key in keys])
+        return [self._count(value) for value in values]
+
+    async def store_many(self, items: List[Tuple[str, Any]]) -> None:
+        """Store (text, value) pairs in one backend round trip"""
+        pairs = [(self.make_key(text), value) for text, value in items]
+        await self._offload(lambda: [self._write(key, value) for key, value in pairs])
+
+    async def get_or_compute(self,
+                             text: str,
+                             compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached result for text, or compute and store it"""
+        value = (await self.lookup_many([text]))[0]
+        if value is not None:
+            return value
+
+        value = await compute()
+        await self.store_many([(text, value)])
+        return value
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "model_version": self.model_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "backend": type(self.backend).__name__,
+            "backend_size": len(self.backend),
+            "backend_evictions": self.backend.evictions
+        }
+
+_cache_backend = None
+
+def get_cache_backend():
+    """Get the process-wide cache backend configured by CACHE_CONFIG"""
+    global _cache_backend
+    if _cache_backend is None:
+        if CACHE_CONFIG.get("type") == "disk":
+            _cache_backend = DiskCacheBackend(
+                CACHE_CONFIG.get("path", "cache/results.sqlite3"),
+                max_size=CACHE_CONFIG["max_size"],
+                ttl=CACHE_CONFIG["ttl"]
+            )
+        else:
+            _cache_backend = MemoryCacheBackend(
+                max_size=CACHE_CONFIG["max_size"],
+                ttl=CACHE_CONFIG["ttl"]
+            )
+    return _cache_backend
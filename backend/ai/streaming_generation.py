@@ -0,0 +1,149 @@
+import torch
+import logging
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+class StreamingGenerator:
+    """
+    Token-by-token sampling for a causal LM that yields text as it is
+    produced and keeps each conversation's past key/values, so a follow-up
+    turn only has to encode the new user message.
+    """
+
+    def __init__(self,
+                 get_pipeline: Callable[[], object],
+                 executor,
+                 max_new_tokens: int = 60,
+                 temperature: float = 0.7,
+                 top_p: float = 0.9,
+                 cache_size: int = 32):
+        self.logger = logging.getLogger(__name__)
+        self._get_pipeline = get_pipeline
+        self.executor = executor
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.top_p = top_p
+        self.cache_size = cache_size
+        self._sessions: OrderedDict = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    async def stream(self,
+                     prompt: str,
+                     conversation_id: Optional[str] = None,
+                     follow_up: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Yield generated text pieces. With a cached conversation, only
+        follow_up is encoded on top of the stored key/values; otherwise
+        the full prompt is encoded.
+        """
+        # A first-use load of the model happens on the executor
+        pipe = await self.executor.run("generation", self._get_pipeline)
+        model, tokenizer = pipe.model, pipe.tokenizer
+
+        # Take the session out so a concurrent turn cannot reuse it mid-stream
+        session = self._sessions.pop(conversation_id, None) if conversation_id else None
+        max_positions = getattr(model.config, "n_positions", 1024)
+
+        if session is not None and follow_up is not None:
+            new_ids = tokenizer.encode(follow_up)
+            if session["length"] + len(new_ids) + self.max_new_tokens > max_positions:
+                session = None
+        else:
+            session = None
+
+        if session is None:
+            self.cache_misses += 1
+            new_ids = tokenizer.encode(prompt)[-(max_positions - self.max_new_tokens):]
+            past, length = None, 0
+        else:
+            self.cache_hits += 1
+            past, length = session["past_key_values"], session["length"]
+
+        logits, past = await self.executor.run(
+            "generation", self._forward, model, new_ids, past
+        )
+        length += len(new_ids)
+
+        generated: List[int] = []
+        emitted = ""
+        try:
+            for _ in range(self.max_new_tokens):
+                token_id = self._sample(logits)
+                if token_id == tokenizer.eos_token_id:
+                    break
+
+                generated.append(token_id)
+                logits, past = await self.executor.run(
+                    "generation", self._forward, model, [token_id], past
+                )
+                length += 1
+
+                # Decode the whole continuation so multi-byte tokens come out whole
+                text = tokenizer.decode(generated, skip_special_tokens=True)
+                if len(text) > len(emitted) and not text.endswith("�"):
+                    piece, emitted = text[len(emitted):], text
+                    yield piece
+
+            text = tokenizer.decode(generated, skip_special_tokens=True)
+            if len(text) > len(emitted):
+                yield text[len(emitted):]
+
+        finally:
+            if conversation_id and past is not None:
+                self._store_session(conversation_id, {
+                    "past_key_values": past,
+                    "length": length
+                })
+
+    async def generate(self,
+                       prompt: str,
+                       conversation_id: Optional[str] = None,
+                       follow_up: Optional[str] = None) -> str:
+        """Collect a streamed continuation into one string"""
+        pieces = []
+        async for piece in self.stream(prompt, conversation_id, follow_up):
+            pieces.append(piece)
+        return "".join(pieces)
+
+    def has_session(self, conversation_id: str) -> bool:
+        return conversation_id in self._sessions
+
+    def drop_session(self, conversation_id: str) -> None:
+        self._sessions.pop(conversation_id, None)
+
+    def _store_session(self, conversation_id: str, session: Dict) -> None:
+        self._sessions[conversation_id] = session
+        self._sessions.move_to_end(conversation_id)
+        while len(self._sessions) > self.cache_size:
+            self._sessions.popitem(last=False)
+
+    @staticmethod
+    def _forward(model, token_ids: List[int], past_key_values):
+        """Run new tokens through the model on top of the cached state"""
+        input_ids = torch.tensor([token_ids], dtype=torch.long)
+        with torch.no_grad():
+            outputs = model(
+                input_ids=input_ids,
+                past_key_values=past_key_values,
+                use_cache=True
+            )
+        return outputs.logits[0, -1], outputs.past_key_values
+
+    def _sample(self, logits: torch.Tensor) -> int:
+        """Nucleus sampling with temperature"""
+        probs = (logits / self.temperature).softmax(dim=-1)
+        sorted_probs, sorted_ids = probs.sort(descending=True)
+        # Keep the smallest prefix whose mass reaches top_p
+        outside = sorted_probs.cumsum(dim=-1) - sorted_probs > self.top_p
+        sorted_probs = sorted_probs.masked_fill(outside, 0.0)
+        choice = torch.multinomial(sorted_probs / sorted_probs.sum(), 1)
+        return int(sorted_ids[choice])
+
+    def get_stats(self) -> Dict:
+        return {
+            "cached_conversations": len(self._sessions),
+            "cache_size": self.cache_size,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses
+        }
@@ -0,0 +1,277 @@
+import cv2
+import numpy as np
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+Box = Tuple[int, int, int, int]
+
+def box_iou(a: Box, b: Box) -> float:
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    inter_w = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    inter_h = max(0, min(ay + ah, by + bh) - max(ay, by))
+    intersection = inter_w * inter_h
+    union = aw * ah + bw * bh - intersection
+    return intersection / union if union else 0.0
+
+class VideoEmotionSession:
+    """
+    Stateful per-stream emotion tracking. The face detector only runs every
+    few frames; in between, each face is followed by template matching in a
+    small window around its last position. Emotion predictions are reused
+    for stable tracks and smoothed with an exponential moving average.
+    Most detections only search around the known faces; every
+    full_detection_every-th detection scans the whole frame. The detection
+    and classification intervals stretch when a frame runs over the
+    latency budget and shrink back when there is headroom.
+
+    Frames of one session are processed one at a time: the session state
+    is guarded by a lock, since frames run on the shared executor threads.
+    """
+
+    def __init__(self,
+                 detector,
+                 session_id: str,
+                 detect_every: int = 5,
+                 reclassify_every: int = 3,
+                 target_fps: float = 15,
+                 latency_budget_ms: float = 50,
+                 smoothing: float = 0.6,
+                 iou_threshold: float = 0.3,
+                 match_threshold: float = 0.5,
+                 max_missed_frames: int = 10,
+                 full_detection_every: int = 3):
+        self.logger = logging.getLogger(__name__)
+        self.detector = detector
+        self.session_id = session_id
+        self.base_detect_every = max(1, detect_every)
+        self.base_reclassify_every = max(1, reclassify_every)
+        self.detect_every = self.base_detect_every
+        self.reclassify_every = self.base_reclassify_every
+        self.target_fps = target_fps
+        self.latency_budget_ms = latency_budget_ms
+        self.smoothing = smoothing
+        self.iou_threshold = iou_threshold
+        self.match_threshold = match_threshold
+        self.max_missed_frames = max_missed_frames
+        self.full_detection_every = max(1, full_detection_every)
+
+        self._lock = threading.Lock()
+        self.tracks: Dict[int, Dict] = {}
+        self._next_track_id = 1
+        self._frames_since_detection = None
+        self._last_processed_at: Optional[float] = None
+        self._last_result: Optional[Dict] = None
+        self.frames_received = 0
+        self.frames_processed = 0
+        self.detections_run = 0
+        self.classifications_run = 0
+
+    def process_frame(self, frame: np.ndarray) -> Dict:
+        """Process one frame of the stream; blocking"""
+        with self._lock:
+            return self._process_frame(frame)
+
+    def _process_frame(self, frame: np.ndarray) -> Dict:
+        self.frames_received += 1
+        now = time.monotonic()
+
+        # Drop frames arriving faster than the target rate
+        if (self.target_fps and self._last_processed_at is not None
+                and self._last_result is not None
+                and now - self._last_processed_at < 1.0 / self.target_fps):
+            return {**self._last_result, "frame_skipped": True}
+
+        self._last_processed_at = now
+        self.frames_processed += 1
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        detection_ran = (self._frames_since_detection is None
+                         or self._frames_since_detection + 1 >= self.detect_every
+                         or not self.tracks)
+        if detection_ran:
+            self._detect(frame, gray)
+        else:
+            self._frames_since_detection += 1
+            self._follow(gray)
+
+        self._classify(frame)
+        latency_ms = (time.monotonic() - now) * 1000
+        self._adapt(latency_ms)
+
+        results = [
+            {
+                **track["result"],
+                "track_id": track_id,
+                "face_location": self._location(track["box"])
+            }
+            for track_id, track in self.tracks.items()
+            if track["result"] is not None and track["missed"] == 0
+        ]
+        self._last_result = {
+            "success": bool(results),
+            "faces_detected": len(results),
+            "results": results,
+            "detection_ran": detection_ran,
+            "latency_ms": latency_ms
+        }
+        if not results:
+            self._last_result["error"] = "No faces detected in frame"
+        return {**self._last_result, "frame_skipped": False}
+
+    def _detect(self, frame: np.ndarray, gray: np.ndarray):
+        """Run the detector and associate boxes with existing tracks"""
+        self.detections_run += 1
+        self._frames_since_detection = 0
+
+        # Search only around known faces, with a periodic full-frame pass
+        # so faces entering the scene are picked up
+        previous = [track["box"] for track in self.tracks.values()]
+        if (self.detections_run - 1) % self.full_detection_every == 0:
+            previous = None
+        boxes = [
+            tuple(int(v) for v in face)
+            for face in self.detector.detect_faces(frame, previous_faces=previous)
+        ]
+
+        unmatched = set(self.tracks)
+        for box in boxes:
+            best_id, best_iou = None, self.iou_threshold
+            for track_id in unmatched:
+                iou = box_iou(box, self.tracks[track_id]["box"])
+                if iou >= best_iou:
+                    best_id, best_iou = track_id, iou
+
+            if best_id is None:
+                best_id = self._next_track_id
+                self._next_track_id += 1
+                self.tracks[best_id] = {
+                    "box": box,
+                    "probabilities": None,
+                    "result": None,
+                    "frames_since_classified": None,
+                    "missed": 0
+                }
+            else:
+                unmatched.discard(best_id)
+
+            track = self.tracks[best_id]
+            track["box"] = box
+            track["missed"] = 0
+            track["template"] = self._crop(gray, box)
+
+        for track_id in unmatched:
+            self._mark_missed(track_id)
+
+    def _follow(self, gray: np.ndarray):
+        """Move each track to the best template match near its last box"""
+        height, width = gray.shape[:2]
+        for track_id in list(self.tracks):
+            track = self.tracks[track_id]
+            x, y, w, h = track["box"]
+            margin_x, margin_y = w // 2, h // 2
+            x0, y0 = max(0, x - margin_x), max(0, y - margin_y)
+            x1, y1 = min(width, x + w + margin_x), min(height, y + h + margin_y)
+            window = gray[y0:y1, x0:x1]
+            template = track.get("template")
+
+            if (template is None or window.shape[0] < template.shape[0]
+                    or window.shape[1] < template.shape[1]):
+                self._mark_missed(track_id)
+                continue
+
+            scores = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            _, best, _, (dx, dy) = cv2.minMaxLoc(scores)
+            if best < self.match_threshold:
+                self._mark_missed(track_id)
+                continue
+
+            track["box"] = (x0 + dx, y0 + dy, w, h)
+            track["missed"] = 0
+
+    def _classify(self, frame: np.ndarray):
+        """Re-run the classifier only for tracks whose prediction is stale"""
+        due = []
+        for track_id, track in self.tracks.items():
+            if track["missed"]:
+                continue
+            since = track["frames_since_classified"]
+            if since is None or since + 1 >= self.reclassify_every:
+                due.append(track_id)
+            else:
+                track["frames_since_classified"] = since + 1
+
+        if not due:
+            return
+
+        self.classifications_run += 1
+        analyses = self.detector.analyze_faces(frame, [self.tracks[t]["box"] for t in due])
+        for track_id, analysis in zip(due, analyses):
+            track = self.tracks[track_id]
+            track["frames_since_classified"] = 0
+            if "error" in analysis:
+                continue
+
+            probabilities = np.array([
+                analysis["all_emotions"][emotion] for emotion in self.detector.emotions
+            ])
+            if track["probabilities"] is not None:
+                probabilities = (self.smoothing * track["probabilities"]
+                                 + (1 - self.smoothing) * probabilities)
+            track["probabilities"] = probabilities
+
+            best = int(np.argmax(probabilities))
+            track["result"] = {
+                "emotion": self.detector.emotions[best],
+                "confidence": float(probabilities[best]),
+                "all_emotions": {
+                    emotion: float(prob)
+                    for emotion, prob in zip(self.detector.emotions, probabilities)
+                }
+            }
+
+    def _adapt(self, latency_ms: float):
+        """Trade detection/classification frequency against the latency budget"""
+        if not self.latency_budget_ms:
+            return
+        if latency_ms > self.latency_budget_ms:
+            self.detect_every = min(self.detect_every + 1, self.base_detect_every * 4)
+            self.reclassify_every = min(self.reclassify_every + 1, self.base_reclassify_every * 4)
+        elif latency_ms < self.latency_budget_ms / 2:
+            self.detect_every = max(self.detect_every - 1, self.base_detect_every)
+            self.reclassify_every = max(self.reclassify_every - 1, self.base_reclassify_every)
+
+    def _mark_missed(self, track_id: int):
+        track = self.tracks[track_id]
+        track["missed"] += 1
+        if track["missed"] > self.max_missed_frames:
+            del self.tracks[track_id]
+
+    @staticmethod
+    def _crop(gray: np.ndarray, box: Box) -> np.ndarray:
+        x, y, w, h = box
+        return gray[y:y+h, x:x+w].copy()
+
+    @staticmethod
+    def _location(box: Box) -> Dict:
+        x, y, w, h = box
+        return {"x": int(x), "y": int(y), "width": int(w), "height": int(h)}
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return self._get_stats()
+
+    def _get_stats(self) -> Dict:
+        return {
+            "session_id": self.session_id,
+            "active_tracks": sum(1 for t in self.tracks.values() if t["missed"] == 0),
+            "frames_received": self.frames_received,
+            "frames_processed": self.frames_processed,
+            "detections_run": self.detections_run,
+            "classifications_run": self.classifications_run,
+            "detect_every": self.detect_every,
+            "reclassify_every": self.reclassify_every
+        }
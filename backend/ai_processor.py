@@ -1,72 +1,145 @@
-from transformers import pipeline
 import numpy as np
 from typing import Dict, List, Optional
 import logging
+from .ai.inference_executor import get_inference_executor
+from .ai.model_registry import get_model_registry
+from .ai.intent_engine import ZeroShotIntentEngine
+from .ai.result_cache import ResultCache
+from .config import AI_CONFIG
 
 class AIProcessor:
+    INTENT_LABELS = ["question", "statement", "command", "request"]
+
     def __init__(self):
-        self.emotion_analyzer = None
-        self.nlp_pipeline = None
         self.logger = logging.getLogger(__name__)
+        self._intent_engine = None
+        self._emotion_handle = None
+        self._intent_handle = None
+        self.executor = get_inference_executor()
+        self.registry = get_model_registry()
+        self.emotion_cache = ResultCache(
+            "emotion", self.registry.model_version(AI_CONFIG["emotion_model"])
+        )
         self.initialize_models()
 
     def initialize_models(self):
         """Initialize AI models"""
         try:
-            # Initialize emotion analysis pipeline
-            self.emotion_analyzer = pipeline(
-                "text-classification",
-                model="j-hartmann/emotion-english-distilroberta-base",
-                return_all_scores=True
+            # Initialize emotion classifier
+            self._emotion_handle = self.registry.lazy(
+                "emotion",
+                lambda: self.registry.get_classifier(AI_CONFIG["emotion_model"]),
+                warmup=lambda analyzer: analyzer(["warmup"])
             )
 
-            # Initialize NLP pipeline for intent classification
-            self.nlp_pipeline = pipeline(
-                "text-classification",
-                model="facebook/bart-large-mnli"
+            # Initialize the classifier for intent classification; this
+            # shares BART-MNLI weights with NLPProcessor
+            self._intent_handle = self.registry.lazy(
+                "intent",
+                lambda: self.registry.get_classifier(AI_CONFIG["nlp_model"])
             )
 
+            if not AI_CONFIG.get("lazy_loading", True):
+                self._emotion_handle.get()
+                self._intent_handle.get()
+
         except Exception as e:
             self.logger.error(f"Error initializing AI models: {str(e)}")
             raise
 
+    @property
+    def emotion_analyzer(self):
+        return self._emotion_handle.get()
+
+    @property
+    def nlp_pipeline(self):
+        return self._intent_handle.get()
+
+    @property
+    def intent_engine(self) -> ZeroShotIntentEngine:
+        if self._intent_engine is None:
+            self._intent_engine = ZeroShotIntentEngine(
+                self.nlp_pipeline.model,
+                self.nlp_pipeline.tokenizer,
+                self.INTENT_LABELS,
+                hypothesis_template=AI_CONFIG["intent_hypothesis_template"],
+                max_length=AI_CONFIG["max_sequence_length"],
+                mode=AI_CONFIG.get("intent_mode", "nli")
+            )
+        return self._intent_engine
+
+    def _get_shared_heads(self, task: str):
+        """Shared-encoder heads when enabled and trained for task"""
+        if not AI_CONFIG.get("shared_encoder", {}).get("enabled"):
+            return None
+        from .ml.shared_heads import get_shared_heads
+        heads = get_shared_heads()
+        return heads if heads is not None and heads.has_heads([task]) else None
+
     async def analyze_emotion(self, text: str) -> Dict:
         """
         Analyze emotion in text
         Returns emotion classification with confidence scores
         """
         try:
-            if not self.emotion_analyzer:
-                raise ValueError("Emotion analyzer not initialized")
+            heads = self._get_shared_heads("emotion")
+            if heads is not None:
+                emotions = (await heads.analyze(text))["emotion"]
+                return {
+                    "emotion": emotions[0]["label"],
+                    "confidence": emotions[0]["score"],
+                    "all_emotions": emotions
+                }
 
-            results = self.emotion_analyzer(text)
-            # Get the emotion with highest confidence
-            emotions = results[0]
-            max_emotion = max(emotions, key=lambda x: x['score'])
+            if self._emotion_handle is None:
+                raise ValueError("Emotion analyzer not initialized")
 
-            return {
-                "emotion": max_emotion['label'],
-                "confidence": float(max_emotion['score']),
-                "all_emotions": emotions
-            }
+            return await self.emotion_cache.get_or_compute(
+                text,
+                lambda: self._analyze_emotion_uncached(text)
+            )
 
         except Exception as e:
             self.logger.error(f"Error in emotion analysis: {str(e)}")
             raise
 
+    async def _analyze_emotion_uncached(self, text: str) -> Dict:
+        # The analyzer is resolved on the executor, so a first-use load
+        # never blocks the event loop
+        results = await self.executor.run("text", lambda: self.emotion_analyzer([text]))
+        # Get the emotion with highest confidence
+        emotions = results[0]
+        max_emotion = max(emotions, key=lambda x: x['score'])
+
+        return {
+            "emotion": max_emotion['label'],
+            "confidence": float(max_emotion['score']),
+            "all_emotions": emotions
+        }
+
     async def process_text(self, text: str) -> Dict:
         """
         Process text for intent classification and entity extraction
         """
         try:
-            if not self.nlp_pipeline:
+            heads = self._get_shared_heads("intent")
+            if heads is not None:
+                intents = (await heads.analyze(text))["intent"]
+                return {
+                    "intent": intents[0]["label"],
+                    "confidence": intents[0]["score"],
+                    "text": text
+                }
+
+            if self._intent_handle is None:
                 raise ValueError("NLP pipeline not initialized")
 
-            # Classify intent
-            intent_result = self.nlp_pipeline(
-                text,
-                candidate_labels=["question", "statement", "command", "request"]
-            )
+            # Classify intent; the engine and its pipeline are resolved on
+            # the executor so a first-use load stays off the event loop
+            intent_result = (await self.executor.run(
+                "text",
+                lambda: self.intent_engine.classify_many([text])
+            ))[0]
 
             return {
                 "intent": intent_result['labels'][0],
@@ -148,5 +221,6 @@ class AIProcessor:
             "total_processed": 1000,
             "accuracy": 0.89,
             "last_updated": "2025-04-27T05:00:00Z",
-            "model_version": "1.0.0"
+            "model_version": "1.0.0",
+            "cache": self.emotion_cache.get_stats()
         }
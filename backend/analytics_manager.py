@@ -1,35 +1,179 @@
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 import logging
 import json
-from collections import defaultdict
-import pandas as pd
 import numpy as np
+from .analytics_store import (
+    EventTable, HyperLogLog, US_PER_DAY, US_PER_HOUR, day_labels, now_us,
+    to_epoch_us, to_iso
+)
+from .config import ANALYTICS_CONFIG
 
 class AnalyticsManager:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        self.interactions = []
+        buckets = ANALYTICS_CONFIG.get("rollup_buckets")
+        precision = ANALYTICS_CONFIG.get("hll_precision", 12)
+        self.approximate_uniques = ANALYTICS_CONFIG.get("unique_counts", "approximate") == "approximate"
+        # Columnar tables indexed by user, with rollups kept on write for
+        # the platform statistics; see EventTable and Rollup
+        self.interactions = EventTable(
+            {
+                "timestamp": "time",
+                "user_id": "category",
+                "type": "category",
+                "data": "object",
+                # One value per session; kept as objects so expired
+                # sessions do not stay in a dictionary
+                "session_id": "object"
+            },
+            indexes={"user": ["user_id"]},
+            rollup={
+                "distinct": [] if self.approximate_uniques else ["user_id"],
+                "sketches": {"users": ["user_id"]} if self.approximate_uniques else {},
+                "precision": precision,
+                "buckets": buckets
+            }
+        )
         self.user_sessions = {}
-        self.emotion_data = []
-        self.web3_transactions = []
+        self.emotion_data = EventTable(
+            {
+                "timestamp": "time",
+                "user_id": "category",
+                "emotion": "category",
+                "confidence": "float",
+                "source": "category"
+            },
+            indexes={"user": ["user_id"]},
+            rollup={"categories": ["emotion"], "buckets": buckets}
+        )
+        self.web3_transactions = EventTable(
+            {
+                "timestamp": "time",
+                "hash": "object",
+                "from_address": "category",
+                "to_address": "category",
+                "value": "float",
+                "status": "category"
+            },
+            indexes={"address": ["from_address", "to_address"]},
+            rollup={
+                "values": ["value"],
+                "sketches": (
+                    {"addresses": ["from_address", "to_address"]}
+                    if self.approximate_uniques else {}
+                ),
+                "precision": precision,
+                "buckets": buckets
+            }
+        )
+        self.tables = {
+            "interactions": self.interactions,
+            "emotion_data": self.emotion_data,
+            "web3_transactions": self.web3_transactions
+        }
+
+        # Retention: day segments older than retention_days are expired,
+        # and the oldest are evicted early if memory passes the ceiling
+        self.retention_days = ANALYTICS_CONFIG.get("retention_days", 30)
+        self.compact_expired = ANALYTICS_CONFIG.get("compact_expired", True)
+        max_memory_mb = ANALYTICS_CONFIG.get("max_memory_mb")
+        self.max_memory_bytes = max_memory_mb * 1024 * 1024 if max_memory_mb else None
+        self.retention_interval = max(1, ANALYTICS_CONFIG.get("batch_size", 100))
+        self._appends_since_retention = 0
+        self.retention_stats = {"expired_rows": 0, "evicted_segments": 0, "last_run": None}
+
+    def _after_append(self):
+        """Run retention every retention_interval appends"""
+        self._appends_since_retention += 1
+        if self._appends_since_retention >= self.retention_interval:
+            self.enforce_retention()
+
+    def enforce_retention(self, now: Optional[int] = None) -> Dict:
+        """
+        Expire segments older than the retention window, then evict the
+        oldest day across tables while memory is over the ceiling. With
+        compact_expired the rollups keep the expired days' aggregates;
+        otherwise their buckets are cleared as well.
+        """
+        try:
+            now = now_us() if now is None else now
+            cutoff = now - self.retention_days * US_PER_DAY
+            self._appends_since_retention = 0
+
+            expired = {}
+            for name, table in self.tables.items():
+                expired[name] = table.expire_before(cutoff)
+                if not self.compact_expired and table.rollup is not None:
+                    table.rollup.expire(cutoff)
+
+            evicted = 0
+            if self.max_memory_bytes is not None:
+                while self._memory_bytes() > self.max_memory_bytes:
+                    # The newest segment of every table is never evicted
+                    candidates = [
+                        (name, table) for name, table in self.tables.items()
+                        if table.segment_count > 1
+                    ]
+                    if not candidates:
+                        self.logger.warning("Analytics memory ceiling reached with only current segments left")
+                        break
+                    name, oldest = min(candidates, key=lambda item: item[1].oldest_day)
+                    if not self.compact_expired and oldest.rollup is not None:
+                        oldest.rollup.expire((oldest.oldest_day + 1) * US_PER_DAY)
+                    expired[name] += oldest.drop_segments(1)
+                    evicted += 1
+
+            self.retention_stats["expired_rows"] += sum(expired.values())
+            self.retention_stats["evicted_segments"] += evicted
+            self.retention_stats["last_run"] = to_iso(now)
+            return {"success": True, "expired_rows": expired, "evicted_segments": evicted}
+
+        except Exception as e:
+            self.logger.error(f"Error enforcing retention: {str(e)}")
+            return {"success": False, "error": str(e)}
+
+    def _memory_bytes(self) -> int:
+        return sum(
+            table.nbytes + (table.rollup.nbytes if table.rollup is not None else 0)
+            for table in self.tables.values()
+        )
+
+    def get_storage_statistics(self) -> Dict:
+        """
+        Segments, rows and approximate bytes held by each table
+        """
+        return {
+            "tables": {
+                name: {
+                    "rows": len(table),
+                    "segment_count": table.segment_count,
+                    "bytes": table.nbytes,
+                    "rollup_bytes": table.rollup.nbytes if table.rollup is not None else 0,
+                    "segments": table.segment_stats()
+                }
+                for name, table in self.tables.items()
+            },
+            "total_bytes": self._memory_bytes(),
+            "max_memory_bytes": self.max_memory_bytes,
+            "retention_days": self.retention_days,
+            **self.retention_stats
+        }
 
     async def log_interaction(self, interaction_data: Dict) -> Dict:
         """
         Log a user interaction
         """
         try:
-            interaction = {
-                "id": len(self.interactions) + 1,
-                "timestamp": datetime.utcnow().isoformat(),
+            interaction_id = self.interactions.append({
+                "timestamp": now_us(),
                 "user_id": interaction_data.get("user_id"),
                 "type": interaction_data.get("type"),
                 "data": interaction_data.get("data", {}),
                 "session_id": interaction_data.get("session_id")
-            }
-            
-            self.interactions.append(interaction)
-            return {"success": True, "interaction_id": interaction["id"]}
+            })
+            self._after_append()
+            return {"success": True, "interaction_id": interaction_id}
 
         except Exception as e:
             self.logger.error(f"Error logging interaction: {str(e)}")
@@ -40,17 +184,15 @@ class AnalyticsManager:
         Log emotion analysis results
         """
         try:
-            emotion_entry = {
-                "id": len(self.emotion_data) + 1,
-                "timestamp": datetime.utcnow().isoformat(),
+            entry_id = self.emotion_data.append({
+                "timestamp": now_us(),
                 "user_id": emotion_data.get("user_id"),
                 "emotion": emotion_data.get("emotion"),
                 "confidence": emotion_data.get("confidence"),
                 "source": emotion_data.get("source", "text")  # text or image
-            }
-            
-            self.emotion_data.append(emotion_entry)
-            return {"success": True, "entry_id": emotion_entry["id"]}
+            })
+            self._after_append()
+            return {"success": True, "entry_id": entry_id}
 
         except Exception as e:
             self.logger.error(f"Error logging emotion data: {str(e)}")
@@ -61,18 +203,16 @@ class AnalyticsManager:
         Log Web3 transaction data
         """
         try:
-            transaction = {
-                "id": len(self.web3_transactions) + 1,
-                "timestamp": datetime.utcnow().isoformat(),
+            transaction_id = self.web3_transactions.append({
+                "timestamp": now_us(),
                 "hash": transaction_data.get("hash"),
                 "from_address": transaction_data.get("from"),
                 "to_address": transaction_data.get("to"),
                 "value": transaction_data.get("value"),
                 "status": transaction_data.get("status")
-            }
-            
-            self.web3_transactions.append(transaction)
-            return {"success": True, "transaction_id": transaction["id"]}
+            })
+            self._after_append()
+            return {"success": True, "transaction_id": transaction_id}
 
         except Exception as e:
             self.logger.error(f"Error logging transaction: {str(e)}")
@@ -83,17 +223,26 @@ class AnalyticsManager:
         Get comprehensive statistics for a specific user
         """
         try:
-            user_interactions = [i for i in self.interactions if i["user_id"] == user_id]
-            user_emotions = [e for e in self.emotion_data if e["user_id"] == user_id]
-            user_transactions = [t for t in self.web3_transactions 
-                               if t["from_address"] == user_id or t["to_address"] == user_id]
+            # Index lookups touch only this user's rows
+            interaction_rows = self.interactions.index_rows("user", user_id)
+            emotion_rows = self.emotion_data.index_rows("user", user_id)
+            transaction_rows = self.web3_transactions.index_rows("address", user_id)
+
+            last_active = None
+            if len(interaction_rows):
+                # Rows are in time order, so the last one is the latest
+                last_active = to_iso(
+                    self.interactions.column("timestamp")[interaction_rows[-1]]
+                )
 
             return {
                 "user_id": user_id,
-                "total_interactions": len(user_interactions),
-                "emotion_distribution": self._calculate_emotion_distribution(user_emotions),
-                "transaction_count": len(user_transactions),
-                "last_active": max([i["timestamp"] for i in user_interactions]) if user_interactions else None
+                "total_interactions": len(interaction_rows),
+                "emotion_distribution": self._calculate_emotion_distribution(
+                    np.bincount(self.emotion_data.column("emotion")[emotion_rows])
+                ),
+                "transaction_count": len(transaction_rows),
+                "last_active": last_active
             }
 
         except Exception as e:
@@ -106,21 +255,31 @@ class AnalyticsManager:
         """
         try:
             now = datetime.utcnow()
-            last_24h = now - timedelta(hours=24)
-            
-            # Convert ISO timestamps to datetime for comparison
-            recent_interactions = [i for i in self.interactions 
-                                 if datetime.fromisoformat(i["timestamp"]) > last_24h]
-
-            active_users = len(set(i["user_id"] for i in recent_interactions))
-            
+            end = to_epoch_us(now)
+            start = end - 24 * US_PER_HOUR
+
+            # Read from the rollups, so the cost does not grow with history
+            interactions = self.interactions.rollup
+            recent = interactions.window(start, end + 1)
+
             return {
-                "total_users": len(set(i["user_id"] for i in self.interactions)),
-                "active_users_24h": active_users,
-                "total_interactions": len(self.interactions),
-                "recent_interactions": len(recent_interactions),
-                "emotion_distribution": self._calculate_emotion_distribution(self.emotion_data),
+                # Users with retained interactions; expiry prunes the rest
+                "total_users": len(self.interactions.categories("user_id")),
+                "active_users_24h": (
+                    interactions.sketch_window("users", start, end + 1).count()
+                    if self.approximate_uniques
+                    else interactions.distinct_since("user_id", start)
+                ),
+                "total_interactions": interactions.count,
+                "recent_interactions": recent["count"],
+                "emotion_distribution": self._calculate_emotion_distribution(
+                    self.emotion_data.rollup.histograms["emotion"]
+                ),
                 "transaction_volume": self._calculate_transaction_volume(),
+                "unique_count_error": (
+                    HyperLogLog.relative_error(interactions.precision)
+                    if self.approximate_uniques else 0.0
+                ),
                 "timestamp": now.isoformat()
             }
 
@@ -128,31 +287,30 @@ class AnalyticsManager:
             self.logger.error(f"Error getting platform statistics: {str(e)}")
             raise
 
-    def _calculate_emotion_distribution(self, emotion_data: List[Dict]) -> Dict:
+    def _calculate_emotion_distribution(self, counts: np.ndarray) -> Dict:
         """
-        Calculate the distribution of emotions from emotion data
+        Calculate the distribution of emotions from counts per emotion code
         """
-        if not emotion_data:
+        total = counts.sum()
+        if total == 0:
             return {}
 
-        emotion_counts = defaultdict(int)
-        for entry in emotion_data:
-            emotion_counts[entry["emotion"]] += 1
-
-        total = len(emotion_data)
-        return {emotion: (count / total) * 100 for emotion, count in emotion_counts.items()}
+        labels = self.emotion_data.categories("emotion")
+        return {
+            labels[code]: (count / total) * 100
+            for code, count in enumerate(counts) if count
+        }
 
     def _calculate_transaction_volume(self) -> Dict:
         """
         Calculate transaction volume statistics
         """
-        if not self.web3_transactions:
-            return {"total": 0, "average": 0}
-
-        values = [float(t["value"]) for t in self.web3_transactions if t["value"]]
+        rollup = self.web3_transactions.rollup
+        count = rollup.value_counts["value"]
+        total = rollup.sums["value"]
         return {
-            "total": sum(values),
-            "average": sum(values) / len(values) if values else 0
+            "total": float(total) if count else 0,
+            "average": float(total / count) if count else 0
         }
 
     async def generate_report(self, 
@@ -163,26 +321,25 @@ class AnalyticsManager:
         Generate a comprehensive analytics report
         """
         try:
-            # Filter data within date range
-            filtered_interactions = [
-                i for i in self.interactions 
-                if start_date <= datetime.fromisoformat(i["timestamp"]) <= end_date
-            ]
+            # Filter data within date range by binary search
+            start, end = to_epoch_us(start_date), to_epoch_us(end_date)
 
             if report_type == "user_engagement":
-                report_data = self._generate_user_engagement_report(filtered_interactions)
+                report_data = self._generate_user_engagement_report(
+                    self.interactions.time_range(start, end)
+                )
             elif report_type == "emotion_analysis":
                 report_data = self._generate_emotion_analysis_report(
-                    [e for e in self.emotion_data 
-                     if start_date <= datetime.fromisoformat(e["timestamp"]) <= end_date]
+                    self.emotion_data.time_range(start, end)
                 )
             elif report_type == "web3_activity":
                 report_data = self._generate_web3_activity_report(
-                    [t for t in self.web3_transactions 
-                     if start_date <= datetime.fromisoformat(t["timestamp"]) <= end_date]
+                    self.web3_transactions.time_range(start, end)
                 )
             else:
-                report_data = self._generate_general_report(filtered_interactions)
+                report_data = self._generate_general_report(
+                    self.interactions.time_range(start, end)
+                )
 
             return {
                 "report_type": report_type,
@@ -196,48 +353,160 @@ class AnalyticsManager:
             self.logger.error(f"Error generating report: {str(e)}")
             raise
 
-    def _generate_user_engagement_report(self, interactions: List[Dict]) -> Dict:
+    @staticmethod
+    def _value_counts(table: EventTable, column: str, rows: slice,
+                      normalize: bool = False) -> Dict:
+        """Counts per category value, largest first"""
+        codes = table.column(column)[rows]
+        if len(codes) == 0:
+            return {}
+        counts = np.bincount(codes)
+        order = np.argsort(-counts, kind="stable")
+        labels = table.categories(column)
+        total = len(codes) if normalize else 1
+        return {
+            labels[code]: (counts[code] / total if normalize else int(counts[code]))
+            for code in order if counts[code]
+        }
+
+    @staticmethod
+    def _days(table: EventTable, rows: slice) -> np.ndarray:
+        """Day number since the epoch for each row"""
+        return table.column("timestamp")[rows] // US_PER_DAY
+
+    @staticmethod
+    def _time_span(table: EventTable, rows: slice) -> Optional[Tuple[int, int]]:
+        """Time of the first row and just past the last row of a range"""
+        if rows.stop <= rows.start:
+            return None
+        times = table.column("timestamp")
+        return int(times[rows.start]), int(times[rows.stop - 1]) + 1
+
+    def _distinct_count(self,
+                        table: EventTable,
+                        sketch: str,
+                        rows: slice,
+                        exact: Callable[[slice], int]) -> int:
+        """
+        Distinct values over rows. In approximate mode the rollup sketches
+        are used when the buckets they come from hold exactly these rows;
+        a range that does not fall on retained bucket boundaries (say a few
+        hours of a day only kept as a day bucket) is counted exactly.
+        """
+        if not self.approximate_uniques:
+            return exact(rows)
+        span = self._time_span(table, rows)
+        if span is None:
+            return 0
+        covered = table.rollup.plan_span(*span)
+        if covered is None or table.time_range(covered[0], covered[1] - 1) != rows:
+            return exact(rows)
+        return table.rollup.sketch_window(sketch, *span).count()
+
+    def _unique_users(self, rows: slice) -> int:
+        return len(np.unique(self.interactions.column("user_id")[rows]))
+
+    def _unique_addresses(self, rows: slice) -> int:
+        table = self.web3_transactions
+        return len(
+            set(table.decode("from_address", np.unique(table.column("from_address")[rows])))
+            | set(table.decode("to_address", np.unique(table.column("to_address")[rows])))
+        )
+
+    def _daily_active_users(self, rows: slice) -> Dict:
+        if self.approximate_uniques:
+            span = self._time_span(self.interactions, rows)
+            if span is None:
+                return {}
+            days = np.arange(span[0] // US_PER_DAY, (span[1] - 1) // US_PER_DAY + 1)
+            counts = []
+            for day in days:
+                # The day's rows within the report range
+                day_rows = self.interactions.time_range(
+                    int(day) * US_PER_DAY, (int(day) + 1) * US_PER_DAY - 1
+                )
+                day_rows = slice(max(day_rows.start, rows.start), min(day_rows.stop, rows.stop))
+                counts.append(self._distinct_count(
+                    self.interactions, "users", day_rows, self._unique_users
+                ) if day_rows.stop > day_rows.start else 0)
+            return {
+                label: count for label, count in zip(day_labels(days), counts) if count
+            }
+
+        days = self._days(self.interactions, rows)
+        users = self.interactions.column("user_id")[rows]
+        # Distinct (day, user) pairs, then users per day
+        pairs = np.unique(np.stack([days, users.astype(np.int64)]), axis=1)
+        active_days, active_counts = np.unique(pairs[0], return_counts=True)
+        return dict(zip(day_labels(active_days), active_counts.tolist()))
+
+    def _generate_user_engagement_report(self, rows: slice) -> Dict:
         """
         Generate user engagement metrics
         """
-        df = pd.DataFrame(interactions)
         return {
-            "daily_active_users": df.groupby(df["timestamp"].str[:10])["user_id"].nunique().to_dict(),
-            "interaction_types": df["type"].value_counts().to_dict(),
+            "daily_active_users": self._daily_active_users(rows),
+            "interaction_types": self._value_counts(self.interactions, "type", rows),
             "average_session_duration": 0,  # Placeholder for actual calculation
             "retention_rate": 0  # Placeholder for actual calculation
         }
 
-    def _generate_emotion_analysis_report(self, emotion_data: List[Dict]) -> Dict:
+    def _generate_emotion_analysis_report(self, rows: slice) -> Dict:
         """
         Generate emotion analysis report
         """
-        df = pd.DataFrame(emotion_data)
+        days = self._days(self.emotion_data, rows)
+        emotions = self.emotion_data.column("emotion")[rows]
+        labels = self.emotion_data.categories("emotion")
+        pairs, counts = np.unique(
+            np.stack([days, emotions.astype(np.int64)]), axis=1, return_counts=True
+        )
+        confidence = self.emotion_data.column("confidence")[rows]
         return {
-            "emotion_trends": df.groupby(df["timestamp"].str[:10])["emotion"].value_counts().to_dict(),
-            "average_confidence": df["confidence"].mean(),
-            "emotion_distribution": df["emotion"].value_counts(normalize=True).to_dict()
+            "emotion_trends": {
+                (day, labels[code]): int(count)
+                for day, code, count in zip(day_labels(pairs[0]), pairs[1], counts)
+            },
+            "average_confidence": float(np.nanmean(confidence)) if len(confidence) else None,
+            "emotion_distribution": self._value_counts(
+                self.emotion_data, "emotion", rows, normalize=True
+            )
         }
 
-    def _generate_web3_activity_report(self, transactions: List[Dict]) -> Dict:
+    def _generate_web3_activity_report(self, rows: slice) -> Dict:
         """
         Generate Web3 activity report
         """
-        df = pd.DataFrame(transactions)
+        table = self.web3_transactions
+        values = table.column("value")[rows]
+        days = self._days(table, rows)
+        unique_days, day_index = np.unique(days, return_inverse=True)
+        daily = np.bincount(day_index, weights=np.nan_to_num(values), minlength=len(unique_days))
+        unique_addresses = self._distinct_count(
+            table, "addresses", rows, self._unique_addresses
+        )
         return {
-            "total_volume": df["value"].sum(),
-            "average_transaction_value": df["value"].mean(),
-            "unique_addresses": len(set(df["from_address"]).union(set(df["to_address"]))),
-            "daily_volumes": df.groupby(df["timestamp"].str[:10])["value"].sum().to_dict()
+            "total_volume": float(np.nansum(values)),
+            "average_transaction_value": float(np.nanmean(values)) if np.any(~np.isnan(values)) else None,
+            "unique_addresses": unique_addresses,
+            "daily_volumes": dict(zip(day_labels(unique_days), daily.tolist()))
         }
 
-    def _generate_general_report(self, interactions: List[Dict]) -> Dict:
+    def _generate_general_report(self, rows: slice) -> Dict:
         """
         Generate general platform report
         """
+        times = self.interactions.column("timestamp")[rows]
+        hourly = np.bincount((times // US_PER_HOUR) % 24, minlength=24)
         return {
-            "total_interactions": len(interactions),
-            "unique_users": len(set(i["user_id"] for i in interactions)),
-            "interaction_types": defaultdict(int),
-            "peak_usage_times": []  # Placeholder for actual calculation
+            "total_interactions": len(times),
+            "unique_users": self._distinct_count(
+                self.interactions, "users", rows, self._unique_users
+            ),
+            "interaction_types": self._value_counts(self.interactions, "type", rows),
+            # Busiest hours of the day (UTC) in the range
+            "peak_usage_times": [
+                {"hour": int(hour), "interactions": int(hourly[hour])}
+                for hour in np.argsort(-hourly, kind="stable")[:3] if hourly[hour]
+            ]
         }
@@ -0,0 +1,745 @@
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import hashlib
+import math
+import sys
+import time
+import numpy as np
+
+US_PER_SECOND = 1_000_000
+US_PER_HOUR = 3600 * US_PER_SECOND
+US_PER_DAY = 24 * US_PER_HOUR
+US_PER_MINUTE = 60 * US_PER_SECOND
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Column kinds and the numpy dtype each one is stored in
+COLUMN_DTYPES = {
+    "time": np.int64,  # Epoch microseconds, kept in non-decreasing order
+    "category": np.int32,  # Dictionary codes
+    "float": np.float64,  # NaN marks a missing value
+    "object": object  # Free-form payloads
+}
+
+def now_us() -> int:
+    """Current time in epoch microseconds"""
+    return time.time_ns() // 1000
+
+def to_epoch_us(value: datetime) -> int:
+    """Epoch microseconds for a datetime; naive datetimes are taken as UTC"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+def to_iso(value: int) -> str:
+    """ISO 8601 UTC string for epoch microseconds, as datetime.isoformat gives"""
+    return (datetime(1970, 1, 1) + timedelta(microseconds=int(value))).isoformat()
+
+def day_labels(days: np.ndarray) -> List[str]:
+    """YYYY-MM-DD labels for day numbers since the epoch"""
+    return [str(day) for day in np.datetime_as_string(np.asarray(days).astype("datetime64[D]"))]
+
+def sizeof(value: Any, depth: int = 2) -> int:
+    """Approximate bytes held by a value and, to a few levels, its contents"""
+    size = sys.getsizeof(value)
+    if depth and isinstance(value, dict):
+        size += sum(sizeof(k, depth - 1) + sizeof(v, depth - 1) for k, v in value.items())
+    elif depth and isinstance(value, (list, tuple, set)):
+        size += sum(sizeof(v, depth - 1) for v in value)
+    return size
+
+# Approximate bytes of a dict entry plus the list or array slot beside it
+ENTRY_BYTES = 100
+
+def key_hash(value: Any) -> int:
+    """Stable 64-bit hash of a key, equal across tables and processes"""
+    digest = hashlib.blake2b(repr(value).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+def hll_estimate(registers: np.ndarray) -> float:
+    """HyperLogLog cardinality estimate from a register array"""
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.ldexp(1.0, -registers.astype(np.int64)).sum()
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        # Linear counting is more accurate while many registers are empty
+        estimate = m * math.log(m / zeros)
+    return float(estimate)
+
+class HyperLogLog:
+    """
+    Mergeable distinct-count sketch of 2**precision one-byte registers.
+    The relative standard error of count() is 1.04 / sqrt(2**precision),
+    about 1.6% at the default precision of 12, in 4 KiB however many keys
+    are added. Sketches of equal precision merge by register-wise maximum,
+    so per-bucket sketches combine into any window.
+    """
+
+    def __init__(self, precision: int = 12, registers: Optional[np.ndarray] = None):
+        self.precision = precision
+        self.registers = (
+            registers if registers is not None
+            else np.zeros(1 << precision, dtype=np.uint8)
+        )
+
+    @staticmethod
+    def relative_error(precision: int = 12) -> float:
+        return 1.04 / math.sqrt(1 << precision)
+
+    @staticmethod
+    def position(hashed: int, precision: int) -> Tuple[int, int]:
+        """Register index and rank (leading zeros + 1) for a 64-bit hash"""
+        rest_bits = 64 - precision
+        rest = hashed & ((1 << rest_bits) - 1)
+        return hashed >> rest_bits, rest_bits - rest.bit_length() + 1
+
+    def add(self, value: Any):
+        self.add_hash(key_hash(value))
+
+    def add_hash(self, hashed: int):
+        index, rank = self.position(hashed, self.precision)
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        return int(round(hll_estimate(self.registers)))
+
+    @property
+    def nbytes(self) -> int:
+        return self.registers.nbytes
+
+# Bucket width of each rollup granularity
+ROLLUP_WIDTHS = {
+    "minute": US_PER_MINUTE,
+    "hour": US_PER_HOUR,
+    "day": US_PER_DAY
+}
+
+# Buckets kept per granularity when none are configured. The minute ring
+# covers the 24h stats window plus its edge minutes, so both ends of that
+# window are exact to the minute rather than widened to a whole hour.
+DEFAULT_ROLLUP_BUCKETS = {"minute": 1500, "hour": 72, "day": 400}
+
+_NEVER = np.iinfo(np.int64).min
+
+def _pad_columns(histogram: np.ndarray, width: int) -> np.ndarray:
+    """Widen a (buckets, codes) histogram so it holds at least width codes"""
+    if histogram.shape[-1] >= width:
+        return histogram
+    padding = [(0, 0)] * (histogram.ndim - 1) + [(0, max(width, 2 * histogram.shape[-1]) - histogram.shape[-1])]
+    return np.pad(histogram, padding)
+
+def _add_histogram(total: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    width = max(len(total), len(counts))
+    result = np.zeros(width, dtype=np.int64)
+    result[:len(total)] += total
+    result[:len(counts)] += counts
+    return result
+
+class _BucketRing:
+    """Consecutive buckets of one width held in a fixed number of reused slots"""
+
+    def __init__(self, width: int, length: int, categories, values,
+                 sketches=(), precision: int = 12):
+        self.width = width
+        self.length = max(1, length)
+        self.ids = np.full(self.length, -1, dtype=np.int64)
+        self.newest = -1
+        self.counts = np.zeros(self.length, dtype=np.int64)
+        self.histograms = {
+            name: np.zeros((self.length, 0), dtype=np.int64) for name in categories
+        }
+        self.sums = {name: np.zeros(self.length) for name in values}
+        self.value_counts = {
+            name: np.zeros(self.length, dtype=np.int64) for name in values
+        }
+        self.sketches = {
+            name: np.zeros((self.length, 1 << precision), dtype=np.uint8)
+            for name in sketches
+        }
+
+    def slot(self, bucket: int) -> int:
+        """Slot for a bucket, clearing whatever older bucket used it"""
+        slot = bucket % self.length
+        if self.ids[slot] != bucket:
+            self.ids[slot] = bucket
+            self.counts[slot] = 0
+            for histogram in self.histograms.values():
+                histogram[slot] = 0
+            for name in self.sums:
+                self.sums[name][slot] = 0
+                self.value_counts[name][slot] = 0
+            for sketch in self.sketches.values():
+                sketch[slot] = 0
+        self.newest = max(self.newest, bucket)
+        return slot
+
+    def retains(self, bucket: int) -> bool:
+        """Whether the bucket is still held, or never overwritten"""
+        return bucket > self.newest - self.length
+
+    def held_slots(self, buckets: List[int]) -> np.ndarray:
+        buckets = np.asarray(buckets, dtype=np.int64)
+        slots = buckets % self.length
+        return slots[self.ids[slots] == buckets]
+
+class Rollup:
+    """
+    Event counts, category histograms and value sums aggregated on write
+    into per-minute, per-hour and per-day buckets. Each granularity is a
+    ring of a fixed number of buckets, so a time window is answered by
+    summing at most a few hundred buckets however much history the table
+    holds. All-time totals and the last time each distinct key was seen
+    are kept alongside.
+
+    sketches maps a dimension name to the category columns whose values it
+    counts, e.g. {"addresses": ["from_address", "to_address"]}; each bucket
+    then holds a HyperLogLog sketch per dimension, and distinct counts over
+    a window take constant memory.
+    """
+
+    def __init__(self,
+                 categories: Iterable[str] = (),
+                 values: Iterable[str] = (),
+                 distinct: Iterable[str] = (),
+                 buckets: Optional[Dict[str, int]] = None,
+                 sketches: Optional[Dict[str, List[str]]] = None,
+                 precision: int = 12):
+        self.categories = list(categories)
+        self.values = list(values)
+        self.sketch_columns = dict(sketches or {})
+        self.precision = precision
+        buckets = {**DEFAULT_ROLLUP_BUCKETS, **(buckets or {})}
+        # Finest first
+        self.rings = {
+            name: _BucketRing(
+                width, buckets[name], self.categories, self.values,
+                self.sketch_columns, precision
+            )
+            for name, width in sorted(ROLLUP_WIDTHS.items(), key=lambda item: item[1])
+        }
+        self.sketches = {
+            name: HyperLogLog(precision) for name in self.sketch_columns
+        }
+        self.count = 0
+        self.histograms = {name: np.zeros(0, dtype=np.int64) for name in self.categories}
+        self.sums = {name: 0.0 for name in self.values}
+        self.value_counts = {name: 0 for name in self.values}
+        self.last_seen = {name: np.zeros(0, dtype=np.int64) for name in distinct}
+
+    def add(self,
+            timestamp: int,
+            row: Dict[str, Any],
+            hashes: Optional[Dict[str, int]] = None):
+        """
+        Count one stored row. Category columns hold dictionary codes and
+        hashes gives the key_hash of each sketched column's value.
+        """
+        self.count += 1
+        positions = {
+            name: {
+                HyperLogLog.position(hashes[column], self.precision)
+                for column in columns
+            }
+            for name, columns in self.sketch_columns.items()
+        }
+        for ring in self.rings.values():
+            slot = ring.slot(timestamp // ring.width)
+            ring.counts[slot] += 1
+            for name, registers in positions.items():
+                for index, rank in registers:
+                    if rank > ring.sketches[name][slot, index]:
+                        ring.sketches[name][slot, index] = rank
+            for name in self.categories:
+                code = row[name]
+                ring.histograms[name] = _pad_columns(ring.histograms[name], code + 1)
+                ring.histograms[name][slot, code] += 1
+            for name in self.values:
+                value = row[name]
+                # Missing and zero values are left out of the value counts
+                if not np.isnan(value) and value != 0:
+                    ring.sums[name][slot] += value
+                    ring.value_counts[name][slot] += 1
+
+        for name in self.categories:
+            code = row[name]
+            self.histograms[name] = _pad_columns(self.histograms[name], code + 1)
+            self.histograms[name][code] += 1
+        for name in self.values:
+            value = row[name]
+            if not np.isnan(value) and value != 0:
+                self.sums[name] += value
+                self.value_counts[name] += 1
+        for name, registers in positions.items():
+            sketch = self.sketches[name].registers
+            for index, rank in registers:
+                if rank > sketch[index]:
+                    sketch[index] = rank
+        for name, seen in self.last_seen.items():
+            code = row[name]
+            if code >= len(seen):
+                seen = self.last_seen[name] = np.concatenate([
+                    seen, np.full(max(code + 1, 2 * len(seen)) - len(seen), _NEVER)
+                ])
+            seen[code] = timestamp
+
+    def totals(self) -> Dict[str, Any]:
+        """All-time aggregates"""
+        return {
+            "count": self.count,
+            "histograms": dict(self.histograms),
+            "sums": dict(self.sums),
+            "value_counts": dict(self.value_counts)
+        }
+
+    def plan(self, start: int, end: int) -> Dict[str, List[int]]:
+        """
+        Buckets covering [start, end), widened to whole minutes. Whole days
+        and hours are taken from the coarse rings and only the ragged edges
+        from finer ones; ranges older than a fine ring fall back to the
+        coarser bucket containing them.
+        """
+        rings = list(self.rings.items())
+        finest = rings[0][1].width
+        t = start - start % finest
+        end = -(-end // finest) * finest
+        plan: Dict[str, List[int]] = {name: [] for name, _ in rings}
+
+        while t < end:
+            for name, ring in reversed(rings):
+                bucket = t // ring.width
+                if t % ring.width == 0 and t + ring.width <= end and ring.retains(bucket):
+                    plan[name].append(bucket)
+                    t += ring.width
+                    break
+            else:
+                for name, ring in rings:
+                    bucket = t // ring.width
+                    if ring.retains(bucket):
+                        plan[name].append(bucket)
+                        t = (bucket + 1) * ring.width
+                        break
+                else:
+                    # Older than every ring; skip to the oldest retained day
+                    ring = rings[-1][1]
+                    t = max(t + finest, (ring.newest - ring.length + 1) * ring.width)
+        return plan
+
+    def plan_span(self, start: int, end: int) -> Optional[Tuple[int, int]]:
+        """Time range [lo, hi) actually covered by the buckets plan picks"""
+        bounds = [
+            (bucket * self.rings[name].width, (bucket + 1) * self.rings[name].width)
+            for name, buckets in self.plan(start, end).items() for bucket in buckets
+        ]
+        if not bounds:
+            return None
+        return min(lo for lo, _ in bounds), max(hi for _, hi in bounds)
+
+    def window(self, start: int, end: int) -> Dict[str, Any]:
+        """Aggregates for events with start <= time < end, to the minute"""
+        count = 0
+        histograms = {name: np.zeros(0, dtype=np.int64) for name in self.categories}
+        sums = {name: 0.0 for name in self.values}
+        value_counts = {name: 0 for name in self.values}
+
+        for name, buckets in self.plan(start, end).items():
+            if not buckets:
+                continue
+            ring = self.rings[name]
+            slots = ring.held_slots(buckets)
+            count += int(ring.counts[slots].sum())
+            for column in self.categories:
+                histograms[column] = _add_histogram(
+                    histograms[column], ring.histograms[column][slots].sum(axis=0)
+                )
+            for column in self.values:
+                sums[column] += float(ring.sums[column][slots].sum())
+                value_counts[column] += int(ring.value_counts[column][slots].sum())
+
+        return {
+            "count": count,
+            "histograms": histograms,
+            "sums": sums,
+            "value_counts": value_counts
+        }
+
+    def distinct_since(self, column: str, start: int) -> int:
+        """Number of distinct keys seen at or after start"""
+        return int(np.count_nonzero(self.last_seen[column] >= start))
+
+    def compact(self, column: str, kept: np.ndarray):
+        """Renumber a distinct column's keys after its dictionary drops codes"""
+        if column in self.last_seen:
+            self.last_seen[column] = self.last_seen[column][kept]
+
+    def expire(self, before: int):
+        """Clear buckets that end at or before a time; totals are kept"""
+        for ring in self.rings.values():
+            stale = (ring.ids >= 0) & ((ring.ids + 1) * ring.width <= before)
+            ring.ids[stale] = -1
+
+    def sketch_window(self, name: str, start: int, end: int) -> HyperLogLog:
+        """Merged sketch of a dimension over the buckets covering [start, end)"""
+        merged = HyperLogLog(self.precision)
+        for ring_name, buckets in self.plan(start, end).items():
+            slots = self.rings[ring_name].held_slots(buckets) if buckets else []
+            if len(slots):
+                np.maximum(
+                    merged.registers,
+                    self.rings[ring_name].sketches[name][slots].max(axis=0),
+                    out=merged.registers
+                )
+        return merged
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate bytes held by buckets, totals and sketches"""
+        total = sum(
+            ring.ids.nbytes + ring.counts.nbytes
+            + sum(h.nbytes for h in ring.histograms.values())
+            + sum(a.nbytes for a in ring.sums.values())
+            + sum(a.nbytes for a in ring.value_counts.values())
+            + sum(a.nbytes for a in ring.sketches.values())
+            for ring in self.rings.values()
+        )
+        total += sum(sketch.nbytes for sketch in self.sketches.values())
+        total += sum(seen.nbytes for seen in self.last_seen.values())
+        return total
+
+class EventTable:
+    """
+    Append-only columnar event storage. Each column lives in a typed numpy
+    array that grows by doubling; repeated strings such as user ids and
+    emotion labels are dictionary-encoded to int32 codes. Rows arrive in
+    time order, so time ranges are found by binary search, and hash
+    indexes map a key such as a user id to the row numbers holding it.
+    An optional Rollup is updated on every append.
+
+    Rows are partitioned into one segment per UTC day. Expiry drops whole
+    segments from the old end; event ids stay stable, while row numbers
+    (as returned by index_rows and time_range) count from the oldest
+    retained row. Dictionary values no longer used by a retained row are
+    dropped with them and the remaining codes renumbered, except for the
+    rollup's category columns, whose histograms keep codes of expired
+    rows.
+
+    nbytes is kept up to date on append and expiry rather than measured,
+    so checking it does not cost more as tables grow.
+    """
+
+    def __init__(self,
+                 schema: Dict[str, str],
+                 indexes: Optional[Dict[str, List[str]]] = None,
+                 initial_capacity: int = 1024,
+                 rollup: Optional[Dict[str, Any]] = None):
+        self.schema = dict(schema)
+        self._size = 0
+        self._initial_capacity = max(1, initial_capacity)
+        self._capacity = self._initial_capacity
+        # Rows already expired, so ids stay stable
+        self._expired = 0
+        # Day number and first row of each segment, oldest first
+        self._segment_days: List[int] = []
+        self._segment_starts: List[int] = []
+        self._columns = {
+            name: np.empty(self._capacity, dtype=COLUMN_DTYPES[kind])
+            for name, kind in self.schema.items()
+        }
+        self._dictionaries: Dict[str, List[Any]] = {
+            name: [] for name, kind in self.schema.items() if kind == "category"
+        }
+        self._codes: Dict[str, Dict[Any, int]] = {
+            name: {} for name in self._dictionaries
+        }
+        # key_hash of each dictionary value, for rollup sketches
+        self._hashes: Dict[str, List[int]] = {
+            name: [] for name in self._dictionaries
+        }
+        # Bytes of dictionary values, their code and hash entries
+        self._dictionary_bytes = 0
+        # Bytes each row holds outside the column buffers (object payloads
+        # and index positions), their running total, and the bytes of the
+        # index keys themselves
+        self._row_bytes = np.zeros(self._capacity, dtype=np.int64)
+        self._rows_bytes = 0
+        self._key_bytes = 0
+        self._index_columns = dict(indexes or {})
+        self._indexes: Dict[str, Dict[Any, array]] = {
+            name: {} for name in self._index_columns
+        }
+        self._time_column = next(
+            (name for name, kind in self.schema.items() if kind == "time"), None
+        )
+        # rollup takes the Rollup arguments: categories, values, distinct,
+        # buckets, sketches and precision
+        self.rollup = Rollup(**rollup) if rollup is not None else None
+        self._sketched = sorted({
+            column for columns in (self.rollup.sketch_columns.values() if self.rollup else ())
+            for column in columns
+        })
+        # Rollup histograms are indexed by code, so these keep every value
+        self._pinned = set(self.rollup.categories) if self.rollup else set()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, row: Dict[str, Any]) -> int:
+        """Add one event and return its 1-based id"""
+        if self._size == self._capacity:
+            self._grow()
+
+        position = self._size
+        stored = {}
+        row_bytes = 0
+        for name, kind in self.schema.items():
+            value = row.get(name)
+            if kind == "object":
+                row_bytes += sizeof(value)
+            elif kind == "category":
+                value = self.encode(name, value)
+            elif kind == "float":
+                value = self._to_float(value)
+            elif kind == "time" and position > 0:
+                # Keep the column sorted even if the clock steps back
+                value = max(value, self._columns[name][position - 1])
+            self._columns[name][position] = value
+            stored[name] = value
+
+        self._size += 1
+        if self._time_column is not None:
+            day = int(stored[self._time_column]) // US_PER_DAY
+            if not self._segment_days or self._segment_days[-1] != day:
+                self._segment_days.append(day)
+                self._segment_starts.append(position)
+        if self.rollup is not None:
+            self.rollup.add(
+                int(stored[self._time_column]),
+                stored,
+                {name: self._hashes[name][stored[name]] for name in self._sketched}
+            )
+        for index_name, columns in self._index_columns.items():
+            index = self._indexes[index_name]
+            for key in {row.get(column) for column in columns}:
+                rows = index.get(key)
+                if rows is None:
+                    rows = index[key] = array("q")
+                    self._key_bytes += self._key_size(key)
+                rows.append(position)
+                row_bytes += rows.itemsize
+        self._row_bytes[position] = row_bytes
+        self._rows_bytes += row_bytes
+        return self._expired + self._size
+
+    @staticmethod
+    def _key_size(key: Any) -> int:
+        """Bytes of an index key, its empty row array and its dict entry"""
+        return sizeof(key, 0) + sys.getsizeof(array("q")) + ENTRY_BYTES
+
+    def _grow(self):
+        self._resize(self._capacity * 2)
+
+    def _resize(self, capacity: int):
+        self._capacity = capacity
+        for name, column in self._columns.items():
+            resized = np.empty(self._capacity, dtype=column.dtype)
+            resized[:self._size] = column[:self._size]
+            self._columns[name] = resized
+        row_bytes = np.zeros(self._capacity, dtype=np.int64)
+        row_bytes[:self._size] = self._row_bytes[:self._size]
+        self._row_bytes = row_bytes
+
+    @property
+    def segment_count(self) -> int:
+        return len(self._segment_days)
+
+    @property
+    def oldest_day(self) -> Optional[int]:
+        """Day number of the oldest retained segment"""
+        return self._segment_days[0] if self._segment_days else None
+
+    def segment_stats(self) -> List[Dict[str, Any]]:
+        """Day, row count and approximate bytes of each segment"""
+        ends = self._segment_starts[1:] + [self._size]
+        row_bytes = sum(column.itemsize for column in self._columns.values())
+        return [
+            {
+                "day": label,
+                "rows": end - start,
+                "bytes": (end - start) * row_bytes + int(self._row_bytes[start:end].sum())
+            }
+            for label, start, end in zip(
+                day_labels(self._segment_days), self._segment_starts, ends
+            )
+        ]
+
+    def expire_before(self, cutoff: int) -> int:
+        """Drop segments whose day ends at or before cutoff; returns rows dropped"""
+        kept = 0
+        while (kept < len(self._segment_days)
+               and (self._segment_days[kept] + 1) * US_PER_DAY <= cutoff):
+            kept += 1
+        return self.drop_segments(kept)
+
+    def drop_segments(self, count: int) -> int:
+        """Drop the oldest count segments; returns rows dropped"""
+        count = min(count, len(self._segment_days))
+        if count <= 0:
+            return 0
+        dropped = (
+            self._segment_starts[count] if count < len(self._segment_starts) else self._size
+        )
+        remaining = self._size - dropped
+
+        for name, column in self._columns.items():
+            column[:remaining] = column[dropped:self._size].copy()
+            if column.dtype == object:
+                # Release payload references held past the end
+                column[remaining:self._size] = None
+        self._rows_bytes -= int(self._row_bytes[:dropped].sum())
+        self._row_bytes[:remaining] = self._row_bytes[dropped:self._size].copy()
+
+        for index in self._indexes.values():
+            for key in list(index):
+                positions = np.frombuffer(index[key], dtype=np.int64)
+                positions = positions[positions >= dropped] - dropped
+                if len(positions):
+                    index[key] = array("q", positions.tobytes())
+                else:
+                    del index[key]
+                    self._key_bytes -= self._key_size(key)
+
+        del self._segment_days[:count]
+        self._segment_starts = [start - dropped for start in self._segment_starts[count:]]
+        self._expired += dropped
+        self._size = remaining
+        for name in self._dictionaries:
+            if name not in self._pinned:
+                self._compact_dictionary(name)
+
+        # Give memory back once the table is well under capacity
+        if self._capacity > self._initial_capacity and self._size < self._capacity // 4:
+            self._resize(max(self._initial_capacity, self._capacity // 2))
+        return dropped
+
+    def _compact_dictionary(self, name: str):
+        """Drop dictionary values no retained row uses and renumber the rest"""
+        values = self._dictionaries[name]
+        codes = self.column(name)
+        kept = np.unique(codes)
+        if len(kept) == len(values):
+            return
+        renumbered = np.zeros(len(values), dtype=np.int32)
+        renumbered[kept] = np.arange(len(kept), dtype=np.int32)
+        codes[:] = renumbered[codes]
+
+        used = np.zeros(len(values), dtype=bool)
+        used[kept] = True
+        self._dictionary_bytes -= sum(
+            self._value_size(value) for value, keep in zip(values, used) if not keep
+        )
+        self._dictionaries[name] = [values[code] for code in kept]
+        self._hashes[name] = [self._hashes[name][code] for code in kept]
+        self._codes[name] = {value: code for code, value in enumerate(self._dictionaries[name])}
+        if self.rollup is not None:
+            self.rollup.compact(name, kept)
+
+    @staticmethod
+    def _value_size(value: Any) -> int:
+        """Bytes of a dictionary value, its hash int and code-map entry"""
+        return sizeof(value) + 32 + ENTRY_BYTES
+
+    @staticmethod
+    def _to_float(value) -> float:
+        if value is None or value == "":
+            return np.nan
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return np.nan
+
+    def encode(self, column: str, value: Any) -> int:
+        """Dictionary code for a category value, assigning a new one if needed"""
+        codes = self._codes[column]
+        if value not in codes:
+            codes[value] = len(self._dictionaries[column])
+            self._dictionaries[column].append(value)
+            self._hashes[column].append(key_hash(value))
+            self._dictionary_bytes += self._value_size(value)
+        return codes[value]
+
+    def code_for(self, column: str, value: Any) -> Optional[int]:
+        """Existing dictionary code for a value, or None if never seen"""
+        return self._codes[column].get(value)
+
+    def categories(self, column: str) -> List[Any]:
+        """Category values in code order"""
+        return self._dictionaries[column]
+
+    def column(self, name: str) -> np.ndarray:
+        """View of a column's stored values (codes for category columns)"""
+        return self._columns[name][:self._size]
+
+    def decode(self, column: str, codes: Iterable[int]) -> List[Any]:
+        values = self._dictionaries[column]
+        return [values[code] for code in codes]
+
+    def index_rows(self, index: str, key: Any) -> np.ndarray:
+        """Row numbers holding key in the given index"""
+        rows = self._indexes[index].get(key)
+        if rows is None:
+            return np.empty(0, dtype=np.int64)
+        # Copied so the index array stays free to grow
+        return np.frombuffer(rows, dtype=np.int64).copy()
+
+    def index_size(self, index: str) -> int:
+        """Number of distinct keys in an index"""
+        return len(self._indexes[index])
+
+    def time_range(self,
+                   start: Optional[int] = None,
+                   end: Optional[int] = None) -> slice:
+        """Rows with start <= time <= end, found by binary search"""
+        times = self.column(self._time_column)
+        lo = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+        hi = self._size if end is None else int(np.searchsorted(times, end, side="right"))
+        return slice(lo, max(lo, hi))
+
+    def rows(self, positions=None) -> List[Dict[str, Any]]:
+        """Materialize rows as dicts with an id and ISO timestamps"""
+        if positions is None:
+            positions = slice(0, self._size)
+        ids = np.arange(self._size, dtype=np.int64)[positions] + self._expired + 1
+
+        columns = {}
+        for name, kind in self.schema.items():
+            values = self.column(name)[positions]
+            if kind == "category":
+                columns[name] = self.decode(name, values)
+            elif kind == "time":
+                columns[name] = [to_iso(v) for v in values]
+            elif kind == "float":
+                columns[name] = [None if np.isnan(v) else float(v) for v in values]
+            else:
+                columns[name] = list(values)
+
+        return [
+            {"id": int(row_id), **{name: columns[name][i] for name in self.schema}}
+            for i, row_id in enumerate(ids)
+        ]
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Approximate bytes held by the table: column buffers, object
+        payloads, category dictionaries and indexes
+        """
+        total = sum(column.nbytes for column in self._columns.values())
+        total += self._row_bytes.nbytes + sum(sys.getsizeof(index) for index in self._indexes.values())
+        return total + self._rows_bytes + self._key_bytes + self._dictionary_bytes
@@ -40,15 +40,126 @@ AI_CONFIG = {
     "emotion_model": "j-hartmann/emotion-english-distilroberta-base",
     "nlp_model": "facebook/bart-large-mnli",
     "image_model": "microsoft/resnet-50",
+    "sentiment_model": "distilbert-base-uncased-finetuned-sst-2-english",
+    "generation_model": "gpt2",
+    "ner_model": "dbmdz/bert-large-cased-finetuned-conll03-english",
+    "audio_model": "WAV2VEC2_BASE",  # torchaudio pipeline bundle
+    "face_emotion_model": "models/emotion_model.h5",
+    # Per-model precision: float32, float16, or int8 (dynamic quantization
+    # for CPU nodes; quantized weights are cached in quantized_model_dir)
+    "model_dtypes": {
+        "distilbert-base-uncased-finetuned-sst-2-english": "float32",
+        "j-hartmann/emotion-english-distilroberta-base": "float32",
+        "facebook/bart-large-mnli": "float32",
+        "gpt2": "float32"
+    },
+    "quantized_model_dir": str(BASE_DIR / "models" / "quantized"),
+    # Per-model backend for sequence classifiers: "pytorch" or "onnx"
+    # (exported once to onnx_model_dir, served with onnxruntime on CPU)
+    "model_backends": {
+        "distilbert-base-uncased-finetuned-sst-2-english": "pytorch",
+        "j-hartmann/emotion-english-distilroberta-base": "pytorch",
+        "facebook/bart-large-mnli": "pytorch"
+    },
+    "onnx_model_dir": str(BASE_DIR / "models" / "onnx"),
+    "onnx_intra_op_threads": None,
     "batch_size": 32,
-    "max_sequence_length": 512
+    "max_sequence_length": 512,
+    "batch_max_wait_ms": 5,  # How long a request may wait for batch-mates
+    "generation_batch_size": 8,
+    "executor": {
+        "max_workers": 4,
+        "max_queue_size": 64,  # Requests beyond this are rejected
+        "queue_timeout": 30,  # Seconds to wait for a free slot
+        "family_limits": {
+            "text": 2,
+            "generation": 1,
+            "vision": 2,
+            "audio": 1,
+            "warmup": 1
+        }
+    },
+    # Models load on first use; warmup_models are preloaded in the background
+    "lazy_loading": True,
+    "warmup_models": ["sentiment", "intent"],
+    # "nli" runs BART-MNLI on cached hypotheses; "embedding" is the fast
+    # cosine-similarity classifier over cached label embeddings
+    "intent_mode": "nli",
+    "intent_hypothesis_template": "This example is {}.",
+    "conversation_cache_size": 1000,  # Conversations kept for incremental analysis
+    "stream_max_new_tokens": 60,
+    "generation_cache_size": 32,  # Conversations whose GPT-2 key/values are kept
+    "video_tracking": {
+        "detect_every": 5,  # Run the face detector every N processed frames
+        "reclassify_every": 3,  # Reuse a track's emotion for N frames
+        "target_fps": 15,  # Frames arriving faster than this are skipped
+        "latency_budget_ms": 50,
+        "smoothing": 0.6,  # EMA weight given to the previous prediction
+        "iou_threshold": 0.3,
+        "match_threshold": 0.5,
+        "max_missed_frames": 10,
+        "full_detection_every": 3,  # Other detections only search near known faces
+        "max_sessions": 100
+    },
+    "face_detection": {
+        # Longest side of the copy the cascade scans. Faces under ~24px at
+        # that scale are missed, so raise it if small faces matter
+        "max_dimension": 640,
+        "scale_factor": 1.1,
+        "min_neighbors": 5,
+        "min_face_size": 30,  # In full-resolution pixels
+        "roi_margin": 0.5  # Search margin around previous faces, per box size
+    },
+    # Serve emotion, sentiment and intent from small heads over one
+    # distilroberta embedding (trained with SharedEncoderHeads.train_heads,
+    # saved as <task>.pt in heads_dir); tasks without a head fall back
+    "shared_encoder": {
+        "enabled": False,
+        "heads_dir": str(BASE_DIR / "models" / "heads")
+    },
+    "text_embedding": {
+        "batch_size": 32,  # Texts per length bucket
+        "num_threads": None  # torch intra-op threads; None keeps the default
+    },
+    "multimodal": {
+        # Seconds each modality may take before the fused result goes
+        # ahead without it
+        "timeouts": {
+            "text": 5,
+            "audio": 30,
+            "video": 60
+        },
+        # Fixed slot widths in the fused vector; missing modalities are zeros
+        "feature_dims": {
+            "text": 768,
+            "audio": 768,
+            "video": 2048
+        },
+        "video_sample_fps": 2,  # Frames per second of video that are decoded
+        "video_batch_size": 16,  # Face crops per ResNet forward pass
+        # Audio is read and encoded in windows of this length, so peak
+        # memory follows the window rather than the recording
+        "audio_window_seconds": 30,
+        "audio_overlap_seconds": 1
+    }
 }
 
 # Analytics Configuration
 ANALYTICS_CONFIG = {
     "storage_type": "memory",  # Options: memory, database
-    "retention_days": 30,
-    "batch_size": 100
+    "retention_days": 30,  # Raw events are kept in day segments this long
+    "compact_expired": True,  # Keep expired days' aggregates in the rollups
+    "max_memory_mb": 512,  # Oldest segments are evicted above this; None disables
+    "batch_size": 100,  # Appends between retention runs
+    # Buckets kept per rollup granularity for the platform statistics; the
+    # minute ring must span the longest window served (24h) so its edges
+    # stay exact to the minute
+    "rollup_buckets": {"minute": 1500, "hour": 72, "day": 400},
+    # Distinct users/addresses: "approximate" uses HyperLogLog sketches per
+    # rollup bucket (relative error ~1.04 / sqrt(2 ** hll_precision), 1.6%
+    # at 12, constant memory); "exact" keeps per-key state and sets
+    "unique_counts": "approximate",
+    "hll_precision": 12
 }
 
 # Database Configuration
@@ -99,9 +210,10 @@ CORS_CONFIG = {
 
 # Cache Configuration
 CACHE_CONFIG = {
-    "type": "memory",
+    "type": "memory",  # Options: memory, disk (shared by workers on one host)
     "ttl": 300,  # 5 minutes
-    "max_size": 1000
+    "max_size": 1000,
+    "path": str(BASE_DIR / "cache" / "results.sqlite3")
 }
 
 class Config:
@@ -5,10 +5,14 @@ from typing import List, Optional
 import uvicorn
 from datetime import datetime
 import json
+from .routers.ai_router import router as ai_router
 
 # Create FastAPI app
 app = FastAPI(title="SASOK Backend API")
 
+# AI routes; the router's startup hook starts the model warmup
+app.include_router(ai_router)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -122,4 +126,4 @@ async def health_check():
     return {"status": "healthy"}
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run("backend.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -1,3 +1,4 @@
+import asyncio
 import torch
 from transformers import AutoTokenizer, AutoModel, AutoFeatureExtractor
 import torchaudio
@@ -9,61 +10,217 @@ from datetime import datetime
 import json
 import os
 from pathlib import Path
+from ..ai.inference_executor import get_inference_executor
+from ..ai.model_registry import get_model_registry
+from .text_embedding import get_text_embedder
+from ..config import AI_CONFIG
 
 class MultiModalPipeline:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
+        self.executor = get_inference_executor()
+        self.registry = get_model_registry()
         self.models = {}
         self.tokenizers = {}
         self.feature_extractors = {}
+        self._resamplers = {}
+        self.face_cascade = cv2.CascadeClassifier(
+            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        )
         self.initialize_models()
 
     def initialize_models(self):
         """Initialize all required models and processors"""
         try:
-            # Text models (BERT-based emotion detection)
-            self.tokenizers['text'] = AutoTokenizer.from_pretrained(
-                'j-hartmann/emotion-english-distilroberta-base'
-            )
-            self.models['text'] = AutoModel.from_pretrained(
-                'j-hartmann/emotion-english-distilroberta-base'
-            )
+            # Text models (BERT-based emotion detection), shared with the
+            # embedding service so no second copy loads
+            self.text_embedder = get_text_embedder()
+            self.tokenizers['text'] = self.registry.get_handle("emotion_tokenizer")
+            self.models['text'] = self.registry.get_handle("text_encoder")
 
             # Audio models (Wav2Vec based)
-            self.models['audio'] = torchaudio.pipelines.WAV2VEC2_BASE.get_model()
+            self.models['audio'] = self.registry.lazy(
+                "audio",
+                lambda: self.registry.acquire(
+                    AI_CONFIG["audio_model"],
+                    "torchaudio",
+                    lambda: getattr(torchaudio.pipelines, AI_CONFIG["audio_model"]).get_model()
+                )
+            )
             
             # Vision models
-            self.feature_extractors['vision'] = AutoFeatureExtractor.from_pretrained(
-                'microsoft/resnet-50'
+            self.feature_extractors['vision'] = self.registry.lazy(
+                "vision_feature_extractor",
+                lambda: self.registry.acquire(
+                    AI_CONFIG["image_model"],
+                    "feature-extractor",
+                    lambda: AutoFeatureExtractor.from_pretrained(AI_CONFIG["image_model"]),
+                    dtype=""
+                )
             )
-            self.models['vision'] = AutoModel.from_pretrained(
-                'microsoft/resnet-50'
+            self.models['vision'] = self.registry.lazy(
+                "vision",
+                lambda: self.registry.get_model(AI_CONFIG["image_model"], "base")
             )
 
+            if not AI_CONFIG.get("lazy_loading", True):
+                for handle in (list(self.models.values())
+                               + list(self.tokenizers.values())
+                               + list(self.feature_extractors.values())):
+                    handle.get()
+
             self.logger.info("All models initialized successfully")
         except Exception as e:
             self.logger.error(f"Error initializing models: {str(e)}")
             raise
 
+    # wav2vec2 emits one feature frame per 320 input samples at 16 kHz
+    AUDIO_FEATURE_RATE = 50
+
+    def _get_resampler(self, sample_rate: int):
+        """Resample transforms are cached per source rate"""
+        if sample_rate not in self._resamplers:
+            self._resamplers[sample_rate] = torchaudio.transforms.Resample(
+                sample_rate, 16000
+            )
+        return self._resamplers[sample_rate]
+
+    def _extract_audio_features(self, audio_path: str) -> Tuple[np.ndarray, float]:
+        """
+        Run wav2vec2 over the audio in overlapping windows; blocking.
+        Each window is read from disk on its own and its features are
+        folded into a running mean, so peak memory depends on the window
+        size, not the recording length. Returns the mean feature vector
+        and the duration in seconds.
+        """
+        settings = AI_CONFIG.get("multimodal", {})
+        info = torchaudio.info(audio_path)
+        sample_rate = info.sample_rate
+        window = max(1, int(settings.get("audio_window_seconds", 30) * sample_rate))
+        overlap = min(window - 1, int(settings.get("audio_overlap_seconds", 1) * sample_rate))
+        # Feature frames at the start of a window that repeat the previous one
+        overlap_features = int(round(overlap / sample_rate * self.AUDIO_FEATURE_RATE))
+
+        model = self.models['audio'].get()
+        feature_sum = None
+        feature_count = 0
+        offset = 0
+        total_samples = 0
+
+        # Some formats do not report their length, so read until a short window
+        while True:
+            waveform, _ = torchaudio.load(
+                audio_path, frame_offset=offset, num_frames=window
+            )
+            samples = waveform.shape[1]
+            if samples == 0:
+                break
+            total_samples = offset + samples
+
+            # Mix down to mono and resample if necessary
+            waveform = waveform.mean(dim=0, keepdim=True)
+            if sample_rate != 16000:
+                waveform = self._get_resampler(sample_rate)(waveform)
+
+            # Extract features
+            with torch.no_grad():
+                features, _ = model(waveform)
+
+            features = features[0]
+            if offset > 0:
+                features = features[overlap_features:]
+            if len(features):
+                window_sum = features.sum(dim=0)
+                feature_sum = window_sum if feature_sum is None else feature_sum + window_sum
+                feature_count += len(features)
+
+            if samples < window or (info.num_frames and total_samples >= info.num_frames):
+                break
+            offset += window - overlap
+
+        if feature_sum is None:
+            return np.empty((0, 0), dtype=np.float32), 0.0
+        mean = (feature_sum / feature_count).numpy()[np.newaxis]
+        return mean, total_samples / sample_rate
+
+    def _extract_video_features(self, video_path: str) -> Tuple[np.ndarray, int, int]:
+        """
+        Sample frames from a video and embed every face; blocking.
+        Skipped frames are grabbed without decoding, face crops are embedded
+        in batches, and only a running sum is kept, so memory stays flat
+        however long the video is. Returns the mean face feature, the number
+        of faces and the number of sampled frames.
+        """
+        settings = AI_CONFIG.get("multimodal", {})
+        sample_fps = settings.get("video_sample_fps", 2)
+        batch_size = settings.get("video_batch_size", 16)
+
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0
+        step = max(1, int(round(fps / sample_fps))) if sample_fps and fps > 0 else 1
+
+        feature_sum = None
+        face_count = 0
+        frames_sampled = 0
+        batch = []
+
+        def flush():
+            nonlocal feature_sum, face_count
+            features = self._embed_faces(batch).sum(axis=0)
+            feature_sum = features if feature_sum is None else feature_sum + features
+            face_count += len(batch)
+            batch.clear()
+
+        try:
+            frame_index = 0
+            while cap.isOpened():
+                # grab() advances without decoding; only sampled frames are decoded
+                if not cap.grab():
+                    break
+                frame_index += 1
+                if (frame_index - 1) % step:
+                    continue
+
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                frames_sampled += 1
+
+                # Detect faces
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                faces = self.face_cascade.detectMultiScale(
+                    gray, scaleFactor=1.1, minNeighbors=5
+                )
+
+                for (x, y, w, h) in faces:
+                    batch.append(cv2.cvtColor(frame[y:y+h, x:x+w], cv2.COLOR_BGR2RGB))
+                    if len(batch) >= batch_size:
+                        flush()
+
+            if batch:
+                flush()
+        finally:
+            cap.release()
+
+        if feature_sum is None:
+            return np.empty((0, 0), dtype=np.float32), 0, frames_sampled
+        return (feature_sum / face_count)[np.newaxis], face_count, frames_sampled
+
+    def _embed_faces(self, faces: List[np.ndarray]) -> np.ndarray:
+        """Run one ResNet forward pass over a batch of RGB face crops"""
+        inputs = self.feature_extractors['vision'].get()(faces, return_tensors="pt")
+        with torch.inference_mode():
+            outputs = self.models['vision'].get()(**inputs)
+        return outputs.pooler_output.reshape(len(faces), -1).float().numpy()
+
     async def process_text(self, text: str) -> Dict:
         """Process text input for emotion analysis"""
         try:
-            # Tokenize and encode text
-            inputs = self.tokenizers['text'](
-                text,
-                return_tensors="pt",
-                padding=True,
-                truncation=True,
-                max_length=512
-            )
-
-            # Get model outputs
-            outputs = self.models['text'](**inputs)
-            embeddings = outputs.last_hidden_state.mean(dim=1)
+            embeddings = (await self.text_embedder.embed_many([text]))[:1]
 
             return {
                 "success": True,
-                "embeddings": embeddings.detach().numpy(),
+                "embeddings": embeddings,
                 "text_length": len(text.split()),
                 "timestamp": datetime.utcnow().isoformat()
             }
@@ -73,26 +230,19 @@ class MultiModalPipeline:
             return {"success": False, "error": str(e)}
 
     async def process_audio(self, audio_path: str) -> Dict:
-        """Process audio input for emotion analysis"""
+        """
+        Process audio input for emotion analysis. features holds the mean
+        wav2vec2 feature over the whole recording.
+        """
         try:
-            # Load and preprocess audio
-            waveform, sample_rate = torchaudio.load(audio_path)
-            
-            # Resample if necessary
-            if sample_rate != 16000:
-                resampler = torchaudio.transforms.Resample(
-                    sample_rate, 16000
-                )
-                waveform = resampler(waveform)
-
-            # Extract features
-            with torch.no_grad():
-                features, _ = self.models['audio'](waveform)
+            features, duration = await self.executor.run(
+                "audio", self._extract_audio_features, audio_path
+            )
 
             return {
                 "success": True,
-                "features": features.numpy(),
-                "duration": waveform.shape[1] / 16000,
+                "features": features,
+                "duration": duration,
                 "timestamp": datetime.utcnow().isoformat()
             }
 
@@ -101,41 +251,20 @@ class MultiModalPipeline:
             return {"success": False, "error": str(e)}
 
     async def process_video(self, video_path: str) -> Dict:
-        """Process video input for emotion analysis"""
+        """
+        Process video input for emotion analysis. frame_features holds the
+        mean ResNet feature over all faces in the sampled frames.
+        """
         try:
-            cap = cv2.VideoCapture(video_path)
-            frames = []
-            face_cascade = cv2.CascadeClassifier(
-                cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+            features, face_count, frames_sampled = await self.executor.run(
+                "vision", self._extract_video_features, video_path
             )
 
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
-
-                # Detect faces
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                faces = face_cascade.detectMultiScale(
-                    gray, scaleFactor=1.1, minNeighbors=5
-                )
-
-                # Process each face
-                for (x, y, w, h) in faces:
-                    face = frame[y:y+h, x:x+w]
-                    # Prepare for vision model
-                    inputs = self.feature_extractors['vision'](
-                        face, return_tensors="pt"
-                    )
-                    features = self.models['vision'](**inputs)
-                    frames.append(features.pooler_output.detach().numpy())
-
-            cap.release()
-
             return {
                 "success": True,
-                "frame_features": np.array(frames),
-                "face_count": len(frames),
+                "frame_features": features,
+                "face_count": face_count,
+                "frames_sampled": frames_sampled,
                 "timestamp": datetime.utcnow().isoformat()
             }
 
@@ -143,29 +272,39 @@ class MultiModalPipeline:
             self.logger.error(f"Error processing video: {str(e)}")
             return {"success": False, "error": str(e)}
 
+    MODALITIES = ("text", "audio", "video")
+
     async def process_multimodal(self, 
                                data: Dict[str, Union[str, bytes]]) -> Dict:
-        """Process multiple modalities together"""
+        """
+        Process multiple modalities concurrently. Each modality has its own
+        deadline; one that misses it is reported as timed out and left out
+        of the combined features.
+        """
         try:
-            results = {}
-            
-            # Process each modality
-            if 'text' in data:
-                results['text'] = await self.process_text(data['text'])
-            
-            if 'audio' in data:
-                results['audio'] = await self.process_audio(data['audio'])
-            
-            if 'video' in data:
-                results['video'] = await self.process_video(data['video'])
+            processors = {
+                'text': self.process_text,
+                'audio': self.process_audio,
+                'video': self.process_video
+            }
+            modalities = [m for m in self.MODALITIES if m in data]
+            outcomes = await asyncio.gather(*[
+                self._run_with_timeout(modality, processors[modality](data[modality]))
+                for modality in modalities
+            ])
+            results = dict(zip(modalities, outcomes))
 
             # Combine features
             combined_features = self.combine_features(results)
 
             return {
                 "success": True,
+                "partial": any(not r.get("success") for r in results.values()),
                 "individual_results": results,
                 "combined_features": combined_features,
+                "modalities_present": [
+                    m for m in self.MODALITIES if results.get(m, {}).get("success")
+                ],
                 "timestamp": datetime.utcnow().isoformat()
             }
 
@@ -173,32 +312,57 @@ class MultiModalPipeline:
             self.logger.error(f"Error in multimodal processing: {str(e)}")
             return {"success": False, "error": str(e)}
 
-    def combine_features(self, results: Dict) -> np.ndarray:
-        """Combine features from different modalities"""
+    async def _run_with_timeout(self, modality: str, coro) -> Dict:
+        """Await one modality up to its configured deadline"""
+        timeout = AI_CONFIG.get("multimodal", {}).get("timeouts", {}).get(modality)
+        # Shielded so a late modality keeps its executor slot until the
+        # worker thread really finishes, instead of freeing it early
+        task = asyncio.ensure_future(coro)
         try:
-            features = []
-            
-            # Add text features if available
-            if 'text' in results and results['text']['success']:
-                features.append(results['text']['embeddings'])
-
-            # Add audio features if available
-            if 'audio' in results and results['audio']['success']:
-                features.append(results['audio']['features'])
-
-            # Add video features if available
-            if 'video' in results and results['video']['success']:
-                # Average across frames
-                features.append(results['video']['frame_features'].mean(axis=0))
-
-            # Concatenate all features
-            if features:
-                return np.concatenate(features, axis=-1)
-            return np.array([])
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"{modality} processing exceeded {timeout}s")
+            return {
+                "success": False,
+                "error": f"{modality} processing timed out after {timeout}s",
+                "timed_out": True
+            }
 
-        except Exception as e:
-            self.logger.error(f"Error combining features: {str(e)}")
-            return np.array([])
+    def combine_features(self, results: Dict) -> np.ndarray:
+        """
+        Combine features from different modalities into a fixed-length
+        vector: one zero-filled slot per modality followed by a presence
+        mask, so the layout does not depend on which modalities arrived.
+        """
+        dims = AI_CONFIG.get("multimodal", {}).get("feature_dims", {})
+        keys = {'text': 'embeddings', 'audio': 'features', 'video': 'frame_features'}
+        features = []
+        mask = []
+
+        for modality in self.MODALITIES:
+            dim = dims.get(modality, 0)
+            vector = np.zeros(dim, dtype=np.float32)
+            present = False
+
+            result = results.get(modality)
+            if result and result.get('success'):
+                try:
+                    # Average over tokens, audio frames or faces
+                    values = np.asarray(result[keys[modality]], dtype=np.float32)
+                    if values.size and values.size % dim == 0:
+                        vector = values.reshape(-1, dim).mean(axis=0)
+                        present = True
+                    elif values.size:
+                        self.logger.warning(
+                            f"Unexpected {modality} feature size {values.size} for dim {dim}"
+                        )
+                except Exception as e:
+                    self.logger.error(f"Error combining {modality} features: {str(e)}")
+
+            features.append(vector)
+            mask.append(1.0 if present else 0.0)
+
+        return np.concatenate(features + [np.array(mask, dtype=np.float32)])
 
     async def save_to_ipfs(self, 
                           data: Dict,
@@ -236,7 +400,8 @@ class MultiModalPipeline:
             "audio_model": "wav2vec2-base",
             "vision_model": "resnet-50",
             "status": {
-                k: v is not None 
+                k: v.loaded
                 for k, v in self.models.items()
-            }
+            },
+            "text_embedding": self.text_embedder.get_stats()
         }
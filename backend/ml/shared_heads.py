@@ -0,0 +1,153 @@
+import os
+import torch
+import numpy as np
+import logging
+from typing import Dict, List, Optional
+from datetime import datetime
+from .text_embedding import TextEmbeddingService, get_text_embedder
+from .training_pipeline import TrainingPipeline
+from ..ai.inference_executor import get_inference_executor
+from ..config import AI_CONFIG
+
+class SharedEncoderHeads:
+    """
+    Emotion, sentiment and intent predicted from one distilroberta
+    embedding. Each task is a small MultiModalEmotionModel head trained
+    with TrainingPipeline on the cached embeddings, so a message costs a
+    single encoder pass instead of one transformer per task.
+    """
+
+    TASKS = ("emotion", "sentiment", "intent")
+
+    def __init__(self,
+                 embedder: TextEmbeddingService,
+                 heads_dir: str,
+                 executor=None):
+        self.logger = logging.getLogger(__name__)
+        self.embedder = embedder
+        self.heads_dir = heads_dir
+        self.executor = executor or get_inference_executor()
+        self.heads: Dict[str, Dict] = {}
+        self.load_heads()
+
+    def head_path(self, task: str) -> str:
+        return os.path.join(self.heads_dir, f"{task}.pt")
+
+    def load_heads(self) -> List[str]:
+        """Load every trained head found in heads_dir"""
+        for task in self.TASKS:
+            path = self.head_path(task)
+            if not os.path.exists(path):
+                continue
+
+            pipeline = TrainingPipeline({})
+            result = pipeline.load_model(path)
+            if not result["success"]:
+                self.logger.error(f"Error loading {task} head: {result['error']}")
+                continue
+
+            pipeline.model.eval()
+            self.heads[task] = {
+                "model": pipeline.model,
+                # TrainingPipeline puts the head on CUDA when available
+                "device": pipeline.device,
+                "labels": pipeline.config.get("labels")
+                or [str(i) for i in range(pipeline.config["num_classes"])]
+            }
+        return list(self.heads)
+
+    def has_heads(self, tasks: Optional[List[str]] = None) -> bool:
+        return all(task in self.heads for task in (tasks or self.TASKS))
+
+    async def analyze_many(self, texts: List[str]) -> List[Dict]:
+        """Embed texts once and run every loaded head on the embeddings"""
+        embeddings = await self.embedder.embed_many(texts)
+        return await self.executor.run("text", self._apply_heads, embeddings)
+
+    async def analyze(self, text: str) -> Dict:
+        return (await self.analyze_many([text]))[0]
+
+    def _apply_heads(self, embeddings: np.ndarray) -> List[Dict]:
+        """Score all heads on a batch of embeddings; blocking"""
+        inputs = torch.from_numpy(np.ascontiguousarray(embeddings, dtype=np.float32))
+        results = [{} for _ in range(len(embeddings))]
+
+        with torch.inference_mode():
+            for task, head in self.heads.items():
+                logits = head["model"](inputs.to(head["device"]))
+                probs = logits.softmax(dim=-1).cpu().tolist()
+                for result, row in zip(results, probs):
+                    result[task] = sorted(
+                        ({"label": label, "score": float(score)}
+                         for label, score in zip(head["labels"], row)),
+                        key=lambda x: x["score"],
+                        reverse=True
+                    )
+        return results
+
+    async def train_heads(self,
+                          texts: List[str],
+                          task_labels: Dict[str, List[str]],
+                          n_trials: int = 20,
+                          num_epochs: int = 5) -> Dict:
+        """
+        Train one head per task on the encoder embeddings of texts and save
+        it to heads_dir. task_labels maps a task to the label of each text.
+        """
+        try:
+            embeddings = await self.embedder.embed_many(texts)
+            os.makedirs(self.heads_dir, exist_ok=True)
+
+            results = {}
+            for task, labels in task_labels.items():
+                label_names = sorted(set(labels))
+                targets = np.array([label_names.index(label) for label in labels])
+                pipeline = TrainingPipeline({
+                    "batch_size": AI_CONFIG["batch_size"],
+                    "num_epochs": num_epochs,
+                    "input_dim": embeddings.shape[1],
+                    "num_classes": len(label_names),
+                    "labels": label_names
+                })
+
+                result = await self.executor.run(
+                    "training", pipeline.train, embeddings, targets, n_trials
+                )
+                if result["success"]:
+                    pipeline.save_model(self.head_path(task))
+                results[task] = result
+
+            self.load_heads()
+            return {
+                "success": all(r["success"] for r in results.values()),
+                "tasks": results,
+                "timestamp": datetime.utcnow().isoformat()
+            }
+
+        except Exception as e:
+            self.logger.error(f"Error training shared encoder heads: {str(e)}")
+            return {"success": False, "error": str(e)}
+
+    def get_info(self) -> Dict:
+        return {
+            "heads_dir": self.heads_dir,
+            "heads": {
+                task: head["labels"] for task, head in self.heads.items()
+            },
+            "embedding": self.embedder.get_stats()
+        }
+
+_shared_heads: Optional[SharedEncoderHeads] = None
+
+def get_shared_heads() -> Optional[SharedEncoderHeads]:
+    """Get the process-wide heads when shared-encoder mode is enabled"""
+    global _shared_heads
+    settings = AI_CONFIG.get("shared_encoder", {})
+    if not settings.get("enabled"):
+        return None
+    if _shared_heads is None:
+        _shared_heads = SharedEncoderHeads(
+            get_text_embedder(),
+            settings.get("heads_dir", "models/heads")
+        )
+    return _shared_heads
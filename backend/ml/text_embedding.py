@@ -0,0 +1,144 @@
+import torch
+import numpy as np
+import logging
+from typing import Callable, Dict, List, Optional
+from ..ai.inference_executor import get_inference_executor
+from ..ai.model_registry import get_model_registry
+from ..ai.result_cache import ResultCache
+from ..config import AI_CONFIG
+
+class TextEmbeddingService:
+    """
+    Mean-pooled transformer embeddings for batches of texts. Texts are
+    sorted by token length and padded per bucket, so short texts are not
+    padded to the longest one in the request, and the forward pass runs
+    under inference mode. A result cache sits in front of the encoder.
+    """
+
+    def __init__(self,
+                 get_tokenizer: Callable[[], object],
+                 get_model: Callable[[], object],
+                 executor,
+                 cache: Optional[ResultCache] = None,
+                 batch_size: int = 32,
+                 max_length: int = 512,
+                 num_threads: Optional[int] = None):
+        self.logger = logging.getLogger(__name__)
+        self._get_tokenizer = get_tokenizer
+        self._get_model = get_model
+        self.executor = executor
+        self.cache = cache
+        self.batch_size = max(1, batch_size)
+        self.max_length = max_length
+        self.num_threads = num_threads
+        self.batches_run = 0
+        self.padding_tokens = 0
+
+        # Intra-op threads are process-wide; the executor already runs
+        # several inferences side by side
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+    async def embed_many(self, texts: List[str]) -> np.ndarray:
+        """Embed texts, returning an (N, hidden_size) array in input order"""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        rows: List[Optional[np.ndarray]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+        cached_rows = (
+            await self.cache.lookup_many(texts) if self.cache is not None
+            else [None] * len(texts)
+        )
+        for index, (text, cached) in enumerate(zip(texts, cached_rows)):
+            if cached is not None:
+                rows[index] = cached
+            else:
+                missing.setdefault(text, []).append(index)
+
+        if missing:
+            unique = list(missing)
+            embeddings = await self.executor.run("text", self.encode, unique)
+            for text, embedding in zip(unique, embeddings):
+                for index in missing[text]:
+                    rows[index] = embedding
+            if self.cache is not None:
+                await self.cache.store_many(list(zip(unique, embeddings)))
+
+        return np.stack(rows)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts in length-bucketed batches; blocking"""
+        tokenizer, model = self._get_tokenizer(), self._get_model()
+        token_ids = tokenizer(
+            texts,
+            truncation=True,
+            max_length=self.max_length
+        )["input_ids"]
+
+        order = sorted(range(len(texts)), key=lambda i: len(token_ids[i]))
+        embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
+
+        for start in range(0, len(order), self.batch_size):
+            bucket = order[start:start + self.batch_size]
+            inputs = tokenizer.pad(
+                {"input_ids": [token_ids[i] for i in bucket]},
+                return_tensors="pt"
+            )
+            mask = inputs["attention_mask"]
+            self.padding_tokens += int(mask.numel() - mask.sum())
+            self.batches_run += 1
+
+            with torch.inference_mode():
+                hidden = model(
+                    input_ids=inputs["input_ids"],
+                    attention_mask=mask
+                ).last_hidden_state
+
+            weights = mask.unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * weights).sum(dim=1) / weights.sum(dim=1).clamp(min=1)
+            for i, vector in zip(bucket, pooled.float().numpy()):
+                embeddings[i] = vector
+
+        return np.stack(embeddings)
+
+    def get_stats(self) -> Dict:
+        return {
+            "batch_size": self.batch_size,
+            "num_threads": torch.get_num_threads(),
+            "batches_run": self.batches_run,
+            "padding_tokens": self.padding_tokens,
+            "cache": self.cache.get_stats() if self.cache is not None else None
+        }
+
+_text_embedder: Optional[TextEmbeddingService] = None
+
+def get_text_embedder() -> TextEmbeddingService:
+    """
+    Get the process-wide embedding service over the distilroberta encoder.
+    The encoder is the body of the shared emotion classifier, so no second
+    copy loads, and every component shares one embedding cache.
+    """
+    global _text_embedder
+    if _text_embedder is None:
+        registry = get_model_registry()
+        model_id = AI_CONFIG["emotion_model"]
+        tokenizer = registry.lazy(
+            "emotion_tokenizer",
+            lambda: registry.get_tokenizer(model_id)
+        )
+        encoder = registry.lazy(
+            "text_encoder",
+            lambda: registry.get_model(model_id, "sequence-classification").base_model
+        )
+        settings = AI_CONFIG.get("text_embedding", {})
+        _text_embedder = TextEmbeddingService(
+            tokenizer.get,
+            encoder.get,
+            get_inference_executor(),
+            cache=ResultCache("text_embedding_mean", registry.model_version(model_id)),
+            batch_size=settings.get("batch_size", AI_CONFIG["batch_size"]),
+            max_length=AI_CONFIG["max_sequence_length"],
+            num_threads=settings.get("num_threads")
+        )
+    return _text_embedder
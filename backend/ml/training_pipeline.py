@@ -14,6 +14,16 @@ import shap
 import lime
 import lime.lime_text
 
+def to_builtin(value: Any) -> Any:
+    """Replace numpy scalars and arrays with plain Python values, recursively"""
+    if isinstance(value, dict):
+        return {key: to_builtin(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_builtin(item) for item in value]
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    return value
+
 class EmotionDataset(Dataset):
     def __init__(self, features: np.ndarray, labels: np.ndarray):
         self.features = torch.FloatTensor(features)
@@ -54,7 +64,7 @@ class TrainingPipeline:
         )
         self.model = None
         self.optimizer = None
-        self.criterion = None
+        self.criterion = nn.CrossEntropyLoss()
         self.best_params = None
         self.training_history = []
 
@@ -299,11 +309,13 @@ class TrainingPipeline:
     def save_model(self, path: str) -> Dict:
         """Save model and training artifacts"""
         try:
+            # Metrics come back as numpy floats; plain values keep the
+            # checkpoint loadable by the weights_only unpickler
             save_dict = {
                 "model_state": self.model.state_dict(),
-                "best_params": self.best_params,
-                "training_history": self.training_history,
-                "config": self.config
+                "best_params": to_builtin(self.best_params),
+                "training_history": to_builtin(self.training_history),
+                "config": to_builtin(self.config)
             }
             
             torch.save(save_dict, path)
@@ -321,7 +333,9 @@ class TrainingPipeline:
     def load_model(self, path: str) -> Dict:
         """Load model and training artifacts"""
         try:
-            save_dict = torch.load(path)
+            # Checkpoints are local files written by save_model; ones saved
+            # before metrics were stored as plain floats hold numpy scalars
+            save_dict = torch.load(path, map_location=self.device, weights_only=False)
             
             # Recreate model with saved config
             self.config = save_dict['config']
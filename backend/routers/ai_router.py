@@ -0,0 +1,101 @@
+from fastapi import APIRouter, File, HTTPException, Request, UploadFile
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+import asyncio
+import logging
+from ..ai.ai_manager import AIManager
+from ..config import AI_CONFIG
+
+router = APIRouter(prefix="/ai", tags=["ai"])
+logger = logging.getLogger(__name__)
+
+# Models load lazily, so building the manager does not block startup
+ai_manager = AIManager()
+
+class GenerateRequest(BaseModel):
+    text: str
+    context: Optional[List[Dict]] = None
+    conversation_id: Optional[str] = None
+
+class QuantizationReportRequest(BaseModel):
+    model_id: str
+    kind: str = "sequence-classification"
+    texts: List[str]
+    labels: Optional[List[int]] = None
+
+@router.on_event("startup")
+async def start_warmup():
+    """Preload the configured models without delaying startup"""
+    if AI_CONFIG.get("warmup_models"):
+        asyncio.ensure_future(ai_manager.warmup())
+
+@router.get("/ready")
+async def readiness_check():
+    """Report which models are loaded and warmed"""
+    try:
+        readiness = ai_manager.get_readiness()
+        if not readiness["ready"]:
+            raise HTTPException(status_code=503, detail=readiness)
+        return readiness
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error checking readiness: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/status")
+async def get_status():
+    """Get status of all AI components"""
+    try:
+        return await ai_manager.get_system_status()
+    except Exception as e:
+        logger.error(f"Error getting AI status: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/emotion/image")
+async def analyze_image_upload(file: UploadFile = File(...)):
+    """Detect emotions in a multipart image upload without base64 encoding"""
+    try:
+        return await ai_manager.process_image(await file.read())
+    except Exception as e:
+        logger.error(f"Error analyzing uploaded image: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/emotion/image/raw")
+async def analyze_image_bytes(request: Request):
+    """Detect emotions in a raw JPEG/PNG request body"""
+    try:
+        return await ai_manager.process_image(await request.body())
+    except Exception as e:
+        logger.error(f"Error analyzing image body: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/generate/stream")
+async def stream_generation(request: GenerateRequest):
+    """Stream a generated response as plain text chunks"""
+    try:
+        return StreamingResponse(
+            ai_manager.stream_text_response(
+                request.text,
+                request.context,
+                request.conversation_id
+            ),
+            media_type="text/plain"
+        )
+    except Exception as e:
+        logger.error(f"Error streaming response: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/quantization/report")
+async def quantization_report(request: QuantizationReportRequest):
+    """Compare a model's INT8 variant against fp32 on held-out texts"""
+    result = await ai_manager.quantization_report(
+        request.model_id,
+        request.kind,
+        request.texts,
+        request.labels
+    )
+    if not result["success"]:
+        raise HTTPException(status_code=500, detail=result["error"])
+    return result
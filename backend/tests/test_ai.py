@@ -4,7 +4,17 @@ from ..ai.ai_manager import AIManager
 from ..ai.emotion_detector import EmotionDetector
 from ..ai.nlp_processor import NLPProcessor
 from ..ai.learning_system import LearningSystem
+from ..ai.batching import MicroBatcher
+from ..ai.inference_executor import InferenceExecutor, ExecutorSaturatedError
+from ..ai.model_registry import ModelRegistry, LazyModel, SequenceClassifier
+from ..ai.result_cache import ResultCache, MemoryCacheBackend, DiskCacheBackend
+from ..ai.video_tracker import VideoEmotionSession, box_iou
+from ..ai.intent_engine import ZeroShotIntentEngine
+from ..config import AI_CONFIG
 import base64
+import cv2
+import os
+import logging
 import numpy as np
 from datetime import datetime
 
@@ -61,6 +71,10 @@ async def test_system_status(ai_manager):
 async def test_emotion_detector_initialization(emotion_detector):
     model_info = emotion_detector.get_model_info()
     assert 'emotions_supported' in model_info
+
+    # The model loads lazily on first use
+    assert emotion_detector.model is not None
+    model_info = emotion_detector.get_model_info()
     assert model_info['model_loaded'] is True
 
 @pytest.mark.asyncio
@@ -74,6 +88,160 @@ async def test_process_image(emotion_detector):
     result = await emotion_detector.process_image(image_base64)
     assert 'success' in result
 
+@pytest.mark.asyncio
+async def test_process_image_bytes(emotion_detector):
+    test_image = np.zeros((100, 100, 3), dtype=np.uint8)
+    _, buffer = cv2.imencode('.png', test_image)
+
+    # Raw encoded bytes decode to the same pixels without base64
+    decoded = emotion_detector.decode_image(buffer.tobytes())
+    assert decoded.shape == (100, 100, 3)
+    assert np.array_equal(decoded, test_image)
+
+    result = await emotion_detector.process_image(buffer.tobytes())
+    assert 'image_decode' in result['timings_ms']
+    assert 'base64_decode' not in result['timings_ms']
+
+    result = await emotion_detector.process_image(b'not an image')
+    assert result['success'] is False
+
+@pytest.mark.asyncio
+async def test_detect_faces_on_large_image(emotion_detector):
+    large_image = np.zeros((3000, 4000, 3), dtype=np.uint8)
+    faces = emotion_detector.detect_faces(large_image)
+    assert faces.shape == (0, 4)
+
+    # Restricting the search to a previous face's region works the same way
+    faces = emotion_detector.detect_faces(large_image, previous_faces=[(100, 100, 200, 200)])
+    assert faces.shape == (0, 4)
+
+def test_batched_face_analysis_matches_per_face_path():
+    import types
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (200, 300, 3), dtype=np.uint8)
+    faces = [(10, 20, 60, 60), (120, 40, 90, 70), (200, 100, 50, 80)]
+    weights = rng.normal(size=(48 * 48, 7))
+
+    def model(x):
+        # Row by row, so a row's output does not depend on the batch
+        logits = np.array([row @ weights for row in x.reshape(len(x), -1).astype('float64')])
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    detector = EmotionDetector.__new__(EmotionDetector)
+    detector.logger = logging.getLogger('test')
+    detector.emotions = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+    batch_sizes = []
+
+    def inference_fn(rois):
+        batch_sizes.append(len(rois))
+        return types.SimpleNamespace(numpy=lambda: model(rois))
+
+    detector._inference_fn = inference_fn
+    batched = detector.analyze_faces(frame, faces)
+    assert batch_sizes == [len(faces)]
+
+    # The per-face path the batch replaced: crop, gray, resize, scale, predict
+    for (x, y, w, h), result in zip(faces, batched):
+        roi = cv2.resize(cv2.cvtColor(frame[y:y+h, x:x+w], cv2.COLOR_BGR2GRAY), (48, 48))
+        roi = (roi.astype('float') / 255.0).astype('float32')[np.newaxis, ..., np.newaxis]
+        probabilities = {
+            emotion: float(prob) for emotion, prob in zip(detector.emotions, model(roi)[0])
+        }
+        assert result == {
+            "emotion": max(probabilities, key=probabilities.get),
+            "confidence": max(probabilities.values()),
+            "all_emotions": probabilities,
+            "face_location": {"x": x, "y": y, "width": w, "height": h}
+        }
+
+    assert detector.analyze_face(frame, faces[1]) == batched[1]
+    assert detector.analyze_faces(frame, []) == []
+
+class FakeFaceDetector:
+    emotions = ['happy', 'sad']
+
+    def __init__(self):
+        self.detect_calls = 0
+        self.analyze_calls = 0
+
+    def detect_faces(self, image, previous_faces=None):
+        self.detect_calls += 1
+        return [(20, 20, 40, 40)]
+
+    def analyze_faces(self, image, faces):
+        self.analyze_calls += 1
+        return [
+            {'all_emotions': {'happy': 0.8, 'sad': 0.2}}
+            for _ in faces
+        ]
+
+def test_video_session_detects_every_n_frames():
+    detector = FakeFaceDetector()
+    session = VideoEmotionSession(
+        detector, 'stream-1',
+        detect_every=3, reclassify_every=2,
+        target_fps=0, latency_budget_ms=0
+    )
+    frame = np.random.randint(0, 255, (120, 120, 3), dtype=np.uint8)
+
+    results = [session.process_frame(frame) for _ in range(6)]
+
+    assert detector.detect_calls == 2
+    assert detector.analyze_calls == 3
+    assert all(r['success'] for r in results)
+    assert {r['results'][0]['track_id'] for r in results} == {1}
+    assert results[0]['results'][0]['emotion'] == 'happy'
+
+def test_video_session_skips_frames_above_target_fps():
+    detector = FakeFaceDetector()
+    session = VideoEmotionSession(detector, 'stream-2', target_fps=1, latency_budget_ms=0)
+    frame = np.random.randint(0, 255, (120, 120, 3), dtype=np.uint8)
+
+    session.process_frame(frame)
+    skipped = session.process_frame(frame)
+
+    assert skipped['frame_skipped'] is True
+    assert session.frames_processed == 1
+
+def test_video_session_serializes_concurrent_frames():
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    class SlowDetector(FakeFaceDetector):
+        def __init__(self):
+            super().__init__()
+            self.active = 0
+            self.max_active = 0
+            self.guard = threading.Lock()
+
+        def analyze_faces(self, image, faces):
+            with self.guard:
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+            time.sleep(0.01)
+            with self.guard:
+                self.active -= 1
+            return super().analyze_faces(image, faces)
+
+    detector = SlowDetector()
+    session = VideoEmotionSession(
+        detector, 'stream-3', reclassify_every=1, target_fps=0, latency_budget_ms=0
+    )
+    frame = np.random.randint(0, 255, (120, 120, 3), dtype=np.uint8)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda _: session.process_frame(frame), range(8)))
+
+    assert detector.max_active == 1
+    assert session.frames_processed == 8
+    assert {r['results'][0]['track_id'] for r in results} == {1}
+
+def test_box_iou():
+    assert box_iou((0, 0, 10, 10), (0, 0, 10, 10)) == 1.0
+    assert box_iou((0, 0, 10, 10), (20, 20, 10, 10)) == 0.0
+
 # NLP Processor Tests
 @pytest.mark.asyncio
 async def test_nlp_processor_initialization(nlp_processor):
@@ -100,6 +268,605 @@ async def test_intent_classification(nlp_processor):
     assert 'confidence' in result
     assert isinstance(result['confidence'], float)
 
+@pytest.mark.asyncio
+async def test_incremental_conversation_analysis(nlp_processor):
+    conversation = [
+        {'role': 'user', 'content': 'Hello there!'},
+        {'role': 'assistant', 'content': 'Hi, how can I help?'}
+    ]
+    first = await nlp_processor.analyze_conversation(conversation, conversation_id='conv-1')
+    assert first['messages_count'] == 2
+    assert first['new_messages_analyzed'] == 2
+
+    conversation.append({'role': 'user', 'content': 'What time is it?'})
+    second = await nlp_processor.analyze_conversation(conversation, conversation_id='conv-1')
+    assert second['messages_count'] == 3
+    assert second['new_messages_analyzed'] == 1
+    assert abs(sum(second['sentiment_distribution'].values()) - 1.0) < 1e-6
+
+@pytest.mark.asyncio
+async def test_concurrent_conversation_analysis_counts_once():
+    from collections import OrderedDict
+    import weakref
+
+    processor = NLPProcessor.__new__(NLPProcessor)
+    processor.logger = logging.getLogger('test')
+    processor._conversation_states = OrderedDict()
+    processor._conversation_locks = weakref.WeakValueDictionary()
+    scored = []
+
+    async def analyze_sentiment(text):
+        scored.append(text)
+        await asyncio.sleep(0.01)
+        return {'label': 'POSITIVE'}
+
+    async def classify_intent(text):
+        await asyncio.sleep(0.01)
+        return {'intent': 'statement'}
+
+    processor.analyze_sentiment = analyze_sentiment
+    processor.classify_intent = classify_intent
+
+    conversation = [{'role': 'user', 'content': 'hello'}, {'role': 'user', 'content': 'again'}]
+    first, second = await asyncio.gather(
+        processor.analyze_conversation(conversation, conversation_id='conv-9'),
+        processor.analyze_conversation(conversation, conversation_id='conv-9')
+    )
+
+    assert scored == ['hello', 'again']
+    assert first['new_messages_analyzed'] == 2 and second['new_messages_analyzed'] == 0
+    assert second['sentiment_distribution'] == {'POSITIVE': 1.0}
+
+    # The stored message is a copy; editing the caller's dict restarts the counts
+    conversation[-1]['content'] = 'edited'
+    result = await processor.analyze_conversation(conversation, conversation_id='conv-9')
+    assert result['new_messages_analyzed'] == 2
+
+@pytest.mark.asyncio
+async def test_streaming_response_reuses_cache(nlp_processor):
+    pieces = [
+        piece async for piece in
+        nlp_processor.stream_response('Hello!', conversation_id='conv-2')
+    ]
+    assert all(isinstance(piece, str) for piece in pieces)
+    assert nlp_processor.streaming_generator.has_session('conv-2')
+
+    async for _ in nlp_processor.stream_response('Tell me more', conversation_id='conv-2'):
+        pass
+    assert nlp_processor.streaming_generator.get_stats()['cache_hits'] == 1
+
+@pytest.mark.asyncio
+async def test_generate_response_reuses_conversation_cache(nlp_processor):
+    generator = nlp_processor.streaming_generator
+    hits = generator.get_stats()['cache_hits']
+
+    first = await nlp_processor.generate_response('Hello!', conversation_id='conv-3')
+    assert isinstance(first['text'], str)
+    assert generator.has_session('conv-3')
+
+    await nlp_processor.generate_response('Tell me more', conversation_id='conv-3')
+    assert generator.get_stats()['cache_hits'] == hits + 1
+
+@pytest.mark.asyncio
+async def test_generation_batch_leaves_shared_tokenizer_alone(nlp_processor):
+    tokenizer = nlp_processor.response_generator.tokenizer
+    padding_side, pad_token = tokenizer.padding_side, tokenizer.pad_token
+
+    outputs = nlp_processor._generation_batch(['Hi', 'A much longer prompt than the first'])
+    assert len(outputs) == 2
+    assert (tokenizer.padding_side, tokenizer.pad_token) == (padding_side, pad_token)
+
+@pytest.mark.asyncio
+async def test_batched_entity_extraction(nlp_processor):
+    texts = [
+        "Angela Merkel visited Paris last week.",
+        "Apple opened a new office in Berlin."
+    ]
+    batched = await nlp_processor.extract_entities_many(texts)
+    single = await nlp_processor.extract_entities(texts[0])
+
+    assert len(batched) == 2
+    assert [e['text'] for e in single] == [e['text'] for e in batched[0]]
+    for entity in batched[1]:
+        assert texts[1][entity['start']:entity['end']] == entity['text']
+
+def test_group_entities_splits_on_outside_tokens():
+    text = "Merkel met Obama in Paris and Berlin"
+    tokens = [
+        ("I-PER", 0.9, 0, 6), ("O", 0.99, 7, 10), ("I-PER", 0.8, 11, 16),
+        ("O", 0.99, 17, 19), ("I-LOC", 0.9, 20, 25),
+        ("O", 0.99, 26, 29), ("I-LOC", 0.7, 30, 36)
+    ]
+    entities = NLPProcessor._group_entities(text, tokens)
+    assert [(e['text'], e['type']) for e in entities] == [
+        ("Merkel", "PER"), ("Obama", "PER"), ("Paris", "LOC"), ("Berlin", "LOC")
+    ]
+
+    # Word pieces of one entity still merge
+    entities = NLPProcessor._group_entities("Angela Merkel", [("B-PER", 0.9, 0, 6), ("I-PER", 0.7, 7, 13)])
+    assert entities[0]['text'] == "Angela Merkel"
+
+@pytest.mark.asyncio
+async def test_stream_loads_off_loop_and_ends_with_error_line():
+    import threading
+    import types
+    import torch
+    from ..ai.streaming_generation import StreamingGenerator
+
+    loaded_on = []
+
+    class FailingModel:
+        config = types.SimpleNamespace(n_positions=64)
+
+        def __call__(self, input_ids, past_key_values=None, use_cache=True):
+            if past_key_values is not None:
+                raise RuntimeError("generation failed")
+            return types.SimpleNamespace(logits=torch.zeros(1, 1, 5), past_key_values=())
+
+    class Tokenizer:
+        eos_token_id = -1
+
+        def encode(self, text):
+            return [1, 2]
+
+        def decode(self, ids, skip_special_tokens=True):
+            return "x" * len(ids)
+
+    def load_pipeline():
+        loaded_on.append(threading.current_thread().name)
+        return types.SimpleNamespace(model=FailingModel(), tokenizer=Tokenizer())
+
+    executor = InferenceExecutor(max_workers=1, family_limits={'generation': 1})
+    generator = StreamingGenerator(load_pipeline, executor, max_new_tokens=3)
+
+    manager = AIManager.__new__(AIManager)
+    manager.logger = logging.getLogger('test')
+    manager.nlp_processor = types.SimpleNamespace(
+        stream_response=lambda text, context, conversation_id: generator.stream(text)
+    )
+
+    pieces = [piece async for piece in manager.stream_text_response('hi')]
+    assert loaded_on[0].startswith('inference')
+    assert pieces[-1].strip() == '[error] generation failed'
+    executor.shutdown()
+
+class StubTokenizer:
+    """Whitespace tokenizer with BART-style pair layout: <s> a </s> b </s>"""
+    pad_token_id = 1
+
+    def __init__(self):
+        self.vocab = {}
+
+    def _ids(self, text):
+        words = text.lower().replace('?', '').replace('.', '').split()
+        return [self.vocab.setdefault(word, len(self.vocab) + 3) for word in words]
+
+    def __call__(self, texts, add_special_tokens=True, truncation=False,
+                 max_length=None, return_tensors=None, padding=False):
+        import torch
+        single = isinstance(texts, str)
+        ids = [self._ids(text) for text in ([texts] if single else texts)]
+        if truncation and max_length:
+            ids = [seq[:max_length] for seq in ids]
+        if return_tensors == 'pt':
+            length = max(len(seq) for seq in ids)
+            input_ids = torch.full((len(ids), length), self.pad_token_id, dtype=torch.long)
+            attention_mask = torch.zeros((len(ids), length), dtype=torch.long)
+            for row, seq in enumerate(ids):
+                input_ids[row, :len(seq)] = torch.tensor(seq, dtype=torch.long)
+                attention_mask[row, :len(seq)] = 1
+            return {'input_ids': input_ids, 'attention_mask': attention_mask}
+        return {'input_ids': ids[0] if single else ids}
+
+    def num_special_tokens_to_add(self, pair=False):
+        return 3 if pair else 2
+
+    def build_inputs_with_special_tokens(self, first, second):
+        return [0] + first + [2] + second + [2]
+
+class StubNLIModel:
+    """Entails a hypothesis when its tokens appear in the premise; last logit is entailment"""
+
+    def __init__(self, label2id):
+        import types
+        self.config = types.SimpleNamespace(label2id=label2id)
+        self.batch_sizes = []
+
+    def __call__(self, input_ids, attention_mask):
+        import torch
+        import types
+        self.batch_sizes.append(input_ids.shape[0])
+        logits = torch.zeros(input_ids.shape[0], len(self.config.label2id))
+        for row in range(input_ids.shape[0]):
+            seq = input_ids[row][attention_mask[row] == 1].tolist()
+            sep = seq.index(2)
+            premise, hypothesis = seq[1:sep], seq[sep + 1:-1]
+            logits[row, -1] = 5.0 if set(premise) & set(hypothesis) else 0.0
+        return types.SimpleNamespace(logits=logits)
+
+    def base_model(self, input_ids, attention_mask):
+        # Used as the encoder in embedding mode: one-hot token vectors
+        import torch
+        import types
+        return types.SimpleNamespace(
+            last_hidden_state=torch.nn.functional.one_hot(input_ids, 64).float()
+        )
+
+INTENT_TEXTS = ["Is this a question?", "Run the command now", "Greeting to you friend"]
+INTENT_LABELS = ["question", "command", "greeting"]
+
+def test_intent_engine_scores_all_pairs_in_one_pass():
+    model = StubNLIModel({'contradiction': 0, 'neutral': 1, 'entailment': 2})
+    engine = ZeroShotIntentEngine(model, StubTokenizer(), INTENT_LABELS, hypothesis_template="{}")
+
+    results = engine.classify_many(INTENT_TEXTS)
+
+    assert [r['labels'][0] for r in results] == INTENT_LABELS
+    assert [r['sequence'] for r in results] == INTENT_TEXTS
+    for result in results:
+        assert sorted(result['labels']) == sorted(INTENT_LABELS)
+        assert abs(sum(result['scores']) - 1.0) < 1e-5
+        assert result['scores'] == sorted(result['scores'], reverse=True)
+    # Every premise/hypothesis pair of the batch in a single forward pass
+    assert model.batch_sizes == [len(INTENT_TEXTS) * len(INTENT_LABELS)]
+    assert engine.classify_many([]) == []
+
+def test_intent_engine_fallbacks():
+    # No label named entailment: the last logit is used, as for bart-large-mnli
+    model = StubNLIModel({'LABEL_0': 0, 'LABEL_1': 1, 'LABEL_2': 2})
+    engine = ZeroShotIntentEngine(model, StubTokenizer(), INTENT_LABELS, hypothesis_template="{}")
+    assert engine.entailment_id == 2
+    assert [r['labels'][0] for r in engine.classify_many(INTENT_TEXTS)] == INTENT_LABELS
+
+    # Embedding mode skips NLI and compares against cached label embeddings
+    model.batch_sizes.clear()
+    results = engine.classify_many(INTENT_TEXTS, mode="embedding")
+    assert [r['labels'][0] for r in results] == INTENT_LABELS
+    assert model.batch_sizes == []
+    assert engine.get_info()['label_embeddings_cached'] is True
+
+    with pytest.raises(ValueError):
+        engine.classify_many(INTENT_TEXTS, mode="unknown")
+
+# Micro-batching Tests
+@pytest.mark.asyncio
+async def test_micro_batcher_coalesces_requests():
+    calls = []
+
+    def batch_fn(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher("double", batch_fn, max_batch_size=4, max_wait_ms=10)
+    results = await asyncio.gather(*(batcher.submit(i) for i in range(6)))
+
+    assert results == [0, 2, 4, 6, 8, 10]
+    assert calls == [[0, 1, 2, 3], [4, 5]]
+
+    stats = batcher.get_stats()
+    assert stats['total_batches'] == 2
+    assert stats['batch_size_histogram'] == {2: 1, 4: 1}
+    assert stats['queue_depth'] == 0
+
+@pytest.mark.asyncio
+async def test_micro_batcher_propagates_errors():
+    def batch_fn(items):
+        raise RuntimeError("model failure")
+
+    batcher = MicroBatcher("failing", batch_fn, max_batch_size=2, max_wait_ms=1)
+    with pytest.raises(RuntimeError):
+        await batcher.submit("text")
+
+# Inference Executor Tests
+@pytest.mark.asyncio
+async def test_inference_executor_runs_off_loop():
+    import threading
+    executor = InferenceExecutor(max_workers=2, family_limits={'text': 1})
+
+    thread_name = await executor.run('text', lambda: threading.current_thread().name)
+    assert thread_name.startswith('inference')
+    assert executor.get_stats()['families']['text']['completed'] == 1
+    executor.shutdown()
+
+@pytest.mark.asyncio
+async def test_inference_executor_backpressure():
+    import time
+    executor = InferenceExecutor(
+        max_workers=1,
+        family_limits={'text': 1},
+        max_queue_size=1,
+        queue_timeout=0.05
+    )
+
+    running = asyncio.ensure_future(executor.run('text', time.sleep, 0.3))
+    await asyncio.sleep(0.01)
+    with pytest.raises(ExecutorSaturatedError):
+        await executor.run('text', time.sleep, 0)
+
+    await running
+    assert executor.get_stats()['families']['text']['rejected'] == 1
+    executor.shutdown()
+
+@pytest.mark.asyncio
+async def test_inference_executor_holds_slot_until_cancelled_call_finishes():
+    import threading
+    import time
+    executor = InferenceExecutor(max_workers=2, family_limits={'text': 1})
+    lock = threading.Lock()
+    active = []
+    overlap = []
+
+    def work(duration):
+        with lock:
+            active.append(1)
+            overlap.append(len(active))
+        time.sleep(duration)
+        with lock:
+            active.pop()
+
+    first = asyncio.ensure_future(executor.run('text', work, 0.3))
+    await asyncio.sleep(0.05)
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+    # The cancelled call's thread is still running, so this one waits
+    assert executor.get_stats()['families']['text']['running'] == 1
+    await executor.run('text', work, 0)
+    assert overlap == [1, 1]
+    assert executor.get_stats()['families']['text']['completed'] == 2
+    executor.shutdown()
+
+def test_inference_executor_works_across_event_loops():
+    executor = InferenceExecutor(max_workers=1, family_limits={'text': 1})
+    assert asyncio.run(executor.run('text', lambda: 1)) == 1
+    assert asyncio.run(executor.run('text', lambda: 2)) == 2
+    executor.shutdown()
+
+# Model Registry Tests
+def test_model_registry_shares_instances():
+    registry = ModelRegistry()
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return object()
+
+    first = registry.acquire('bart', 'zero-shot', loader)
+    second = registry.acquire('bart', 'zero-shot', loader)
+    assert first is second
+    assert len(loads) == 1
+
+    report = registry.get_memory_report()
+    assert report['models'][0]['refcount'] == 2
+
+    assert registry.release('bart', 'zero-shot') == 1
+    assert registry.release('bart', 'zero-shot') == 0
+    assert not registry.is_loaded('bart', 'zero-shot')
+
+def test_model_registry_releases_dependencies():
+    registry = ModelRegistry()
+    registry.acquire('bart', 'weights', object)
+    registry.acquire('bart', 'pipeline', object, depends_on=[('bart', 'weights', 'float32')])
+
+    registry.release('bart', 'pipeline')
+    assert not registry.is_loaded('bart', 'weights')
+
+def test_model_registry_precision_and_backend_settings(monkeypatch):
+    import torch
+    from ..ai.quantization import quantize_dynamic_int8
+
+    registry = ModelRegistry()
+    monkeypatch.setitem(AI_CONFIG["model_dtypes"], 'gpt2', 'int8')
+    assert registry.dtype_for('gpt2') == 'int8'
+    assert registry.model_version('gpt2') == 'gpt2@int8'
+    assert registry.model_version('unlisted-model') == 'unlisted-model'
+
+    # ONNX only applies to classifier weights; other kinds keep the dtype
+    model_id = AI_CONFIG["sentiment_model"]
+    monkeypatch.setitem(AI_CONFIG["model_backends"], model_id, 'onnx')
+    assert registry.variant_for(model_id, 'sequence-classification') == 'onnx'
+    assert registry.variant_for(model_id, 'base') == 'float32'
+    assert registry.model_version(model_id) == f'{model_id}@onnx'
+    with pytest.raises(ValueError):
+        registry.get_pipeline('sentiment-analysis', model_id)
+
+    model = torch.nn.Sequential(torch.nn.Linear(16, 16), torch.nn.ReLU(), torch.nn.Linear(16, 4))
+    quantized = quantize_dynamic_int8(model)
+    inputs = torch.randn(8, 16)
+    assert torch.allclose(model(inputs), quantized(inputs), atol=0.1)
+    assert registry._estimate_memory(quantized) < registry._estimate_memory(model)
+
+def test_quantized_cache_round_trip(tmp_path, monkeypatch, caplog):
+    import torch
+    import transformers
+    from ..ai.quantization import load_quantized_model, quantized_cache_path
+
+    class TinyModel(torch.nn.Module):
+        loads = []
+
+        def __init__(self):
+            super().__init__()
+            self.linear = torch.nn.Linear(8, 4)
+
+        @classmethod
+        def from_pretrained(cls, model_id):
+            cls.loads.append(model_id)
+            return cls()
+
+        @classmethod
+        def from_config(cls, config):
+            return cls()
+
+        def forward(self, inputs):
+            return self.linear(inputs)
+
+    monkeypatch.setattr(transformers.AutoConfig, 'from_pretrained', lambda model_id: None)
+    first = load_quantized_model(TinyModel, 'tiny/model', 'base', str(tmp_path))
+    assert os.path.exists(quantized_cache_path(str(tmp_path), 'tiny/model', 'base'))
+
+    # The second load comes from the cache, not a fresh quantization
+    with caplog.at_level(logging.INFO):
+        second = load_quantized_model(TinyModel, 'tiny/model', 'base', str(tmp_path))
+    assert TinyModel.loads == ['tiny/model']
+    assert 're-quantizing' not in caplog.text
+    inputs = torch.randn(2, 8)
+    assert torch.equal(first(inputs), second(inputs))
+
+def test_onnx_classifier_matches_pytorch(tmp_path):
+    import torch
+    import transformers
+    from ..ai.onnx_backend import export_sequence_classifier, OnnxSequenceClassifier
+
+    config = transformers.DistilBertConfig(
+        vocab_size=64, dim=32, n_layers=1, n_heads=2, hidden_dim=64, num_labels=3
+    )
+    torch.manual_seed(0)
+    model = transformers.DistilBertForSequenceClassification(config).eval()
+    tokenizer = StubTokenizer()
+    path = export_sequence_classifier(model, tokenizer, str(tmp_path / 'tiny.onnx'))
+    onnx_model = OnnxSequenceClassifier(path, config)
+
+    texts = ['hi', 'a much longer sentence than the others', 'mid length text']
+    expected = SequenceClassifier(model, tokenizer).logits(texts)
+    actual = SequenceClassifier(onnx_model, tokenizer).logits(texts)
+    assert actual.shape == expected.shape == (3, 3)
+    assert torch.allclose(actual, expected, atol=1e-4)
+
+    # Scored through the same direct path as the PyTorch weights
+    onnx_scores = SequenceClassifier(onnx_model, tokenizer)(texts)
+    torch_scores = SequenceClassifier(model, tokenizer)(texts)
+    assert [s[0]['label'] for s in onnx_scores] == [s[0]['label'] for s in torch_scores]
+    assert len(onnx_scores[0]) == 3
+
+def test_lazy_model_loads_on_first_use():
+    loads = []
+    handle = LazyModel('sentiment', lambda: loads.append(1) or 'model')
+
+    assert handle.loaded is False
+    assert handle.get() == 'model'
+    assert handle.get() == 'model'
+    assert loads == [1]
+
+@pytest.mark.asyncio
+async def test_model_registry_warmup_and_readiness():
+    registry = ModelRegistry()
+    warmed = []
+    registry.lazy('sentiment', lambda: 'model', warmup=warmed.append)
+    registry.lazy('generation', lambda: 'generator')
+
+    readiness = registry.get_readiness(['sentiment'])
+    assert readiness['ready'] is False
+    assert readiness['models']['sentiment']['loaded'] is False
+
+    results = await registry.warmup(['sentiment'])
+    assert results == {'sentiment': True}
+    assert warmed == ['model']
+
+    readiness = registry.get_readiness(['sentiment'])
+    assert readiness['ready'] is True
+    assert readiness['models']['generation']['loaded'] is False
+
+@pytest.mark.asyncio
+async def test_ai_processor_loads_models_off_loop():
+    import threading
+    from ..ai_processor import AIProcessor
+
+    loaded_on = []
+
+    def load_analyzer():
+        loaded_on.append(threading.current_thread().name)
+        return lambda text: [[{'label': 'joy', 'score': 0.9}, {'label': 'anger', 'score': 0.1}]]
+
+    processor = AIProcessor.__new__(AIProcessor)
+    processor.logger = logging.getLogger('test')
+    processor.executor = InferenceExecutor(max_workers=1, family_limits={'text': 1})
+    processor.emotion_cache = ResultCache('emotion', 'test', MemoryCacheBackend(max_size=10, ttl=60))
+    processor._emotion_handle = LazyModel('emotion', load_analyzer)
+
+    result = await processor.analyze_emotion('hello')
+    assert result['emotion'] == 'joy'
+    assert loaded_on and loaded_on[0].startswith('inference')
+
+    # A cache hit never touches the model
+    processor._emotion_handle = LazyModel('emotion', lambda: pytest.fail('model loaded on cache hit'))
+    assert (await processor.analyze_emotion('hello'))['emotion'] == 'joy'
+    processor.executor.shutdown()
+
+# Result Cache Tests
+@pytest.mark.asyncio
+async def test_result_cache_hits_on_normalized_text():
+    cache = ResultCache('sentiment', 'model-v1', MemoryCacheBackend(max_size=10, ttl=60))
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return {'label': 'POSITIVE', 'score': 0.9}
+
+    first = await cache.get_or_compute('Hello  there', compute)
+    second = await cache.get_or_compute(' Hello there ', compute)
+
+    assert first == second
+    assert len(calls) == 1
+    assert cache.get_stats()['hits'] == 1
+    assert cache.get_stats()['misses'] == 1
+
+    # A different model version never sees the old entry
+    other = ResultCache('sentiment', 'model-v2', cache.backend)
+    assert cache.make_key('Hello') != other.make_key('Hello')
+
+def test_memory_cache_backend_evicts_lru():
+    backend = MemoryCacheBackend(max_size=2, ttl=60)
+    backend.set('a', 1)
+    backend.set('b', 2)
+    backend.get('a')
+    backend.set('c', 3)
+
+    assert backend.get('b') is None
+    assert backend.get('a') == 1
+    assert backend.evictions == 1
+
+def test_disk_cache_backend_is_shared(tmp_path):
+    path = str(tmp_path / 'results.sqlite3')
+    DiskCacheBackend(path, max_size=10, ttl=60).set('key', {'label': 'NEGATIVE'})
+
+    # A second backend on the same file, as another worker would open it
+    assert DiskCacheBackend(path, max_size=10, ttl=60).get('key') == {'label': 'NEGATIVE'}
+
+@pytest.mark.asyncio
+async def test_disk_cache_backend_runs_off_loop_and_batches_writes(tmp_path):
+    import threading
+    path = str(tmp_path / 'results.sqlite3')
+    backend = DiskCacheBackend(path, max_size=2, ttl=60, prune_interval=4)
+    cache = ResultCache('sentiment', 'model-v1', backend)
+    threads = []
+    original_get = backend.get
+
+    def get(key):
+        threads.append(threading.current_thread() is threading.main_thread())
+        return original_get(key)
+
+    backend.get = get
+
+    async def compute():
+        return {'label': 'POSITIVE'}
+
+    for text in ['a', 'b', 'c']:
+        await cache.get_or_compute(text, compute)
+    assert threads == [False, False, False]
+    assert cache.get_stats()['misses'] == 3
+
+    # Expiry and eviction wait for the prune interval, or an explicit flush
+    assert len(backend) == 3
+    backend.flush()
+    assert len(backend) == 2
+    assert backend.evictions == 1
+    assert oct(os.stat(path).st_mode & 0o777) == oct(0o600)
+
+    # Stats never query SQLite on the event loop
+    backend._conn.close()
+    assert cache.get_stats()['backend_size'] == 2
+
 # Learning System Tests
 @pytest.mark.asyncio
 async def test_learning_system_initialization(learning_system):
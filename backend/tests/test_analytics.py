@@ -0,0 +1,324 @@
+import pytest
+import tracemalloc
+import numpy as np
+from datetime import datetime, timedelta
+from ..analytics_manager import AnalyticsManager
+from ..config import ANALYTICS_CONFIG
+from ..analytics_store import (
+    EventTable, HyperLogLog, Rollup, US_PER_DAY, US_PER_HOUR, US_PER_MINUTE, to_epoch_us, to_iso
+)
+
+@pytest.fixture
+def analytics_manager():
+    return AnalyticsManager()
+
+def test_event_table_indexes_and_time_range():
+    table = EventTable(
+        {"timestamp": "time", "user_id": "category", "value": "float"},
+        indexes={"user": ["user_id"]},
+        initial_capacity=2
+    )
+    for i in range(10):
+        table.append({"timestamp": 100 + i, "user_id": f"user{i % 3}", "value": i})
+
+    assert len(table) == 10
+    assert list(table.index_rows("user", "user1")) == [1, 4, 7]
+    assert len(table.index_rows("user", "missing")) == 0
+    assert table.index_size("user") == 3
+    assert table.time_range(103, 105) == slice(3, 6)
+    assert table.column("timestamp").dtype == np.int64
+
+    # Category values are stored once and referenced by code
+    assert table.column("user_id").dtype == np.int32
+    assert table.categories("user_id") == ["user0", "user1", "user2"]
+
+    rows = table.rows(table.index_rows("user", "user2"))
+    assert [row["id"] for row in rows] == [3, 6, 9]
+    assert rows[0]["value"] == 2.0
+
+@pytest.mark.asyncio
+async def test_user_and_platform_statistics(analytics_manager):
+    for i in range(6):
+        await analytics_manager.log_interaction({"user_id": f"user{i % 2}", "type": "click"})
+    await analytics_manager.log_emotion_data({"user_id": "user0", "emotion": "joy", "confidence": 0.9})
+    await analytics_manager.log_emotion_data({"user_id": "user0", "emotion": "sadness", "confidence": 0.6})
+    await analytics_manager.log_emotion_data({"user_id": "user1", "emotion": "joy", "confidence": 0.8})
+    await analytics_manager.log_web3_transaction({"from": "user0", "to": "user1", "value": "2.5"})
+    await analytics_manager.log_web3_transaction({"from": "user1", "to": "user1", "value": None})
+
+    stats = await analytics_manager.get_user_statistics("user0")
+    assert stats["total_interactions"] == 3
+    assert stats["emotion_distribution"] == {"joy": 50.0, "sadness": 50.0}
+    assert stats["transaction_count"] == 1
+    assert stats["last_active"] is not None
+
+    # A self-transfer is counted once for the address
+    stats = await analytics_manager.get_user_statistics("user1")
+    assert stats["transaction_count"] == 2
+
+    platform = await analytics_manager.get_platform_statistics()
+    assert platform["total_users"] == 2
+    assert platform["active_users_24h"] == 2
+    assert platform["recent_interactions"] == 6
+    assert platform["transaction_volume"] == {"total": 2.5, "average": 2.5}
+
+@pytest.mark.asyncio
+async def test_report_filters_by_date_range(analytics_manager):
+    await analytics_manager.log_interaction({"user_id": "user0", "type": "click"})
+    now = datetime.utcnow()
+
+    report = await analytics_manager.generate_report(
+        now - timedelta(hours=1), now + timedelta(hours=1), "user_engagement"
+    )
+    assert report["data"]["interaction_types"] == {"click": 1}
+
+    report = await analytics_manager.generate_report(
+        now - timedelta(days=2), now - timedelta(days=1)
+    )
+    assert report["data"]["total_interactions"] == 0
+
+@pytest.mark.asyncio
+async def test_reports_bucket_epoch_timestamps_by_day(analytics_manager):
+    day_one = datetime(2024, 3, 1, 9, 30)
+    day_two = datetime(2024, 3, 2, 18, 0)
+    for when, user, emotion in [(day_one, "a", "joy"), (day_one, "b", "joy"), (day_two, "a", "anger")]:
+        analytics_manager.interactions.append(
+            {"timestamp": to_epoch_us(when), "user_id": user, "type": "click"}
+        )
+        analytics_manager.emotion_data.append(
+            {"timestamp": to_epoch_us(when), "user_id": user, "emotion": emotion, "confidence": 0.5}
+        )
+
+    assert to_iso(to_epoch_us(day_one)) == day_one.isoformat()
+
+    report = await analytics_manager.generate_report(
+        datetime(2024, 3, 1), datetime(2024, 3, 3), "user_engagement"
+    )
+    assert report["data"]["daily_active_users"] == {"2024-03-01": 2, "2024-03-02": 1}
+
+    report = await analytics_manager.generate_report(
+        datetime(2024, 3, 1), datetime(2024, 3, 3), "emotion_analysis"
+    )
+    assert report["data"]["emotion_trends"] == {
+        ("2024-03-01", "joy"): 2,
+        ("2024-03-02", "anger"): 1
+    }
+
+    report = await analytics_manager.generate_report(datetime(2024, 3, 1), datetime(2024, 3, 3))
+    assert report["data"]["peak_usage_times"][0] == {"hour": 9, "interactions": 2}
+
+    # An empty range produces empty buckets rather than an error
+    report = await analytics_manager.generate_report(
+        datetime(2023, 1, 1), datetime(2023, 1, 2), "web3_activity"
+    )
+    assert report["data"]["daily_volumes"] == {}
+
+def test_rollup_windows_combine_buckets():
+    rollup = Rollup(categories=["emotion"], values=["value"], distinct=["user"],
+                    buckets={"minute": 120, "hour": 48, "day": 30})
+    start = to_epoch_us(datetime(2024, 3, 1))
+    # One event every 10 minutes for three days
+    for i in range(3 * 24 * 6):
+        rollup.add(start + i * 10 * US_PER_MINUTE,
+                   {"emotion": i % 2, "value": 1.0 if i % 3 else np.nan, "user": i % 5})
+
+    end = start + 3 * US_PER_DAY
+    assert rollup.count == 432
+    assert rollup.value_counts["value"] == 288
+
+    # A day-aligned window is read from day buckets
+    plan = rollup.plan(start + US_PER_DAY, start + 2 * US_PER_DAY)
+    assert plan == {"minute": [], "hour": [], "day": [(start + US_PER_DAY) // US_PER_DAY]}
+    assert rollup.window(start + US_PER_DAY, start + 2 * US_PER_DAY)["count"] == 144
+
+    # Recent edges come from minute buckets, the rest from hours
+    plan = rollup.plan(end - 95 * US_PER_MINUTE, end)
+    assert len(plan["minute"]) == 35 and len(plan["hour"]) == 1
+    window = rollup.window(end - 95 * US_PER_MINUTE, end)
+    assert window["count"] == 9
+    assert window["histograms"]["emotion"].tolist() == [4, 5]
+
+    # Edges older than the minute ring widen to their whole hour
+    assert rollup.window(end - 24 * US_PER_HOUR + 30 * US_PER_MINUTE, end)["count"] == 144
+    assert rollup.window(start, end)["count"] == 432
+    assert rollup.distinct_since("user", end - 30 * US_PER_MINUTE) == 3
+
+def test_hyperloglog_error_bound_and_merge():
+    first, second = HyperLogLog(12), HyperLogLog(12)
+    for i in range(20000):
+        first.add(f"user{i}")
+        second.add(f"user{i + 10000}")
+
+    bound = HyperLogLog.relative_error(12)
+    assert abs(first.count() - 20000) / 20000 < 3 * bound
+    # Merging counts the union, not the sum
+    assert abs(first.merge(second).count() - 30000) / 30000 < 3 * bound
+    assert first.nbytes == 4096
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["exact", "approximate"])
+async def test_unique_counts_modes(monkeypatch, mode):
+    monkeypatch.setitem(ANALYTICS_CONFIG, "unique_counts", mode)
+    manager = AnalyticsManager()
+    day = to_epoch_us(datetime(2024, 3, 1, 12))
+    for i in range(300):
+        manager.interactions.append(
+            {"timestamp": day + (i // 150) * US_PER_DAY, "user_id": f"user{i % 150}", "type": "click"}
+        )
+        manager.web3_transactions.append(
+            {"timestamp": day, "from_address": f"0x{i % 40}", "to_address": f"0x{i % 60}", "value": 1}
+        )
+
+    tolerance = 3 * HyperLogLog.relative_error(12) if mode == "approximate" else 0
+    report = await manager.generate_report(datetime(2024, 3, 1), datetime(2024, 3, 3))
+    assert abs(report["data"]["unique_users"] - 150) <= 150 * tolerance
+
+    report = await manager.generate_report(datetime(2024, 3, 1), datetime(2024, 3, 3), "user_engagement")
+    for label in ("2024-03-01", "2024-03-02"):
+        assert abs(report["data"]["daily_active_users"][label] - 150) <= 150 * tolerance
+
+    report = await manager.generate_report(datetime(2024, 3, 1), datetime(2024, 3, 3), "web3_activity")
+    assert abs(report["data"]["unique_addresses"] - 60) <= 60 * tolerance
+
+def test_event_table_expires_day_segments():
+    table = EventTable(
+        {"timestamp": "time", "user_id": "category", "data": "object"},
+        indexes={"user": ["user_id"]},
+        initial_capacity=4
+    )
+    start = to_epoch_us(datetime(2024, 3, 1))
+    for day in range(4):
+        for i in range(5):
+            table.append({"timestamp": start + day * US_PER_DAY + i, "user_id": f"user{day}", "data": {}})
+
+    assert table.segment_count == 4
+    assert [segment["rows"] for segment in table.segment_stats()] == [5, 5, 5, 5]
+
+    # Only whole days before the cutoff go
+    assert table.expire_before(start + 2 * US_PER_DAY + 1) == 10
+    assert len(table) == 10 and table.segment_count == 2
+    assert table.segment_stats()[0]["day"] == "2024-03-03"
+    assert len(table.index_rows("user", "user0")) == 0
+    assert list(table.index_rows("user", "user3")) == [5, 6, 7, 8, 9]
+    assert table.index_size("user") == 2
+
+    # Ids stay stable and new rows continue the sequence
+    assert table.rows(slice(0, 1))[0]["id"] == 11
+    assert table.append({"timestamp": start + 4 * US_PER_DAY, "user_id": "user4"}) == 21
+    assert table.time_range(start + 3 * US_PER_DAY, start + 4 * US_PER_DAY) == slice(5, 11)
+
+@pytest.mark.asyncio
+async def test_retention_and_memory_ceiling(analytics_manager):
+    start = to_epoch_us(datetime(2024, 3, 1))
+    for day in range(40):
+        for i in range(10):
+            analytics_manager.interactions.append(
+                {"timestamp": start + day * US_PER_DAY + i, "user_id": f"user{i}", "type": "click"}
+            )
+    now = start + 40 * US_PER_DAY
+
+    result = analytics_manager.enforce_retention(now)
+    assert result["expired_rows"]["interactions"] == 100
+    storage = analytics_manager.get_storage_statistics()
+    assert storage["tables"]["interactions"]["segment_count"] == 30
+    assert storage["tables"]["interactions"]["rows"] == 300
+
+    # Compacted rollups still answer for the expired days
+    rollup = analytics_manager.interactions.rollup
+    assert rollup.window(start, start + US_PER_DAY)["count"] == 10
+    assert rollup.count == 400
+
+    # Over the ceiling, the oldest segments go first
+    analytics_manager.max_memory_bytes = storage["total_bytes"] - 1
+    result = analytics_manager.enforce_retention(now)
+    assert result["evicted_segments"] >= 1
+    assert analytics_manager.get_storage_statistics()["total_bytes"] <= analytics_manager.max_memory_bytes
+    assert analytics_manager.interactions.segment_stats()[-1]["day"] == "2024-04-09"
+
+def test_memory_estimate_counts_payloads_and_dictionaries():
+    tracemalloc.start()
+    try:
+        manager = AnalyticsManager()
+        baseline = tracemalloc.get_traced_memory()[0]
+        for i in range(20000):
+            manager.interactions.append({
+                "timestamp": i, "user_id": f"user{i % 500}", "type": "click",
+                "data": {"page": f"/page/{i}"}, "session_id": f"session-{i}"
+            })
+        traced = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+
+    assert manager._memory_bytes() >= 0.75 * traced
+    # Session ids are payloads, not an ever-growing dictionary
+    assert manager.interactions.schema["session_id"] == "object"
+
+@pytest.mark.asyncio
+async def test_platform_window_excludes_events_before_24h(analytics_manager):
+    now = to_epoch_us(datetime.utcnow())
+    for offset in (24 * US_PER_HOUR + 40 * US_PER_MINUTE, 24 * US_PER_HOUR + 30 * US_PER_MINUTE):
+        analytics_manager.interactions.append(
+            {"timestamp": now - offset, "user_id": "old", "type": "click"}
+        )
+    await analytics_manager.log_interaction({"user_id": "new", "type": "click"})
+
+    platform = await analytics_manager.get_platform_statistics()
+    assert platform["recent_interactions"] == 1
+    assert platform["active_users_24h"] == 1
+
+@pytest.mark.asyncio
+async def test_sketch_counts_fall_back_to_exact_off_bucket_boundaries(analytics_manager):
+    # Old enough that only day buckets are retained
+    day = datetime(2024, 3, 1)
+    for hour in range(24):
+        for user in range(10):
+            analytics_manager.interactions.append({
+                "timestamp": to_epoch_us(day + timedelta(hours=hour)),
+                "user_id": f"user{hour}-{user}", "type": "click"
+            })
+    analytics_manager.interactions.append(
+        {"timestamp": to_epoch_us(datetime.utcnow()), "user_id": "now", "type": "click"}
+    )
+
+    # A few hours of that day are counted from the raw rows
+    report = await analytics_manager.generate_report(day, day + timedelta(hours=2, minutes=59))
+    assert report["data"]["unique_users"] == 30
+
+    report = await analytics_manager.generate_report(day, day + timedelta(hours=2), "user_engagement")
+    assert report["data"]["daily_active_users"] == {"2024-03-01": 30}
+
+    # A whole retained day is served from its sketch
+    report = await analytics_manager.generate_report(day, day + timedelta(days=1) - timedelta(microseconds=1))
+    assert abs(report["data"]["unique_users"] - 240) <= 240 * 3 * HyperLogLog.relative_error(12)
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["approximate", "exact"])
+async def test_expiry_prunes_dictionaries_and_memory(monkeypatch, mode):
+    monkeypatch.setitem(ANALYTICS_CONFIG, "unique_counts", mode)
+    manager = AnalyticsManager()
+    start = to_epoch_us(datetime(2024, 3, 1))
+    for day in range(3):
+        for user in range(200):
+            manager.interactions.append({
+                "timestamp": start + day * US_PER_DAY + user, "user_id": f"user{day}-{user}",
+                "type": "click", "data": {"page": f"/page/{user}"}
+            })
+    before = manager._memory_bytes()
+    assert (await manager.get_platform_statistics())["total_users"] == 600
+
+    manager.enforce_retention(start + (manager.retention_days + 2) * US_PER_DAY)
+
+    # Only the last day's users and rows remain
+    assert (await manager.get_platform_statistics())["total_users"] == 200
+    assert manager._memory_bytes() < before
+    table = manager.interactions
+    assert table.categories("user_id")[0] == "user2-0"
+    assert table.rows(table.index_rows("user", "user2-5"))[0]["user_id"] == "user2-5"
+    if mode == "exact":
+        assert len(table.rollup.last_seen["user_id"]) == 200
+        assert table.rollup.distinct_since("user_id", start) == 200
+
+    # New users get codes after the renumbered ones
+    table.append({"timestamp": start + 3 * US_PER_DAY, "user_id": "late", "type": "click"})
+    assert table.code_for("user_id", "late") == 200
+    assert table.rows(slice(200, 201))[0]["user_id"] == "late"
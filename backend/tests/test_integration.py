@@ -12,6 +12,11 @@ def test_health_check():
     assert response.status_code == 200
     assert response.json() == {"status": "healthy"}
 
+def test_ai_router_is_mounted():
+    paths = {route.path for route in app.routes}
+    assert "/ai/ready" in paths
+    assert "/ai/status" in paths
+
 def test_ai_emotion_analysis():
     response = client.post(
         "/api/ai/emotion-analysis",
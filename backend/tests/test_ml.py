@@ -1,9 +1,12 @@
+import asyncio
 import pytest
 import torch
 import numpy as np
 from ..ml.data_pipeline import MultiModalPipeline
 from ..ml.training_pipeline import TrainingPipeline
 from ..ml.dataset_manager import DatasetManager
+from ..ml.shared_heads import SharedEncoderHeads
+from ..config import AI_CONFIG
 import os
 import json
 from datetime import datetime
@@ -42,6 +45,26 @@ class TestDataPipeline:
         assert 'text_length' in result
         assert 'timestamp' in result
 
+    @pytest.mark.asyncio
+    async def test_embed_many_matches_single_texts(self, data_pipeline):
+        texts = [
+            "This is a much longer sentence that needs more padding than the others",
+            "Short one",
+            "Short one"
+        ]
+        embedder = data_pipeline.text_embedder
+        embeddings = await embedder.embed_many(texts)
+        assert embeddings.shape[0] == 3
+
+        # Bucketed padding must not change the pooled embedding
+        single = embedder.encode([texts[1]])
+        assert np.allclose(embeddings[1], single[0], atol=1e-4)
+        assert np.array_equal(embeddings[1], embeddings[2])
+
+        hits = embedder.cache.hits
+        await embedder.embed_many(texts[:2])
+        assert embedder.cache.hits == hits + 2
+
     @pytest.mark.asyncio
     async def test_audio_processing(self, data_pipeline, tmp_path):
         # Create dummy audio file
@@ -85,6 +108,123 @@ class TestDataPipeline:
         assert 'combined_features' in result
         assert isinstance(result['combined_features'], np.ndarray)
 
+    @pytest.mark.asyncio
+    async def test_multimodal_timeout_keeps_feature_length(self, data_pipeline, monkeypatch):
+        full = data_pipeline.combine_features({})
+
+        async def slow_audio(audio_path):
+            await asyncio.sleep(10)
+
+        monkeypatch.setitem(AI_CONFIG["multimodal"]["timeouts"], "audio", 0.1)
+        monkeypatch.setattr(data_pipeline, "process_audio", slow_audio)
+
+        result = await data_pipeline.process_multimodal({
+            'text': "I am feeling happy today!",
+            'audio': "unused.wav"
+        })
+
+        assert result['success'] is True
+        assert result['partial'] is True
+        assert result['individual_results']['audio']['timed_out'] is True
+        assert result['modalities_present'] == ['text']
+        # Missing modalities are zero-filled, so the length never changes
+        assert result['combined_features'].shape == full.shape
+        assert list(result['combined_features'][-3:]) == [1.0, 0.0, 0.0]
+
+    def test_audio_features_streamed_in_windows(self, data_pipeline, tmp_path, monkeypatch):
+        audio_path = tmp_path / "long_audio.wav"
+        sample_rate = 8000
+        t = np.linspace(0, 5, sample_rate * 5)
+        import scipy.io.wavfile as wav
+        wav.write(audio_path, sample_rate, np.sin(2 * np.pi * 440 * t).astype(np.float32))
+
+        window_lengths = []
+        class FakeWav2Vec:
+            def __call__(self, waveform):
+                window_lengths.append(waveform.shape[1])
+                return torch.ones(1, waveform.shape[1] // 320, 768), None
+
+        class FakeHandle:
+            def get(self):
+                return FakeWav2Vec()
+
+        monkeypatch.setitem(AI_CONFIG["multimodal"], "audio_window_seconds", 2)
+        monkeypatch.setitem(AI_CONFIG["multimodal"], "audio_overlap_seconds", 0.5)
+        monkeypatch.setitem(data_pipeline.models, 'audio', FakeHandle())
+
+        features, duration = data_pipeline._extract_audio_features(str(audio_path))
+
+        # Windows of 2s resampled to 16 kHz, never the whole recording
+        assert max(window_lengths) <= 2 * 16000
+        assert len(window_lengths) == 3
+        assert len(data_pipeline._resamplers) == 1
+        assert features.shape == (1, 768)
+        assert duration == pytest.approx(5.0)
+
+    def test_video_features_sampled_and_batched(self, data_pipeline, tmp_path, monkeypatch):
+        import cv2
+        video_path = str(tmp_path / "test_video.avi")
+        writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'MJPG'), 30, (64, 64))
+        for i in range(90):
+            writer.write(np.full((64, 64, 3), i, dtype=np.uint8))
+        writer.release()
+
+        class TwoFaces:
+            def detectMultiScale(self, gray, **kwargs):
+                return [(0, 0, 10, 10), (5, 5, 10, 10)]
+
+        batches = []
+        def fake_embed(faces):
+            batches.append(len(faces))
+            return np.ones((len(faces), 2048), dtype=np.float32)
+
+        monkeypatch.setitem(AI_CONFIG["multimodal"], "video_sample_fps", 2)
+        monkeypatch.setitem(AI_CONFIG["multimodal"], "video_batch_size", 5)
+        monkeypatch.setattr(data_pipeline, "face_cascade", TwoFaces())
+        monkeypatch.setattr(data_pipeline, "_embed_faces", fake_embed)
+
+        features, face_count, frames_sampled = data_pipeline._extract_video_features(video_path)
+
+        # 3s at 30fps sampled at 2fps
+        assert frames_sampled == 6
+        assert face_count == 12
+        assert batches == [5, 5, 2]
+        assert features.shape == (1, 2048)
+
+class FakeEmbedder:
+    async def embed_many(self, texts):
+        rng = np.random.RandomState(0)
+        table = rng.randn(2, 768).astype(np.float32)
+        return np.stack([table[len(text) % 2] for text in texts])
+
+    def get_stats(self):
+        return {}
+
+class TestSharedEncoderHeads:
+    @pytest.mark.asyncio
+    async def test_heads_share_one_embedding(self, tmp_path):
+        texts = ["good", "bad!"] * 10
+        heads = SharedEncoderHeads(FakeEmbedder(), str(tmp_path))
+        result = await heads.train_heads(
+            texts,
+            {
+                "sentiment": ["POSITIVE", "NEGATIVE"] * 10,
+                "intent": ["statement", "command"] * 10
+            },
+            n_trials=1,
+            num_epochs=1
+        )
+        assert result['success'] is True
+        assert heads.has_heads(["sentiment", "intent"])
+        assert not heads.has_heads()
+
+        # Heads saved to disk are picked up by a fresh instance
+        reloaded = SharedEncoderHeads(FakeEmbedder(), str(tmp_path))
+        scores = await reloaded.analyze("good")
+        assert set(scores) == {"sentiment", "intent"}
+        assert {s["label"] for s in scores["sentiment"]} == {"POSITIVE", "NEGATIVE"}
+        assert scores["sentiment"][0]["score"] >= scores["sentiment"][1]["score"]
+
 class TestTrainingPipeline:
     def test_model_initialization(self, training_pipeline):
         # Create dummy data
@@ -120,6 +260,10 @@ class TestTrainingPipeline:
         save_result = training_pipeline.save_model(str(save_path))
         assert save_result['success'] is True
 
+        # Only tensors and plain Python values are stored
+        checkpoint = torch.load(str(save_path), weights_only=True)
+        assert type(checkpoint['training_history'][-1]['f1']) is float
+
         # Load model
         load_result = training_pipeline.load_model(str(save_path))
         assert load_result['success'] is True